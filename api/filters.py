@@ -0,0 +1,35 @@
+import django_filters
+
+from posts.models import Comment, Follow, Post
+
+
+class PostFilter(django_filters.FilterSet):
+    author = django_filters.CharFilter(field_name='author__username')
+    group = django_filters.CharFilter(field_name='group__slug')
+    text = django_filters.CharFilter(lookup_expr='icontains')
+    since = django_filters.IsoDateTimeFilter(field_name='pub_date',
+                                             lookup_expr='gte')
+    until = django_filters.IsoDateTimeFilter(field_name='pub_date',
+                                             lookup_expr='lte')
+
+    class Meta:
+        model = Post
+        fields = []
+
+
+class CommentFilter(django_filters.FilterSet):
+    author = django_filters.CharFilter(field_name='author__username')
+    since = django_filters.IsoDateTimeFilter(field_name='pub_date',
+                                             lookup_expr='gte')
+
+    class Meta:
+        model = Comment
+        fields = []
+
+
+class FollowFilter(django_filters.FilterSet):
+    author = django_filters.CharFilter(field_name='author__username')
+
+    class Meta:
+        model = Follow
+        fields = []
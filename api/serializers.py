@@ -0,0 +1,99 @@
+"""Сериализация ответов API прямо из строк ``.values()``.
+
+Модели не создаются: queryset отдаёт словари только с нужными
+колонками, а сериализатор переименовывает их в поля ответа.
+``?fields=id,text`` сужает и SELECT, и ответ.
+"""
+from django.core.files.storage import default_storage
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def media_url(name):
+    return default_storage.url(name) if name else None
+
+
+class Serializer:
+    # Поле ответа -> путь для .values().
+    fields = {}
+    # Преобразования значений: поле ответа -> функция.
+    converters = {}
+    # Колонки, которые выбираются всегда (ключ курсора).
+    key_paths = ()
+
+    def __init__(self, fields=None):
+        if fields is None:
+            self.selected = list(self.fields)
+        else:
+            unknown = [field for field in fields if field not in self.fields]
+            if unknown:
+                raise FieldsError(
+                    f'Неизвестные поля: {", ".join(unknown)}')
+            self.selected = list(fields)
+
+    @classmethod
+    def from_request(cls, request):
+        raw = request.GET.get('fields')
+        if not raw:
+            return cls()
+        return cls([field.strip() for field in raw.split(',')
+                    if field.strip()])
+
+    def values(self, queryset):
+        paths = {self.fields[field] for field in self.selected}
+        paths.update(self.key_paths)
+        return queryset.values(*sorted(paths))
+
+    def row(self, values):
+        result = {}
+        for field in self.selected:
+            value = values[self.fields[field]]
+            converter = self.converters.get(field)
+            result[field] = converter(value) if converter else value
+        return result
+
+    def rows(self, rows):
+        return [self.row(values) for values in rows]
+
+
+class PostSerializer(Serializer):
+    fields = {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    }
+    converters = {'image': media_url}
+    key_paths = ('pub_date', 'id')
+
+
+class GroupSerializer(Serializer):
+    fields = {
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+    }
+
+
+class CommentSerializer(Serializer):
+    fields = {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'pub_date': 'pub_date',
+        'text': 'text',
+    }
+    key_paths = ('pub_date', 'id')
+
+
+class FollowSerializer(Serializer):
+    fields = {
+        'user': 'user__username',
+        'author': 'author__username',
+    }
+    key_paths = ('author_id',)
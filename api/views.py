@@ -0,0 +1,244 @@
+"""JSON API: посты, группы, комментарии и подписки.
+
+Ответы собираются из ``.values()`` (см. ``api.serializers``), списки
+листаются курсором, как и ленты на сайте. Авторизация — сессия сайта,
+поэтому пишущие запросы, как и формы, проходят проверку CSRF.
+"""
+import json
+from functools import wraps
+
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from core.db.routers import pins_primary
+from posts import publishing
+from posts.follows import follow, unfollow
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import CursorPaginator
+
+from .filters import CommentFilter, FollowFilter, PostFilter
+from .serializers import (CommentSerializer, FieldsError, FollowSerializer,
+                          GroupSerializer, PostSerializer)
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+JSON_PARAMS = {'ensure_ascii': False}
+
+
+def respond(data, status=200):
+    return JsonResponse(data, status=status, safe=False,
+                        json_dumps_params=JSON_PARAMS)
+
+
+def error(status, detail, **extra):
+    return respond({'detail': detail, **extra}, status=status)
+
+
+def api_login_required(view=None, safe_methods=()):
+    """Как login_required, но вместо редиректа — 401.
+
+    Методы из ``safe_methods`` доступны и без входа.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in safe_methods
+                    and not request.user.is_authenticated):
+                return error(401, 'Нужна авторизация')
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator(view) if view else decorator
+
+
+def payload(request):
+    """Тело запроса: JSON или обычная форма."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST.dict()
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        size = PAGE_SIZE
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(f'?{query.urlencode()}')
+
+
+def listing(request, serializer_class, filterset_class, queryset,
+            **paginator_options):
+    """Отфильтрованная страница списка в формате API."""
+    try:
+        serializer = serializer_class.from_request(request)
+    except FieldsError as fields_error:
+        return error(400, str(fields_error))
+    filterset = filterset_class(request.GET, queryset=queryset)
+    if not filterset.is_valid():
+        return error(400, 'Неверный фильтр', errors=filterset.errors)
+    paginator = CursorPaginator(serializer.values(filterset.qs),
+                                per_page=page_size(request),
+                                **paginator_options)
+    page = paginator.get_page(request.GET.get('cursor'))
+    return respond({
+        'results': serializer.rows(page),
+        'next': page_url(request, page.next_cursor),
+        'previous': page_url(request, page.previous_cursor),
+    })
+
+
+def detail(request, serializer_class, queryset, status=200):
+    try:
+        serializer = serializer_class.from_request(request)
+    except FieldsError as fields_error:
+        return error(400, str(fields_error))
+    row = serializer.values(queryset).first()
+    if row is None:
+        return error(404, 'Не найдено')
+    return respond(serializer.row(row), status=status)
+
+
+def post_form_data(data, post=None):
+    """Данные для PostForm: группа в API задаётся slug'ом."""
+    form_data = {}
+    if post is not None:
+        form_data = {'text': post.text, 'group': post.group_id}
+    form_data.update(data)
+    slug = data.get('group')
+    if slug:
+        form_data['group'] = (Group.objects
+                              .filter(slug=slug)
+                              .values_list('pk', flat=True)
+                              .first()) or slug
+    return form_data
+
+
+@require_http_methods(['GET', 'POST'])
+@api_login_required(safe_methods=('GET',))
+@pins_primary
+def posts(request):
+    if request.method == 'GET':
+        return listing(request, PostSerializer, PostFilter,
+                       Post.objects.all(), tiebreak='id')
+    data = payload(request)
+    if data is None:
+        return error(400, 'Ожидается JSON-объект')
+    form = PostForm(post_form_data(data), files=request.FILES or None)
+    if not form.is_valid():
+        return error(400, 'Неверные данные', errors=form.errors)
+    post = form.save(commit=False)
+    post.author = request.user
+    publishing.create(post)
+    return detail(request, PostSerializer, Post.objects.filter(pk=post.pk),
+                  status=201)
+
+
+@require_http_methods(['GET', 'PATCH', 'DELETE'])
+@api_login_required(safe_methods=('GET',))
+@pins_primary
+def post_detail(request, post_id):
+    if request.method == 'GET':
+        return detail(request, PostSerializer,
+                      Post.objects.filter(pk=post_id))
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        return error(404, 'Не найдено')
+    if post.author_id != request.user.pk:
+        return error(403, 'Можно менять только свои посты')
+    post.author = request.user
+    if request.method == 'DELETE':
+        publishing.delete(post)
+        return HttpResponse(status=204)
+    data = payload(request)
+    if data is None:
+        return error(400, 'Ожидается JSON-объект')
+    form = PostForm(post_form_data(data, post), instance=post)
+    if not form.is_valid():
+        return error(400, 'Неверные данные', errors=form.errors)
+    post = publishing.edit(form)
+    return detail(request, PostSerializer, Post.objects.filter(pk=post.pk))
+
+
+@require_http_methods(['GET', 'POST'])
+@api_login_required(safe_methods=('GET',))
+@pins_primary
+def comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return error(404, 'Не найдено')
+    if request.method == 'GET':
+        return listing(request, CommentSerializer, CommentFilter,
+                       Comment.objects.filter(post_id=post_id),
+                       tiebreak='id', descending=False)
+    data = payload(request)
+    if data is None:
+        return error(400, 'Ожидается JSON-объект')
+    form = CommentForm(data)
+    if not form.is_valid():
+        return error(400, 'Неверные данные', errors=form.errors)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post_id = post_id
+    publishing.comment(comment)
+    return detail(request, CommentSerializer,
+                  Comment.objects.filter(pk=comment.pk), status=201)
+
+
+@require_http_methods(['GET'])
+def groups(request):
+    try:
+        serializer = GroupSerializer.from_request(request)
+    except FieldsError as fields_error:
+        return error(400, str(fields_error))
+    rows = serializer.values(Group.objects.order_by('slug'))
+    return respond({'results': serializer.rows(rows)})
+
+
+@require_http_methods(['GET'])
+def group_detail(request, slug):
+    return detail(request, GroupSerializer, Group.objects.filter(slug=slug))
+
+
+@require_http_methods(['GET', 'POST'])
+@api_login_required
+@pins_primary
+def follows(request):
+    """Подписки текущего пользователя."""
+    if request.method == 'GET':
+        return listing(request, FollowSerializer, FollowFilter,
+                       Follow.objects.filter(user=request.user),
+                       field='author_id', tiebreak='author_id',
+                       descending=False)
+    data = payload(request)
+    if data is None:
+        return error(400, 'Ожидается JSON-объект')
+    author = User.objects.filter(username=data.get('author')).first()
+    if author is None:
+        return error(400, 'Нет такого автора')
+    if author == request.user:
+        return error(400, 'Нельзя подписаться на себя')
+    if not follow(request.user, author):
+        return error(400, 'Вы уже подписаны')
+    return respond({'user': request.user.username,
+                    'author': author.username}, status=201)
+
+
+@require_http_methods(['DELETE'])
+@api_login_required
+@pins_primary
+def follow_detail(request, username):
+    author = User.objects.filter(username=username).first()
+    if author is None or not unfollow(request.user, author):
+        return error(404, 'Подписки нет')
+    return HttpResponse(status=204)
@@ -0,0 +1,264 @@
+"""Двухуровневый кэш: маленький LRU в процессе поверх общего кэша.
+
+L1 — ограниченный ``OrderedDict`` в памяти воркера, L2 — общий для всех
+воркеров бэкенд из ``CACHES`` (Redis в бою, файлы или база в тестах).
+Чтение сначала смотрит в L1, запись идёт в оба уровня.
+
+Инвалидации (``delete``, ``delete_many``, ``incr``) пишутся в журнал
+в L2: счётчик ``two-tier:seq`` и записи ``two-tier:log:<n>`` со списком
+ключей. Каждый воркер не чаще раза в ``SYNC_INTERVAL`` секунд догоняет
+журнал и выбрасывает из своего L1 только эти ключи — так удаление ключа
+в одном воркере видят все остальные, а остальной L1 живёт дальше. Если
+записи журнала пропали (``clear``, срок истёк, отстали больше чем на
+``LOG_LIMIT``), L1 очищается целиком.
+Перезапись ключа через ``set`` не рассылается: чужие L1 могут отдавать
+старое значение не дольше ``L1_TIMEOUT`` секунд.
+
+Счётчику журнала нужен атомарный ``incr``. У Redis он такой и есть,
+а у файлового кэша Django это чтение и запись; ``LockedFileBasedCache``
+выполняет ``incr`` и ``add`` под файловой блокировкой.
+
+Пример настройки::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TwoTierCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {'L1_MAX_ENTRIES': 1000, 'L1_TIMEOUT': 5},
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:6379',
+        },
+    }
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+from core import perf
+
+SEQ_KEY = 'two-tier:seq'
+LOG_LIMIT = 1000
+LOG_TIMEOUT = 60
+_MISSING = object()
+
+
+def log_key(seq):
+    return f'two-tier:log:{seq}'
+
+
+class LockedFileBasedCache(FileBasedCache):
+    """Файловый кэш с атомарными ``incr`` и ``add`` между процессами."""
+
+    @property
+    def _lock_file(self):
+        os.makedirs(self._dir, exist_ok=True)
+        return os.path.join(self._dir, 'atomic.lock')
+
+    def _locked(self, method, *args, **kwargs):
+        with open(self._lock_file, 'ab') as lock:
+            locks.lock(lock, locks.LOCK_EX)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                locks.unlock(lock)
+
+    def add(self, *args, **kwargs):
+        return self._locked(super().add, *args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        return self._locked(super().incr, *args, **kwargs)
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self._l1_timeout = options.get('L1_TIMEOUT', 5)
+        self._sync_interval = options.get('SYNC_INTERVAL', 1)
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._seq = None
+        self._synced_at = 0.0
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    # L1
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key, _MISSING)
+            if entry is _MISSING:
+                return _MISSING
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._l1[key]
+                return _MISSING
+            self._l1.move_to_end(key)
+            return value
+
+    def _l1_set(self, key, value, timeout):
+        ttl = self._l1_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            if timeout <= 0:
+                self._l1_discard([key])
+                return
+            ttl = min(ttl, timeout)
+        with self._lock:
+            self._l1[key] = (value, time.monotonic() + ttl)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_discard(self, keys):
+        with self._lock:
+            for key in keys:
+                self._l1.pop(key, None)
+
+    # Журнал инвалидаций
+
+    def _clear_l1(self):
+        with self._lock:
+            self._l1.clear()
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < self._sync_interval:
+            return
+        self._synced_at = now
+        seq = self.shared.get(SEQ_KEY)
+        if seq == self._seq:
+            return
+        if (seq is None or self._seq is None
+                or not self._seq < seq <= self._seq + LOG_LIMIT):
+            self._clear_l1()
+        else:
+            keys = [log_key(number)
+                    for number in range(self._seq + 1, seq + 1)]
+            entries = self.shared.get_many(keys)
+            if len(entries) < len(keys):
+                self._clear_l1()
+            else:
+                self._l1_discard(
+                    [key for entry in entries.values() for key in entry])
+        self._seq = seq
+
+    def _broadcast(self, local_keys):
+        try:
+            seq = self.shared.incr(SEQ_KEY)
+        except ValueError:
+            # Случайное начало: воркер, помнящий номер до очистки кэша,
+            # не примет новый журнал за продолжение старого.
+            self.shared.add(SEQ_KEY, random.randrange(1 << 62), None)
+            seq = self.shared.incr(SEQ_KEY)
+        self.shared.set(log_key(seq), list(local_keys), LOG_TIMEOUT)
+
+    # API кэша
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self._sync()
+        value = self._l1_get(local_key)
+        if value is not _MISSING:
+            perf.cache_event(hits=1)
+            return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            perf.cache_event(misses=1)
+            return default
+        perf.cache_event(hits=1)
+        self._l1_set(local_key, value, DEFAULT_TIMEOUT)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        self._sync()
+        found = {}
+        remote = []
+        for key in keys:
+            local_key = self.make_and_validate_key(key, version=version)
+            value = self._l1_get(local_key)
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        if remote:
+            fetched = self.shared.get_many(remote, version=version)
+            for key, value in fetched.items():
+                self._l1_set(self.make_key(key, version=version), value,
+                             DEFAULT_TIMEOUT)
+            found.update(fetched)
+        perf.cache_event(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self.shared.set(key, value, timeout, version=version)
+        self._l1_set(local_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._l1_set(self.make_key(key, version=version), value,
+                             timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._l1_set(local_key, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self._l1_discard([local_key])
+        deleted = self.shared.delete(key, version=version)
+        self._broadcast([local_key])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return
+        local_keys = [self.make_and_validate_key(key, version=version)
+                      for key in keys]
+        self._l1_discard(local_keys)
+        self.shared.delete_many(keys, version=version)
+        self._broadcast(local_keys)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self._l1_discard([local_key])
+        value = self.shared.incr(key, delta, version=version)
+        self._broadcast([local_key])
+        return value
+
+    def clear(self):
+        # Вместе с L2 пропадает и журнал; новый журнал начнётся со
+        # случайного номера, и остальные воркеры очистят L1 целиком.
+        self._clear_l1()
+        self.shared.clear()
+        self._broadcast([])
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,126 @@
+"""Чтение с реплик с гарантией «читаю свои записи».
+
+Читающие страницы помечаются ``@read_replica``: пока работает такая
+вьюха, запросы на чтение уходят на случайную реплику из
+``settings.DATABASE_REPLICAS``. Все записи идут в ``default``.
+
+Реплика отстаёт от основной базы, поэтому пишущие вьюхи помечаются
+``@pins_primary``: если вьюха что-то записала, ответ ставит cookie
+``REPLICA_PIN_COOKIE`` на ``REPLICA_PIN_SECONDS`` секунд. Пока cookie
+жива, все чтения этого браузера идут в ``default`` — автор сразу видит
+свой пост и свой комментарий.
+
+Вне помеченных вьюх (админка, команды, сигналы) читается ``default``.
+Сессии и пользователь запроса всегда читаются из ``default``: на
+отстающей реплике только что вошедший выглядел бы анонимом. Значения,
+которые вьюха кладёт в кэш, прочитав их с реплики, живут не дольше
+``REPLICA_CACHE_TIMEOUT`` (см. ``cache_timeout``): иначе старые данные
+с реплики надолго вернулись бы в кэш сразу после сброса при записи.
+"""
+import random
+from contextvars import ContextVar
+from inspect import iscoroutinefunction
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_PIN_COOKIE = 'primary_pin'
+DEFAULT_PIN_SECONDS = 5
+DEFAULT_CACHE_TIMEOUT = 30
+# Приложения, которые читаются только из default.
+PRIMARY_APPS = ('sessions',)
+
+_use_replica = ContextVar('use_replica', default=False)
+_wrote = ContextVar('wrote', default=None)
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def is_pinned(request):
+    return REPLICA_PIN_COOKIE in request.COOKIES
+
+
+def reading_replica():
+    """Читает ли сейчас код с реплики."""
+    return _use_replica.get() and bool(replicas())
+
+
+def cache_timeout(timeout):
+    """Срок кэша для значения, прочитанного в текущем контексте."""
+    if not reading_replica():
+        return timeout
+    limit = getattr(settings, 'REPLICA_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT)
+    return limit if timeout is None else min(timeout, limit)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if (_use_replica.get() and aliases
+                and model._meta.app_label not in PRIMARY_APPS):
+            return random.choice(aliases)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        wrote = _wrote.get()
+        if wrote is not None:
+            wrote.append(model)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default, объекты с них можно связывать.
+        return True
+
+
+def read_replica(view):
+    """Читать с реплики, если браузер не закреплён за основной базой."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if is_pinned(request):
+                return await view(request, *args, **kwargs)
+            if hasattr(request, 'auser'):
+                request.user = await request.auser()
+            token = _use_replica.set(True)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if is_pinned(request):
+            return view(request, *args, **kwargs)
+        if hasattr(request, 'user'):
+            # Ленивый пользователь загружается здесь, из default.
+            request.user.is_authenticated
+        token = _use_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+def pins_primary(view):
+    """После записи закрепить браузер за основной базой."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _wrote.set([])
+        try:
+            response = view(request, *args, **kwargs)
+            wrote = bool(_wrote.get())
+        finally:
+            _wrote.reset(token)
+        if wrote:
+            response.set_cookie(
+                REPLICA_PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS',
+                                DEFAULT_PIN_SECONDS),
+                httponly=True, samesite='Lax')
+        return response
+    return wrapper
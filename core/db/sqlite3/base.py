@@ -0,0 +1,111 @@
+"""SQLite с очередью записи внутри процесса.
+
+WAL, PRAGMA и ``BEGIN IMMEDIATE`` настраивает стандартный бэкенд через
+``OPTIONS['init_command']`` и ``OPTIONS['transaction_mode']`` (см.
+``DATABASES`` в настройках). Этот бэкенд добавляет к ним только
+блокировку на файл базы в памяти процесса: пишущий запрос или
+транзакция потока ждёт её в Python, а не крутит busy timeout SQLite.
+Чтения в autocommit блокировку не трогают.
+
+Это не очередь между процессами: другие процессы (воркеры, команды
+``manage.py``) по-прежнему ждут блокировку записи самой SQLite не
+дольше ``timeout``. Включается через ``'ENGINE': 'core.db.sqlite3'``;
+``OPTIONS['timeout']`` — сколько ждать и блокировку процесса.
+"""
+import threading
+from collections import defaultdict
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'BEGIN',
+                    'CREATE', 'DROP', 'ALTER')
+DEFAULT_TIMEOUT = 5
+
+_write_locks = defaultdict(threading.Lock)
+_write_locks_guard = threading.Lock()
+
+
+def write_lock(name):
+    with _write_locks_guard:
+        return _write_locks[str(name)]
+
+
+def is_write(query):
+    return query.lstrip()[:7].upper().startswith(WRITE_STATEMENTS)
+
+
+class SerializedCursorWrapper(base.SQLiteCursorWrapper):
+    """Курсор, который берёт блокировку записи перед пишущим запросом."""
+
+    database = None
+
+    def execute(self, query, params=None):
+        if not is_write(query):
+            return super().execute(query, params)
+        self.database.acquire_write_lock()
+        try:
+            return super().execute(query, params)
+        finally:
+            self.database.release_write_lock_outside_transaction()
+
+    def executemany(self, query, param_list):
+        if not is_write(query):
+            return super().executemany(query, param_list)
+        self.database.acquire_write_lock()
+        try:
+            return super().executemany(query, param_list)
+        finally:
+            self.database.release_write_lock_outside_transaction()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.write_timeout = options.get('timeout', DEFAULT_TIMEOUT)
+        self._write_lock = write_lock(self.settings_dict['NAME'])
+        self._holds_write_lock = False
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SerializedCursorWrapper)
+        cursor.database = self
+        return cursor
+
+    # Блокировка записи
+
+    def acquire_write_lock(self):
+        if self._holds_write_lock:
+            return
+        if not self._write_lock.acquire(timeout=self.write_timeout):
+            raise OperationalError(
+                'database is locked: блокировка записи процесса занята '
+                f'дольше {self.write_timeout} с')
+        self._holds_write_lock = True
+
+    def release_write_lock(self):
+        if self._holds_write_lock:
+            self._holds_write_lock = False
+            self._write_lock.release()
+
+    def release_write_lock_outside_transaction(self):
+        if self.connection is None or not self.connection.in_transaction:
+            self.release_write_lock()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_write_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_write_lock()
@@ -0,0 +1,240 @@
+"""Замеры запросов: время, SQL, кэш, шаблоны и размер ответа по вьюхам.
+
+``PerfMiddleware`` включает замер для доли запросов
+``settings.PERF_SAMPLE_RATE`` (0 — выключено, 1 — все). Для выбранного
+запроса в контекстной переменной лежит ``Sample``; кэш и рендер
+шаблонов сообщают о себе через ``cache_event`` и ``timed_render``,
+а SQL — через ``execute_wrapper``, который вешается на каждое
+соединение при его создании. Вне замера хуки стоят одного чтения
+ContextVar. ContextVar переходит и в потоки ``sync_to_async``, так что
+async-вьюхи замеряются так же.
+
+Результаты копятся в процессе, в гистограммах ``Histogram`` по имени
+вьюхи (``posts:home``), и показываются на ``/stats/`` и ``/metrics``.
+"""
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+_sample = ContextVar('perf_sample', default=None)
+
+
+class Histogram:
+    """Гистограмма в духе HDR: лог-линейные корзины с точностью ~3%.
+
+    Значения — неотрицательные целые (микросекунды, байты, штуки).
+    До 64 каждое значение в своей корзине, дальше в каждом интервале
+    [2^k, 2^(k+1)) по 32 корзины одинаковой ширины, поэтому память
+    растёт с логарифмом диапазона, а не с числом замеров.
+    """
+
+    SUB_BUCKET_BITS = 6
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def _bucket(self, value):
+        shift = max(value.bit_length() - self.SUB_BUCKET_BITS, 0)
+        return (value >> shift) << shift, shift
+
+    def record(self, value):
+        value = max(int(value), 0)
+        lower, _ = self._bucket(value)
+        self.counts[lower] = self.counts.get(lower, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, share):
+        """Верхняя граница корзины, в которую попал перцентиль."""
+        if not self.count:
+            return 0
+        rank = max(share * self.count, 1)
+        seen = 0
+        for lower in sorted(self.counts):
+            seen += self.counts[lower]
+            if seen >= rank:
+                _, shift = self._bucket(lower)
+                return min(lower + (1 << shift) - 1, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+
+# Метрики вьюхи: имя -> единица измерения.
+METRICS = {
+    'wall': 'us',
+    'db_queries': 'count',
+    'db_time': 'us',
+    'template_time': 'us',
+    'response_size': 'bytes',
+}
+
+
+class ViewStats:
+    def __init__(self):
+        self.histograms = {name: Histogram() for name in METRICS}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class Registry:
+    """Статистика процесса по вьюхам."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def add(self, view_name, sample):
+        with self.lock:
+            stats = self.views.setdefault(view_name, ViewStats())
+            for name, value in sample.values().items():
+                stats.histograms[name].record(value)
+            stats.cache_hits += sample.cache_hits
+            stats.cache_misses += sample.cache_misses
+
+    def snapshot(self):
+        with self.lock:
+            return sorted(self.views.items())
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+
+registry = Registry()
+
+
+class Sample:
+    """Замер одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.wall = 0.0
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.response_size = 0
+
+    def values(self):
+        return {
+            'wall': self.wall * 1e6,
+            'db_queries': self.db_queries,
+            'db_time': self.db_time * 1e6,
+            'template_time': self.template_time * 1e6,
+            'response_size': self.response_size,
+        }
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """execute_wrapper: время и число SQL-запросов замеряемого запроса."""
+    sample = _sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.db_time += time.perf_counter() - started
+        sample.db_queries += 1
+
+
+def connection_created(sender, connection, **kwargs):
+    if db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_wrapper)
+
+
+def cache_event(hits=0, misses=0):
+    sample = _sample.get()
+    if sample is not None:
+        sample.cache_hits += hits
+        sample.cache_misses += misses
+
+
+def timed_render(render):
+    """Обёртка рендера шаблона; вложенные рендеры не считаются дважды."""
+    def wrapper(*args, **kwargs):
+        sample = _sample.get()
+        if sample is None:
+            return render(*args, **kwargs)
+        sample.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(*args, **kwargs)
+        finally:
+            sample.template_depth -= 1
+            if not sample.template_depth:
+                sample.template_time += time.perf_counter() - started
+    wrapper.perf_timed = True
+    return wrapper
+
+
+def install_template_timer():
+    from django.template.backends.django import Template
+
+    if not getattr(Template.render, 'perf_timed', False):
+        Template.render = timed_render(Template.render)
+
+
+def _sampled():
+    rate = getattr(settings, 'PERF_SAMPLE_RATE', 0)
+    return rate and random.random() < rate
+
+
+def _finish(request, response, sample):
+    sample.wall = time.perf_counter() - sample.started
+    if not response.streaming:
+        sample.response_size = len(response.content)
+    match = request.resolver_match
+    registry.add(match.view_name if match else '<unresolved>', sample)
+
+
+class PerfMiddleware:
+    """Замеряет долю запросов и складывает результаты в ``registry``."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_timer()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not _sampled():
+            return self.get_response(request)
+        sample = Sample()
+        token = _sample.set(sample)
+        try:
+            response = self.get_response(request)
+        finally:
+            _sample.reset(token)
+        _finish(request, response, sample)
+        return response
+
+    async def __acall__(self, request):
+        if not _sampled():
+            return await self.get_response(request)
+        sample = Sample()
+        token = _sample.set(sample)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _sample.reset(token)
+        _finish(request, response, sample)
+        return response
@@ -0,0 +1,219 @@
+"""Поиск N+1 и повторяющихся SQL-запросов в разработке и тестах.
+
+Каждый запрос получает «отпечаток» — SQL без значений, где списки
+``IN (...)`` схлопнуты. Затем для запроса запоминается место, откуда
+он пришёл: строка шаблона, если запрос случился при рендере, иначе
+ближайший кадр кода проекта. Проблемы две:
+
+* N+1 — один отпечаток из одного места не меньше
+  ``QUERY_CHECK_REPEAT`` раз (запрос в цикле);
+* дубль — один и тот же SQL с теми же параметрами дважды.
+
+``QueryCheckMiddleware`` проверяет каждый запрос к сайту, а ещё
+сравнивает число SQL с бюджетом вьюхи из ``QUERY_BUDGETS``. Режим
+``QUERY_CHECK``: ``'off'``, ``'warn'`` (в лог) или ``'strict'``
+(исключение ``QueryProblem``). ``QueryCheckRunner`` включает строгий
+режим для ``manage.py test``, поэтому лишний запрос валит тест.
+
+В тестах можно проверить и кусок кода::
+
+    with querycheck.record() as recorder:
+        ...
+    self.assertEqual(recorder.problems(), [])
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.base import Node
+from django.test.runner import DiscoverRunner
+
+logger = logging.getLogger(__name__)
+
+_recorder = ContextVar('query_recorder', default=None)
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+\b')
+IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+# Кадры, которые не считаются местом запроса.
+SKIP_FILES = tuple(os.path.join('core', name) for name in (
+    'db', 'perf.py', 'querycheck.py', 'cache.py'))
+
+
+class QueryProblem(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql.replace('%s', '?'))
+    sql = IN_LIST_RE.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+def _project_dir():
+    return str(settings.BASE_DIR) + os.sep
+
+
+def location():
+    """Строка шаблона или кадр кода проекта, откуда пришёл запрос."""
+    project = _project_dir()
+    code_frame = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        # type(), а не isinstance: isinstance у ленивого объекта
+        # (request.user) вычислит его и сделает новый запрос.
+        if issubclass(type(node), Node) and getattr(node, 'token', None):
+            origin = getattr(node, 'origin', None)
+            name = getattr(origin, 'template_name', None) or '?'
+            where = f'{name}:{node.token.lineno}'
+            return f'{where} → {code_frame}' if code_frame else where
+        filename = frame.f_code.co_filename
+        if (code_frame is None and filename.startswith(project)
+                and 'site-packages' not in filename
+                and not filename[len(project):].startswith(SKIP_FILES)):
+            code_frame = (f'{filename[len(project):]}:{frame.f_lineno} '
+                          f'in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return code_frame or '?'
+
+
+class Recorder:
+    """Запросы одного HTTP-запроса или блока кода."""
+
+    def __init__(self, repeat=None):
+        self.repeat = repeat or getattr(settings, 'QUERY_CHECK_REPEAT', 3)
+        self.queries = []
+
+    def add(self, sql, params):
+        self.queries.append((sql, _freeze(params), fingerprint(sql),
+                             location()))
+
+    def __len__(self):
+        return len(self.queries)
+
+    def problems(self):
+        found = []
+        loops = set()
+        shapes = Counter((shape, where)
+                         for _, _, shape, where in self.queries)
+        for (shape, where), count in shapes.items():
+            if count >= self.repeat:
+                loops.add((shape, where))
+                found.append(f'N+1: {count} × {shape} ({where})')
+        first_seen = {}
+        same = Counter()
+        for sql, params, shape, where in self.queries:
+            first_seen.setdefault((sql, params), (shape, where))
+            same[sql, params] += 1
+        for key, count in same.items():
+            shape, where = first_seen[key]
+            if count > 1 and (shape, where) not in loops:
+                found.append(f'дубль: {count} × {shape} ({where})')
+        return found
+
+
+def _freeze(params):
+    if isinstance(params, (list, tuple)):
+        return tuple(_freeze(param) for param in params)
+    if isinstance(params, dict):
+        return tuple(sorted(params.items()))
+    return params
+
+
+def db_wrapper(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.add(sql, params)
+    return execute(sql, params, many, context)
+
+
+def connection_created(sender, connection, **kwargs):
+    if db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_wrapper)
+
+
+@contextmanager
+def record(repeat=None):
+    recorder = Recorder(repeat)
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+def mode():
+    return getattr(settings, 'QUERY_CHECK', 'off')
+
+
+def check(view_name, recorder):
+    """Проблемы запроса к вьюхе, включая превышение бюджета."""
+    problems = recorder.problems()
+    budget = getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+    if budget is not None and len(recorder) > budget:
+        queries = ''.join(f'\n  {shape} ({where})'
+                          for _, _, shape, where in recorder.queries)
+        problems.insert(0, f'{view_name}: {len(recorder)} SQL-запросов '
+                           f'при бюджете {budget}:{queries}')
+    return problems
+
+
+def report(request, recorder):
+    match = request.resolver_match
+    view_name = match.view_name if match else '<unresolved>'
+    problems = check(view_name, recorder)
+    if not problems:
+        return
+    message = f'{request.method} {request.path}:\n' + '\n'.join(problems)
+    if mode() == 'strict':
+        raise QueryProblem(message)
+    logger.warning(message)
+
+
+class QueryCheckMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if mode() == 'off':
+            return self.get_response(request)
+        with record() as recorder:
+            response = self.get_response(request)
+        report(request, recorder)
+        return response
+
+    async def __acall__(self, request):
+        if mode() == 'off':
+            return await self.get_response(request)
+        with record() as recorder:
+            response = await self.get_response(request)
+        report(request, recorder)
+        return response
+
+
+class QueryCheckRunner(DiscoverRunner):
+    """Тесты со строгой проверкой запросов."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._query_check = mode()
+        settings.QUERY_CHECK = 'strict'
+
+    def teardown_test_environment(self, **kwargs):
+        settings.QUERY_CHECK = self._query_check
+        super().teardown_test_environment(**kwargs)
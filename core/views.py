@@ -0,0 +1,83 @@
+import hmac
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, HttpResponseForbidden
+from django.shortcuts import render
+
+from . import perf
+
+QUANTILES = (0.5, 0.95, 0.99)
+# Единицы гистограмм -> (суффикс имени в Prometheus, множитель).
+PROMETHEUS_UNITS = {
+    'us': ('_seconds', 1e-6),
+    'bytes': ('_bytes', 1),
+    'count': ('', 1),
+}
+
+
+@staff_member_required
+def stats(request):
+    """Перцентили замеров по вьюхам этого процесса."""
+    rows = []
+    for view_name, view_stats in perf.registry.snapshot():
+        histograms = view_stats.histograms
+        lookups = view_stats.cache_hits + view_stats.cache_misses
+        rows.append({
+            'view': view_name,
+            'count': histograms['wall'].count,
+            'metrics': [
+                (name, perf.METRICS[name],
+                 [histograms[name].percentile(share) for share in QUANTILES],
+                 histograms[name].max)
+                for name in perf.METRICS
+            ],
+            'cache_hit_ratio': (view_stats.cache_hits / lookups
+                                if lookups else None),
+        })
+    context = {
+        'rows': rows,
+        'quantiles': QUANTILES,
+        'sample_rate': getattr(settings, 'PERF_SAMPLE_RATE', 0),
+    }
+    return render(request, 'core/stats.html', context)
+
+
+def _has_token(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    sent = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(sent, f'Bearer {token}')
+
+
+def metrics(request):
+    """Те же замеры в текстовом формате Prometheus (summary).
+
+    Доступ — персоналу или по ``METRICS_TOKEN``: адрес клиента за
+    прокси ничего не доказывает.
+    """
+    if not (request.user.is_staff or _has_token(request)):
+        return HttpResponseForbidden()
+    lines = []
+    snapshot = perf.registry.snapshot()
+    for name, unit in perf.METRICS.items():
+        suffix, scale = PROMETHEUS_UNITS[unit]
+        metric = f'yatube_request_{name}{suffix}'
+        lines.append(f'# TYPE {metric} summary')
+        for view_name, view_stats in snapshot:
+            histogram = view_stats.histograms[name]
+            label = f'view="{view_name}"'
+            for share in QUANTILES:
+                value = histogram.percentile(share) * scale
+                lines.append(f'{metric}{{{label},quantile="{share}"}} '
+                             f'{value:g}')
+            lines.append(f'{metric}_sum{{{label}}} '
+                         f'{histogram.total * scale:g}')
+            lines.append(f'{metric}_count{{{label}}} {histogram.count}')
+    for field in ('cache_hits', 'cache_misses'):
+        metric = f'yatube_{field}_total'
+        lines.append(f'# TYPE {metric} counter')
+        for view_name, view_stats in snapshot:
+            lines.append(f'{metric}{{view="{view_name}"}} '
+                         f'{getattr(view_stats, field)}')
+    return HttpResponse('\n'.join(lines) + '\n',
+                        content_type='text/plain; version=0.0.4')
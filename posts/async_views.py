@@ -0,0 +1,211 @@
+"""Async-версии читающих страниц для запуска под ASGI.
+
+Работают на async ORM, а независимые запросы страницы (пост,
+комментарии, счётчики, подписка) запускаются вместе через
+``asyncio.gather``. Рендер карточек и шаблонов синхронный и идёт
+через ``sync_to_async``. Подключаются в ``posts/urls.py`` при
+``ASYNC_VIEWS = True`` (его включает ``yatube/asgi.py``).
+
+``live_posts`` async всегда: открытое SSE-соединение — это ждущая
+корутина, а не занятый поток.
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render
+
+from core.db.routers import read_replica
+
+from . import (cards, counters, follows, live, recommendations, timeline,
+               versions)
+from .forms import CommentForm
+from .models import Group, Post, User
+from .utils import CursorPaginator, comments_paginator, feed
+
+render_cards = sync_to_async(cards.render_cards)
+
+LIVE_POLL_TIMEOUT = getattr(settings, 'LIVE_POLL_TIMEOUT', 25)
+LIVE_STREAM_SECONDS = getattr(settings, 'LIVE_STREAM_SECONDS', 5 * 60)
+LIVE_HEARTBEAT = 15
+
+
+async def _page(request, posts):
+    paginator = CursorPaginator(feed(posts))
+    return await paginator.aget_page(request.GET.get('cursor'))
+
+
+@sync_to_async
+def _follow_state(user, author):
+    """Подписка на автора, «ваши» подписчики автора и рекомендации."""
+    if not user.is_authenticated:
+        return False, [], []
+    who_to_follow = recommendations.for_user(user.pk)
+    if user == author:
+        return False, [], who_to_follow
+    return (follows.is_following(user.pk, author.pk),
+            follows.known_followers(user.pk, author.pk), who_to_follow)
+
+
+async def _render_feed(request, template, page_obj, context):
+    context = {
+        **context,
+        'page_obj': page_obj,
+        'cards': await render_cards(request, page_obj),
+    }
+    return await sync_to_async(render)(request, template, context)
+
+
+@read_replica
+@versions.conditional(versions.index_resources)
+async def index(request):
+    request.user = await request.auser()
+    page_obj = await _page(request, Post.objects.all())
+    return await _render_feed(request, 'posts/index.html', page_obj, {})
+
+
+@read_replica
+@versions.conditional(versions.group_resources)
+async def group_posts(request, slug):
+    request.user = await request.auser()
+    group, page_obj = await asyncio.gather(
+        aget_object_or_404(Group, slug=slug),
+        _page(request, Post.objects.filter(group__slug=slug)),
+    )
+    return await _render_feed(request, 'posts/group_list.html', page_obj,
+                              {'group': group})
+
+
+@read_replica
+@versions.conditional(versions.profile_resources)
+async def profile(request, username):
+    request.user = await request.auser()
+    author, page_obj, author_counters = await asyncio.gather(
+        aget_object_or_404(User, username=username),
+        _page(request, Post.objects.filter(author__username=username)),
+        counters.acounters_for(user__username=username),
+    )
+    following, known_followers, who_to_follow = await _follow_state(
+        request.user, author)
+    return await _render_feed(request, 'posts/profile.html', page_obj, {
+        'author': author,
+        'counters': author_counters,
+        'following': following,
+        'known_followers': User.objects.filter(
+            pk__in=known_followers[:follows.KNOWN_FOLLOWERS]),
+        'known_total': len(known_followers),
+        'recommendations': who_to_follow,
+    })
+
+
+@read_replica
+@versions.conditional(versions.post_resources)
+async def post_detail(request, post_id):
+    """Страница одной записи."""
+    request.user = await request.auser()
+    try:
+        post, comment_list, author_counters = await asyncio.gather(
+            Post.objects
+            .select_related('author', 'group', 'thumbnail')
+            .prefetch_related('variants')
+            .aget(pk=post_id),
+            comments_paginator(post_id).aget_page(),
+            counters.acounters_for(user__posts=post_id),
+        )
+    except Post.DoesNotExist:
+        raise Http404
+    context = {
+        'post': post,
+        'post_count': author_counters.posts,
+        'form': CommentForm(),
+        'comments': comment_list,
+    }
+    return await sync_to_async(render)(
+        request, 'posts/post_detail.html', context)
+
+
+@login_required
+async def follow_index(request):
+    request.user = await request.auser()
+    page_obj = await timeline.afeed_page(request.user,
+                                         request.GET.get('cursor'))
+    who_to_follow = await sync_to_async(recommendations.for_user)(
+        request.user.pk)
+    return await _render_feed(request, 'posts/follow.html', page_obj,
+                              {'recommendations': who_to_follow})
+
+
+async def _live_filter(request):
+    """Фильтр событий ленты из ?feed=index|group|follow."""
+    feed = request.GET.get('feed', 'index')
+    if feed == 'index':
+        return {}
+    if feed == 'group':
+        group = await aget_object_or_404(Group,
+                                         slug=request.GET.get('group'))
+        return {'group_id': group.pk}
+    if feed == 'follow' and request.user.is_authenticated:
+        return {'authors': await follows.afollowing_ids(request.user.pk)}
+    return None
+
+
+def _live_start(request):
+    raw = request.GET.get('last') or request.headers.get('Last-Event-ID')
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _live_events(last, timeout, live_filter):
+    """Ждёт подходящих событий новее last не дольше timeout."""
+    deadline = time.monotonic() + timeout
+    while True:
+        events = await live.broker.wait(
+            last, max(deadline - time.monotonic(), 0))
+        if events:
+            last = max(last, events[-1].seq)
+        matched = [event for event in events
+                   if live.matches(event, **live_filter)]
+        if matched or time.monotonic() >= deadline:
+            return last, matched
+
+
+async def _live_stream(last, live_filter):
+    yield 'retry: 3000\n\n'
+    deadline = time.monotonic() + LIVE_STREAM_SECONDS
+    while time.monotonic() < deadline:
+        last, events = await _live_events(last, LIVE_HEARTBEAT, live_filter)
+        for event in events:
+            data = json.dumps({'id': event.post_id})
+            yield f'id: {event.seq}\ndata: {data}\n\n'
+        if not events:
+            yield ': ping\n\n'
+            last = await sync_to_async(live.resume)(last)
+
+
+async def live_posts(request):
+    """Новые посты ленты: SSE-поток или long-poll (?mode=poll)."""
+    request.user = await request.auser()
+    live_filter = await _live_filter(request)
+    if live_filter is None:
+        return JsonResponse({'detail': 'Неизвестная лента'}, status=400)
+    last = _live_start(request)
+    if last is None:
+        last = await sync_to_async(live.current_seq)()
+    else:
+        last = await sync_to_async(live.resume)(last)
+    if request.GET.get('mode') == 'poll':
+        last, events = await _live_events(last, LIVE_POLL_TIMEOUT,
+                                          live_filter)
+        return JsonResponse({'last': last,
+                             'posts': [event.post_id for event in events]})
+    response = StreamingHttpResponse(_live_stream(last, live_filter),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
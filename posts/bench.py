@@ -0,0 +1,330 @@
+"""Нагрузочные прогоны страниц.
+
+WSGI-режим вызывает ``WSGIHandler`` из пула потоков, ASGI-режим —
+``ASGIHandler`` в одном event loop; в обоих ``concurrency`` запросов
+идут одновременно. Оба режима ходят в одну и ту же базу, поэтому
+результаты сравнимы.
+
+Сценарии (``run_scenarios``) по очереди гоняют главную, группу,
+профиль, пост, ленту подписок и создание поста тестовым клиентом или
+по HTTP к запущенному серверу и считают задержки и число SQL на
+запрос. Результат — JSON, который можно сравнить с прошлым прогоном
+через ``compare``.
+"""
+import asyncio
+import io
+import itertools
+import math
+import random
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import Client
+
+from .models import Group, Post, User, UserCounter
+
+SCENARIOS = ('index', 'group_posts', 'profile', 'post_detail',
+             'follow_index', 'post_create')
+# Метрики, которые сравнивает compare(); у всех меньше — лучше.
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_mean')
+
+
+def default_paths():
+    """Главная, первая группа, профиль и страница последнего поста."""
+    paths = ['/']
+    group = Group.objects.order_by('pk').values_list('slug', flat=True)
+    post = Post.objects.values_list('pk', 'author__username').first()
+    if group.first():
+        paths.append(f'/group/{group.first()}/')
+    if post:
+        paths.append(f'/profile/{post[1]}/')
+        paths.append(f'/posts/{post[0]}/')
+    return paths
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу; values отсортированы."""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(share * len(values)) - 1, 0)
+    return values[rank]
+
+
+def summary(mode, timings, elapsed, errors):
+    timings = sorted(timings)
+    return {
+        'mode': mode,
+        'requests': len(timings),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rps': round(len(timings) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+    }
+
+
+def wsgi_environ(path, host):
+    path, _, query = path.partition('?')
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+    }
+
+
+def asgi_scope(path, host):
+    path, _, query = path.partition('?')
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'root_path': '',
+        'query_string': query.encode(),
+        'headers': [(b'host', host.encode())],
+        'server': (host, 80),
+    }
+
+
+def run_wsgi(paths, requests, concurrency, host='localhost'):
+    handler = WSGIHandler()
+
+    def call(number):
+        statuses = []
+        started = time.perf_counter()
+        body = handler(wsgi_environ(paths[number % len(paths)], host),
+                       lambda status, headers: statuses.append(status))
+        b''.join(body)
+        body.close()
+        failed = int(statuses[0].split()[0]) >= 400
+        return time.perf_counter() - started, failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(call, range(requests)))
+    elapsed = time.perf_counter() - started
+    return summary('wsgi', [timing for timing, _ in results], elapsed,
+                   sum(failed for _, failed in results))
+
+
+def run_asgi(paths, requests, concurrency, host='localhost'):
+    handler = ASGIHandler()
+
+    async def call(number, slots):
+        async with slots:
+            statuses = []
+            disconnected = asyncio.Event()
+            messages = [{'type': 'http.request', 'body': b''}]
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            started = time.perf_counter()
+            await handler(asgi_scope(paths[number % len(paths)], host),
+                          receive, send)
+            disconnected.set()
+            return time.perf_counter() - started, statuses[0] >= 400
+
+    async def main():
+        slots = asyncio.Semaphore(concurrency)
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(call(number, slots) for number in range(requests)))
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(main())
+    return summary('asgi', [timing for timing, _ in results], elapsed,
+                   sum(failed for _, failed in results))
+
+
+def pick_targets(limit=20, seed=0):
+    """Адреса для сценариев: самые популярные группы, авторы и посты.
+
+    Читатель ленты — пользователь с наибольшим числом подписок.
+    """
+    rng = random.Random(seed)
+    slugs = list(Group.objects.order_by('pk')
+                 .values_list('slug', flat=True)[:limit])
+    authors = list(UserCounter.objects.order_by('-followers')
+                   .values_list('user__username', flat=True)[:limit])
+    posts = list(Post.objects.order_by('-pub_date')
+                 .values_list('pk', flat=True)[:limit * 5])
+    reader = (UserCounter.objects.order_by('-following')
+              .values_list('user__username', flat=True).first()
+              or User.objects.values_list('username', flat=True).first())
+    for values in (slugs, authors, posts):
+        rng.shuffle(values)
+    return {
+        'reader': reader,
+        'index': ['/'],
+        'group_posts': [f'/group/{slug}/' for slug in slugs],
+        'profile': [f'/profile/{username}/' for username in authors],
+        'post_detail': [f'/posts/{pk}/' for pk in posts],
+        'follow_index': ['/follow/'],
+        'post_create': ['/create/'],
+    }
+
+
+class QueryCounter:
+    """execute_wrapper, который только считает запросы."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class ClientDriver:
+    """Запросы через тестовый клиент в этом же процессе."""
+
+    counts_queries = True
+
+    def __init__(self, host, reader):
+        self.anonymous = Client(SERVER_NAME=host)
+        self.reader = Client(SERVER_NAME=host)
+        user = User.objects.filter(username=reader).first()
+        if user is not None:
+            self.reader.force_login(user)
+
+    def request(self, path, authenticated, data=None):
+        client = self.reader if authenticated else self.anonymous
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            if data is None:
+                response = client.get(path)
+            else:
+                response = client.post(path, data)
+        return response.status_code, counter.count
+
+
+class HTTPDriver:
+    """Запросы к запущенному серверу; SQL здесь не сосчитать."""
+
+    counts_queries = False
+
+    def __init__(self, base_url, reader):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = {}
+        user = User.objects.filter(username=reader).first()
+        if user is not None:
+            # Сессию создаём в общей базе — сервер её увидит.
+            client = Client()
+            client.force_login(user)
+            self.cookies[settings.SESSION_COOKIE_NAME] = (
+                client.cookies[settings.SESSION_COOKIE_NAME].value)
+
+    def _open(self, path, cookies, data=None):
+        headers = {}
+        if cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}'
+                                          for name, value in cookies.items())
+        body = None
+        if data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers['X-CSRFToken'] = cookies.get(settings.CSRF_COOKIE_NAME,
+                                                 '')
+            headers['Referer'] = self.base_url + path
+        request = urllib.request.Request(self.base_url + path, body, headers)
+        opener = urllib.request.build_opener(NoRedirect)
+        try:
+            with opener.open(request) as response:
+                response.read()
+                return response.status, response.headers
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers
+
+    def request(self, path, authenticated, data=None):
+        cookies = self.cookies if authenticated else {}
+        if data is not None and settings.CSRF_COOKIE_NAME not in cookies:
+            _, headers = self._open(path, cookies)
+            jar = SimpleCookie()
+            for header in headers.get_all('Set-Cookie') or ():
+                jar.load(header)
+            if settings.CSRF_COOKIE_NAME in jar:
+                cookies[settings.CSRF_COOKIE_NAME] = (
+                    jar[settings.CSRF_COOKIE_NAME].value)
+        status, _ = self._open(path, cookies, data)
+        return status, None
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def run_scenario(driver, name, paths, requests, warmup=0):
+    authenticated = name in ('follow_index', 'post_create')
+    cycle = itertools.cycle(paths)
+    timings, queries, errors = [], [], 0
+    started = time.perf_counter()
+    for number in range(warmup + requests):
+        data = None
+        if name == 'post_create':
+            data = {'text': f'Нагрузочный пост {number}'}
+        request_started = time.perf_counter()
+        status, count = driver.request(next(cycle), authenticated, data)
+        if number < warmup:
+            started = time.perf_counter()
+            continue
+        timings.append(time.perf_counter() - request_started)
+        errors += status >= 400
+        if count is not None:
+            queries.append(count)
+    result = summary(name, timings, time.perf_counter() - started, errors)
+    del result['mode']
+    if queries:
+        result['queries_mean'] = round(sum(queries) / len(queries), 2)
+        result['queries_max'] = max(queries)
+    return result
+
+
+def run_scenarios(driver, targets, requests, names=SCENARIOS, warmup=5):
+    return {name: run_scenario(driver, name, targets[name], requests, warmup)
+            for name in names}
+
+
+def compare(before, after):
+    """Строки таблицы «было / стало» по общим сценариям."""
+    lines = [f'{"сценарий":<14}{"метрика":<14}{"было":>10}'
+             f'{"стало":>10}{"изм.":>9}']
+    for name, metrics in after['scenarios'].items():
+        old = before['scenarios'].get(name)
+        if old is None:
+            continue
+        for metric in COMPARED:
+            if metric not in old or metric not in metrics:
+                continue
+            change = ''
+            if old[metric]:
+                change = f'{(metrics[metric] / old[metric] - 1) * 100:+.1f}%'
+            lines.append(f'{name:<14}{metric:<14}{old[metric]:>10}'
+                         f'{metrics[metric]:>10}{change:>9}')
+    return lines
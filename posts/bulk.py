@@ -0,0 +1,357 @@
+"""Потоковый импорт и экспорт постов, комментариев, подписок и групп.
+
+Экспорт читает базу через ``iterator()``, импорт пишет пачками через
+``bulk_create`` — память не зависит от размера файла. Авторы и группы
+во входных данных указываются естественными ключами (username и slug)
+и разрешаются через ``NaturalKeyCache``: один запрос на пачку
+неизвестных ключей, дальше из словаря.
+
+id постов и комментариев из файла сохраняются, если свободны. Если
+id занят другой записью, запись получает новый id, а комментарии к
+посту идут за ним по словарю ``Importer.post_ids``: в памяти остаются
+только такие переназначенные id. Повторный импорт ничего не добавляет:
+строка пропускается, если в базе уже есть запись с тем же id, автором
+и датой или — для получивших новый id — с тем же автором, датой и
+текстом (у комментариев ещё и пост). Комментарии к постам, которых
+нет ни в файле, ни в базе, пропускаются.
+"""
+import csv
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 2000
+
+# Поля выгрузки: имя в файле -> путь в values_list().
+EXPORT_FIELDS = {
+    'group': {
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+        'text': 'text',
+    },
+    'post': {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+    },
+    'comment': {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'pub_date': 'pub_date',
+        'text': 'text',
+    },
+    'follow': {
+        'user': 'user__username',
+        'author': 'author__username',
+    },
+}
+MODELS = {
+    'group': Group,
+    'post': Post,
+    'comment': Comment,
+    'follow': Follow,
+}
+# Порядок, в котором модели выгружаются и сбрасываются в базу.
+ORDER = ('group', 'post', 'comment', 'follow')
+
+
+def export_rows(model):
+    """Словари строк модели для выгрузки, по одному за раз."""
+    fields = EXPORT_FIELDS[model]
+    rows = (MODELS[model].objects
+            .order_by('pk')
+            .values_list(*fields.values())
+            .iterator(chunk_size=CHUNK_SIZE))
+    for values in rows:
+        row = dict(zip(fields, values))
+        if isinstance(row.get('pub_date'), datetime):
+            row['pub_date'] = row['pub_date'].isoformat()
+        if row.get('group') is None and model == 'post':
+            row['group'] = ''
+        yield row
+
+
+def write_jsonl(stream, models):
+    total = 0
+    for model in models:
+        for row in export_rows(model):
+            stream.write(json.dumps({'model': model, **row},
+                                    ensure_ascii=False))
+            stream.write('\n')
+            total += 1
+    return total
+
+
+def write_csv(stream, model):
+    writer = csv.DictWriter(stream, fieldnames=list(EXPORT_FIELDS[model]))
+    writer.writeheader()
+    total = 0
+    for row in export_rows(model):
+        writer.writerow(row)
+        total += 1
+    return total
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(stream, model):
+    for row in csv.DictReader(stream):
+        yield {'model': model, **row}
+
+
+class NaturalKeyCache:
+    """Словарь естественный ключ -> id с догрузкой пачками."""
+
+    def __init__(self, queryset, field, create=None):
+        self.queryset = queryset
+        self.field = field
+        self.create = create
+        self.ids = {}
+
+    def load(self, keys):
+        unknown = {key for key in keys if key and key not in self.ids}
+        if not unknown:
+            return
+        self.ids.update(self.queryset
+                        .filter(**{f'{self.field}__in': unknown})
+                        .values_list(self.field, 'pk'))
+        missing = unknown - self.ids.keys()
+        if missing and self.create is not None:
+            self.create(missing)
+            self.ids.update(self.queryset
+                            .filter(**{f'{self.field}__in': missing})
+                            .values_list(self.field, 'pk'))
+
+    def __getitem__(self, key):
+        if not key:
+            return None
+        return self.ids[key]
+
+
+def create_users(usernames):
+    User.objects.bulk_create(
+        [User(username=username, password=make_password(None))
+         for username in usernames],
+        ignore_conflicts=True,
+    )
+
+
+def parse_date(value):
+    return datetime.fromisoformat(value) if value else timezone.now()
+
+
+def file_id(value):
+    return int(value) if value else None
+
+
+def _existing(model, ids, fields):
+    """id -> значения fields для записей, которые уже есть в базе."""
+    return {pk: tuple(values) for pk, *values in model.objects
+            .filter(pk__in=ids)
+            .values_list('pk', *fields)}
+
+
+def _matching(model, objects, fields):
+    """Значения fields -> id для записей базы, совпадающих с объектами.
+
+    Нужна для повторного импорта строк, которым в прошлый раз достался
+    новый id: по id из файла их уже не узнать.
+    """
+    narrowed = {f'{field}__in': {getattr(obj, field) for obj in objects}
+                for field in fields[:2]}
+    return {tuple(values): pk for pk, *values in model.objects
+            .filter(**narrowed)
+            .values_list('pk', *fields)}
+
+
+def _place(objects, rows, existing, key, matching, fields):
+    """Раздаёт объектам id из файла.
+
+    Возвращает [(id в файле, объект)] для вставки и словарь id в файле
+    -> id в базе для строк, импортированных раньше под другим id.
+    Уже импортированные объекты отбрасываются; у занятых другой записью
+    id остаётся None, и база выдаст новый.
+    """
+    placed, taken, moved = [], set(), {}
+    for obj, row in zip(objects, rows):
+        wanted = file_id(row.get('id'))
+        if wanted in existing and existing[wanted] == key(obj):
+            continue
+        found = matching.get(tuple(getattr(obj, field) for field in fields))
+        if found is not None:
+            if wanted is not None and found != wanted:
+                moved[wanted] = found
+            continue
+        if (wanted is not None and wanted not in existing
+                and wanted not in taken):
+            obj.pk = wanted
+            taken.add(wanted)
+        placed.append((wanted, obj))
+    return placed, moved
+
+
+class MediaCopier:
+    """Параллельно копирует картинки, держа ограниченную очередь задач."""
+
+    def __init__(self, source, workers):
+        self.source = source
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.limit = workers * 4
+        self.pending = set()
+        self.copied = 0
+
+    def copy(self, name):
+        while len(self.pending) >= self.limit:
+            done, self.pending = wait(self.pending,
+                                      return_when=FIRST_COMPLETED)
+            self._collect(done)
+        self.pending.add(self.executor.submit(self._copy_one, name))
+
+    def _copy_one(self, name):
+        target = os.path.join(settings.MEDIA_ROOT, name)
+        if os.path.exists(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(os.path.join(self.source, name), target)
+
+    def _collect(self, futures):
+        for future in futures:
+            future.result()
+            self.copied += 1
+
+    def close(self):
+        done, _ = wait(self.pending)
+        self._collect(done)
+        self.pending = set()
+        self.executor.shutdown()
+
+
+class Importer:
+    """Копит строки по моделям и сбрасывает их пачками."""
+
+    def __init__(self, batch_size=BATCH_SIZE, create_missing_users=True,
+                 media=None):
+        self.batch_size = batch_size
+        self.users = NaturalKeyCache(
+            User.objects, 'username',
+            create=create_users if create_missing_users else None)
+        self.groups = NaturalKeyCache(Group.objects, 'slug')
+        self.media = media
+        self.buffers = {model: [] for model in ORDER}
+        self.counts = dict.fromkeys(ORDER, 0)
+        self.skipped = Counter()
+        # id поста в файле -> id в базе, если id из файла был занят.
+        self.post_ids = {}
+
+    def add(self, row):
+        model = row.pop('model')
+        if model not in self.buffers:
+            raise ValueError(f'Неизвестная модель: {model}')
+        self.buffers[model].append(row)
+        if len(self.buffers[model]) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        """Сбрасывает модель, а перед ней все, от которых она зависит."""
+        last = ORDER.index(model) if model else len(ORDER) - 1
+        for name in ORDER[:last + 1]:
+            rows, self.buffers[name] = self.buffers[name], []
+            if rows:
+                with transaction.atomic():
+                    getattr(self, f'_save_{name}')(rows)
+                self.counts[name] += len(rows)
+
+    def _save_group(self, rows):
+        Group.objects.bulk_create(
+            [Group(slug=row['slug'], title=row['title'],
+                   description=row['description'],
+                   text=row.get('text', ''))
+             for row in rows],
+            ignore_conflicts=True,
+        )
+
+    def _save_post(self, rows):
+        self.users.load(row['author'] for row in rows)
+        self.groups.load(row.get('group') for row in rows)
+        posts = [Post(text=row['text'],
+                      pub_date=parse_date(row.get('pub_date')),
+                      author_id=self.users[row['author']],
+                      group_id=self.groups[row.get('group')],
+                      image=row.get('image') or '')
+                 for row in rows]
+        existing = _existing(
+            Post, [file_id(row.get('id')) for row in rows],
+            ('author_id', 'pub_date'))
+        fields = ('author_id', 'pub_date', 'text')
+        placed, moved = _place(
+            posts, rows, existing,
+            lambda post: (post.author_id, post.pub_date),
+            _matching(Post, posts, fields), fields)
+        self.post_ids.update(moved)
+        Post.objects.bulk_create([post for _, post in placed])
+        for wanted, post in placed:
+            if wanted is not None and post.pk != wanted:
+                self.post_ids[wanted] = post.pk
+        if self.media is not None:
+            for row in rows:
+                if row.get('image'):
+                    self.media.copy(row['image'])
+
+    def _save_comment(self, rows):
+        self.users.load(row['author'] for row in rows)
+        post_ids = [self.post_ids.get(file_id(row['post']),
+                                      file_id(row['post']))
+                    for row in rows]
+        present = set(Post.objects
+                      .filter(pk__in=post_ids)
+                      .values_list('pk', flat=True))
+        kept = [(row, post_id) for row, post_id in zip(rows, post_ids)
+                if post_id in present]
+        self.skipped['comment'] += len(rows) - len(kept)
+        rows = [row for row, _ in kept]
+        comments = [Comment(post_id=post_id,
+                            author_id=self.users[row['author']],
+                            pub_date=parse_date(row.get('pub_date')),
+                            text=row['text'])
+                    for row, post_id in kept]
+        existing = _existing(
+            Comment, [file_id(row.get('id')) for row in rows],
+            ('post_id', 'author_id', 'pub_date'))
+        fields = ('post_id', 'author_id', 'pub_date', 'text')
+        placed, _ = _place(
+            comments, rows, existing,
+            lambda comment: (comment.post_id, comment.author_id,
+                             comment.pub_date),
+            _matching(Comment, comments, fields), fields)
+        Comment.objects.bulk_create([comment for _, comment in placed])
+
+    def _save_follow(self, rows):
+        self.users.load(key for row in rows
+                        for key in (row['user'], row['author']))
+        Follow.objects.bulk_create(
+            [Follow(user_id=self.users[row['user']],
+                    author_id=self.users[row['author']])
+             for row in rows
+             if row['user'] != row['author']],
+            ignore_conflicts=True,
+        )
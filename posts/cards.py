@@ -0,0 +1,54 @@
+"""Кэш отрендеренных карточек постов (includes/card.html).
+
+Каждая карточка лежит в кэше под своим ключом
+``card:<версия шаблона>:<id поста>:<вариант>``; страница ленты
+собирается одним ``get_many``, и рендерятся только промахи.
+Вариант нужен потому, что авторизованным видны ссылки на
+редактирование. Сбрасываются карточки сигналами из ``posts.signals``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.db.routers import cache_timeout
+
+CARD_TEMPLATE = 'includes/card.html'
+# Увеличьте при изменении card.html, чтобы не отдавать старую разметку.
+CARD_VERSION = 3
+CARD_TIMEOUT = getattr(settings, 'CARD_CACHE_TIMEOUT', 60 * 60)
+VARIANTS = ('anon', 'auth')
+
+
+def card_key(post_id, variant):
+    return f'card:{CARD_VERSION}:{post_id}:{variant}'
+
+
+def render_cards(request, posts):
+    """Карточки страницы: из кэша, а недостающие — рендерим и кладём."""
+    variant = VARIANTS[request.user.is_authenticated]
+    keys = [card_key(post.pk, variant) for post in posts]
+    cached = cache.get_many(keys)
+    # Варианты картинок нужны только тем карточкам, что будем рендерить.
+    prefetch_related_objects(
+        [post for key, post in zip(keys, posts)
+         if key not in cached and post.image],
+        'variants')
+    missing = {}
+    cards = []
+    for key, post in zip(keys, posts):
+        if key not in cached:
+            missing[key] = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'user': request.user})
+        cards.append(mark_safe(cached.get(key) or missing[key]))
+    if missing:
+        cache.set_many(missing, cache_timeout(CARD_TIMEOUT))
+    return cards
+
+
+def invalidate(post_ids):
+    """Сбрасывает все варианты карточек указанных постов."""
+    cache.delete_many([card_key(post_id, variant)
+                       for post_id in post_ids
+                       for variant in VARIANTS])
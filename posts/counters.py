@@ -0,0 +1,114 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются в той же транзакции, что и сами данные, поэтому
+страницы читают готовые числа вместо ``COUNT(*)`` на каждый запрос.
+Если счётчики разошлись с данными (например, после правок в админке),
+их пересчитывает ``manage.py rebuild_counters``.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, User, UserCounter
+
+BATCH_SIZE = 1000
+
+
+def _shifted(field, delta):
+    # Данные, изменённые мимо счётчиков (ORM, админка), могут увести
+    # счётчик в минус, а это нарушило бы CHECK и сорвало саму запись.
+    return Greatest(F(field) + delta, 0)
+
+
+def bump(user_id, **deltas):
+    """Сдвигает счётчики пользователя: ``bump(1, posts=1)``.
+
+    Счётчик не опускается ниже нуля.
+    """
+    changes = {field: _shifted(field, delta)
+               for field, delta in deltas.items()}
+    counters = UserCounter.objects.filter(user_id=user_id)
+    if counters.update(**changes):
+        return
+    # Строки ещё нет: создаём её сразу с нужными значениями. Если её
+    # успел создать параллельный запрос, повторяем UPDATE.
+    try:
+        with transaction.atomic():
+            UserCounter.objects.create(
+                user_id=user_id,
+                **{field: max(delta, 0) for field, delta in deltas.items()})
+    except IntegrityError:
+        counters.update(**changes)
+
+
+def bump_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_shifted('comments_count', delta))
+
+
+def counters_for(user):
+    """Счётчики пользователя; для новых — нули без записи в базу."""
+    try:
+        return user.counters
+    except UserCounter.DoesNotExist:
+        return UserCounter(user=user)
+
+
+def _counts(queryset, field, ids):
+    return dict(queryset
+                .filter(**{f'{field}__in': ids})
+                .order_by()
+                .values_list(field)
+                .annotate(total=Count('*')))
+
+
+def rebuild_users(ids):
+    """Пересчитывает счётчики для пачки пользователей."""
+    posts = _counts(Post.objects, 'author_id', ids)
+    followers = _counts(Follow.objects, 'author_id', ids)
+    following = _counts(Follow.objects, 'user_id', ids)
+    UserCounter.objects.bulk_create(
+        [UserCounter(user_id=user_id,
+                     posts=posts.get(user_id, 0),
+                     followers=followers.get(user_id, 0),
+                     following=following.get(user_id, 0))
+         for user_id in ids],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['posts', 'followers', 'following'],
+    )
+
+
+def rebuild_comments():
+    comments = (Comment.objects
+                .filter(post=OuterRef('pk'))
+                .order_by()
+                .values('post')
+                .annotate(total=Count('*'))
+                .values('total'))
+    return Post.objects.update(
+        comments_count=Coalesce(Subquery(comments), 0))
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Пересчитывает все счётчики пачками; возвращает число пользователей."""
+    ids = User.objects.order_by('pk').values_list('pk', flat=True)
+    total = 0
+    batch = []
+    for user_id in ids.iterator(chunk_size=batch_size):
+        batch.append(user_id)
+        if len(batch) == batch_size:
+            rebuild_users(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        rebuild_users(batch)
+        total += len(batch)
+    rebuild_comments()
+    return total
+
+
+async def acounters_for(**lookup):
+    """Счётчики для async-вьюх: ``acounters_for(user__username=...)``."""
+    counter = await UserCounter.objects.filter(**lookup).afirst()
+    return counter or UserCounter()
@@ -0,0 +1,141 @@
+"""Подписки и отписки одной командой SQL.
+
+Подписка — ``INSERT ... ON CONFLICT DO NOTHING``, отписка — ``DELETE``;
+по ``rowcount`` видно, появилась ли строка на самом деле. Поэтому
+двойной клик и параллельные запросы не падают на ``unique_following``
+и не сдвигают счётчики дважды: счётчики, лента подписок и метки версий
+меняются в той же транзакции и только вместе со строкой.
+
+Проверки подписок (``is_following``, ``known_followers``) читают граф
+в памяти (``posts.graph``), а если его нет — базу. Множество авторов,
+на которых подписан пользователь, ещё и лежит в кэше
+(``following_ids``): по нему живая лента фильтрует события. При
+изменении кэш сбрасывается сразу и ещё раз после коммита, а после
+коммита отправляется сигнал ``changed``, по которому обновляется граф.
+Сырой SQL не шлёт сигналов модели, поэтому всё это делается здесь.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.dispatch import Signal
+
+from core.db.routers import cache_timeout
+
+from . import counters, graph, timeline, versions
+from .models import Follow
+
+FOLLOWING_TIMEOUT = getattr(settings, 'FOLLOWING_CACHE_TIMEOUT', 300)
+# Сколько «ваших» подписчиков автора показывать по имени на профиле.
+KNOWN_FOLLOWERS = 3
+
+FOLLOW_SQL = """
+    INSERT INTO {follow} (user_id, author_id) VALUES (%s, %s)
+    ON CONFLICT DO NOTHING
+"""
+UNFOLLOW_SQL = 'DELETE FROM {follow} WHERE user_id = %s AND author_id = %s'
+
+# Подписка появилась или исчезла: user_id, author_id, following.
+changed = Signal()
+
+
+def following_key(user_id):
+    return f'following:{user_id}'
+
+
+def _following_query(user_id):
+    return (Follow.objects
+            .filter(user_id=user_id)
+            .order_by()
+            .values_list('author_id', flat=True))
+
+
+def following_ids(user_id):
+    """Множество id авторов, на которых подписан пользователь."""
+    ids = cache.get(following_key(user_id))
+    if ids is None:
+        ids = list(_following_query(user_id))
+        cache.set(following_key(user_id), ids,
+                  cache_timeout(FOLLOWING_TIMEOUT))
+    return set(ids)
+
+
+async def afollowing_ids(user_id):
+    ids = await cache.aget(following_key(user_id))
+    if ids is None:
+        ids = [author_id async for author_id in _following_query(user_id)]
+        await cache.aset(following_key(user_id), ids,
+                         cache_timeout(FOLLOWING_TIMEOUT))
+    return set(ids)
+
+
+def is_following(user_id, author_id):
+    found = graph.use(graph.FollowGraph.is_following, user_id, author_id)
+    if found is None:
+        return author_id in following_ids(user_id)
+    return found
+
+
+def known_followers(user_id, author_id):
+    """Id тех, на кого подписан пользователь, кто подписан на автора."""
+    found = graph.use(graph.FollowGraph.followed_by_following,
+                      user_id, author_id)
+    if found is None:
+        found = (Follow.objects
+                 .filter(author_id=author_id,
+                         user_id__in=_following_query(user_id))
+                 .order_by('user_id')
+                 .values_list('user_id', flat=True))
+    return list(found)
+
+
+def forget(*user_ids):
+    cache.delete_many([following_key(user_id) for user_id in user_ids])
+
+
+def notify(user_id, author_id, usernames, following):
+    """Сбрасывает кэши после изменения подписки внутри транзакции."""
+    versions.bump(*(f'author:{username}' for username in usernames))
+    forget(user_id)
+    # Читатель мог успеть положить в кэш старый список до коммита.
+    transaction.on_commit(partial(forget, user_id))
+    transaction.on_commit(partial(
+        changed.send, sender=Follow, user_id=user_id,
+        author_id=author_id, following=following))
+
+
+def _execute(sql, user_id, author_id):
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(follow=Follow._meta.db_table),
+                       [user_id, author_id])
+        return cursor.rowcount == 1
+
+
+def _shift(user, author, delta):
+    counters.bump(user.pk, following=delta)
+    counters.bump(author.pk, followers=delta)
+    notify(user.pk, author.pk, (user.username, author.username), delta > 0)
+
+
+def follow(user, author):
+    """Подписывает user на author; False, если подписка уже была."""
+    if user.pk == author.pk:
+        return False
+    with transaction.atomic():
+        created = _execute(FOLLOW_SQL, user.pk, author.pk)
+        if created:
+            _shift(user, author, 1)
+            timeline.backfill(user, author)
+    return created
+
+
+def unfollow(user, author):
+    """Отписывает user от author; False, если подписки не было."""
+    with transaction.atomic():
+        deleted = _execute(UNFOLLOW_SQL, user.pk, author.pk)
+        if deleted:
+            _shift(user, author, -1)
+            timeline.drop(user, author)
+            timeline.reconcile(author.pk)
+    return deleted
@@ -0,0 +1,337 @@
+"""Граф подписок в памяти процесса.
+
+Рёбра ``Follow`` лежат в двух сжатых списках смежности (CSR): от
+подписчика к авторам и от автора к подписчикам. Каждый — три
+``array('q')``: отсортированные id вершин, смещения и отсортированные
+id соседей. Ребро стоит 16 байт (по 8 в каждую сторону), миллион
+подписок — около 16 МБ. Если подписок больше ``FOLLOW_GRAPH_MAX_EDGES``,
+граф не загружается, функции модуля возвращают ``None``, и вызывающий
+код идёт в базу, как раньше.
+
+``is_following`` — бинарный поиск в списке соседей, O(log n).
+Изменения после загрузки копятся в небольших множествах поверх
+массивов и через ``COMPACT_AFTER`` изменений вливаются в новые массивы.
+
+Граф обновляется по сигналу ``follows.changed`` (после коммита). Чтобы
+изменения доходили и до других воркеров, каждое пишется в общий кэш:
+счётчик ``follow-graph:seq`` и записи ``follow-graph:log:<n>``. Номер
+выдаёт атомарный ``incr`` общего кэша (Redis или
+``LockedFileBasedCache``), так что два воркера не запишут изменения
+под одним номером. Перед чтением граф догоняет этот журнал, а если
+записей уже нет (кэш очищен, срок истёк, отстали больше чем на
+``LOG_LIMIT``) — перечитывает базу.
+"""
+import random
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Follow
+
+GRAPH_CACHE = getattr(settings, 'FOLLOW_GRAPH_CACHE', 'shared')
+MAX_EDGES = getattr(settings, 'FOLLOW_GRAPH_MAX_EDGES', 5_000_000)
+COMPACT_AFTER = 10000
+LOG_LIMIT = 1000
+LOG_TIMEOUT = 600
+# Как часто снова пробовать загрузить граф, который не поместился.
+RETRY_AFTER = 300
+SEQ_KEY = 'follow-graph:seq'
+CHUNK_SIZE = 10000
+
+
+class TooLarge(Exception):
+    pass
+
+
+def log_key(seq):
+    return f'follow-graph:log:{seq}'
+
+
+def _limited(pairs, limit):
+    for count, pair in enumerate(pairs, 1):
+        if count > limit:
+            raise TooLarge(limit)
+        yield pair
+
+
+class Adjacency:
+    """Списки смежности: CSR-массивы и изменения поверх них.
+
+    Изменения держат инварианты: ``added`` не пересекается с массивами,
+    ``removed`` — их подмножество.
+    """
+
+    def __init__(self, pairs=()):
+        """pairs — пары (вершина, сосед), отсортированные по возрастанию."""
+        self.nodes = array('q')
+        self.offsets = array('q', [0])
+        self.targets = array('q')
+        for node, target in pairs:
+            if not self.nodes or self.nodes[-1] != node:
+                if self.nodes:
+                    self.offsets.append(len(self.targets))
+                self.nodes.append(node)
+            self.targets.append(target)
+        if self.nodes:
+            self.offsets.append(len(self.targets))
+        self.added = {}
+        self.removed = {}
+        self.size = len(self.targets)
+        self.changes = 0
+
+    def _range(self, node):
+        index = bisect_left(self.nodes, node)
+        if index < len(self.nodes) and self.nodes[index] == node:
+            return self.offsets[index], self.offsets[index + 1]
+        return 0, 0
+
+    def _stored(self, node, target):
+        low, high = self._range(node)
+        index = bisect_left(self.targets, target, low, high)
+        return index < high and self.targets[index] == target
+
+    def contains(self, node, target):
+        if target in self.added.get(node, ()):
+            return True
+        if target in self.removed.get(node, ()):
+            return False
+        return self._stored(node, target)
+
+    def neighbours(self, node):
+        """Отсортированные соседи вершины."""
+        low, high = self._range(node)
+        stored = self.targets[low:high]
+        if node not in self.added and node not in self.removed:
+            return stored
+        merged = (set(stored) | self.added.get(node, set())) - \
+            self.removed.get(node, set())
+        return array('q', sorted(merged))
+
+    def degree(self, node):
+        low, high = self._range(node)
+        return (high - low + len(self.added.get(node, ()))
+                - len(self.removed.get(node, ())))
+
+    @staticmethod
+    def _discard(changes, node, target):
+        targets = changes[node]
+        targets.discard(target)
+        if not targets:
+            del changes[node]
+
+    def add(self, node, target):
+        if self.contains(node, target):
+            return
+        if self._stored(node, target):
+            self._discard(self.removed, node, target)
+        else:
+            self.added.setdefault(node, set()).add(target)
+        self.size += 1
+        self.changes += 1
+
+    def remove(self, node, target):
+        if not self.contains(node, target):
+            return
+        if self._stored(node, target):
+            self.removed.setdefault(node, set()).add(target)
+        else:
+            self._discard(self.added, node, target)
+        self.size -= 1
+        self.changes += 1
+
+    def reversed(self):
+        """Обратные списки (сосед → вершины) без сортировки пар.
+
+        Сортировка подсчётом: вершины обходятся по возрастанию, поэтому
+        списки в результате тоже отсортированы.
+        """
+        assert not self.added and not self.removed
+        result = Adjacency()
+        result.nodes = array('q', sorted(set(self.targets)))
+        index = {node: number for number, node in enumerate(result.nodes)}
+        counts = array('q', bytes(8 * len(result.nodes)))
+        for target in self.targets:
+            counts[index[target]] += 1
+        result.offsets = array('q', [0])
+        for count in counts:
+            result.offsets.append(result.offsets[-1] + count)
+        positions = result.offsets[:-1]
+        result.targets = array('q', bytes(8 * len(self.targets)))
+        for number, node in enumerate(self.nodes):
+            for position in range(self.offsets[number],
+                                  self.offsets[number + 1]):
+                slot = index[self.targets[position]]
+                result.targets[positions[slot]] = node
+                positions[slot] += 1
+        result.size = len(result.targets)
+        return result
+
+    def edges(self):
+        nodes = sorted(set(self.nodes) | set(self.added))
+        for node in nodes:
+            for target in self.neighbours(node):
+                yield node, target
+
+    def compacted(self):
+        return Adjacency(self.edges())
+
+
+class FollowGraph:
+    def __init__(self, following=None, followers=None):
+        self.following = following or Adjacency()
+        self.followers = followers or Adjacency()
+
+    @classmethod
+    def load(cls, max_edges=None):
+        """Граф из базы одним запросом; TooLarge, если рёбер больше.
+
+        Всегда с основной базы, даже внутри ``read_replica``: граф живёт
+        весь процесс и догоняет журнал с номера, взятого по основной
+        базе, поэтому рёбра, не доехавшие до реплики, потерялись бы.
+        """
+        pairs = (Follow.objects.using(DEFAULT_DB_ALIAS)
+                 .order_by('user_id', 'author_id')
+                 .values_list('user_id', 'author_id')
+                 .iterator(chunk_size=CHUNK_SIZE))
+        if max_edges is not None:
+            pairs = _limited(pairs, max_edges)
+        following = Adjacency(pairs)
+        return cls(following, following.reversed())
+
+    def __len__(self):
+        return self.following.size
+
+    def is_following(self, user_id, author_id):
+        return self.following.contains(user_id, author_id)
+
+    def following_ids(self, user_id):
+        return self.following.neighbours(user_id)
+
+    def follower_ids(self, author_id):
+        return self.followers.neighbours(author_id)
+
+    def follower_count(self, author_id):
+        return self.followers.degree(author_id)
+
+    def followed_by_following(self, user_id, author_id):
+        """Те, на кого подписан user, кто сам подписан на author.
+
+        Проходим меньший из двух списков и ищем в другом бинарным поиском.
+        """
+        following = self.following_ids(user_id)
+        followers = self.follower_ids(author_id)
+        if len(following) <= len(followers):
+            return [middle for middle in following
+                    if self.following.contains(middle, author_id)]
+        return [middle for middle in followers
+                if self.following.contains(user_id, middle)]
+
+    def apply(self, user_id, author_id, following):
+        if following:
+            self.following.add(user_id, author_id)
+            self.followers.add(author_id, user_id)
+        else:
+            self.following.remove(user_id, author_id)
+            self.followers.remove(author_id, user_id)
+        if self.following.changes >= COMPACT_AFTER:
+            self.following = self.following.compacted()
+            self.followers = self.followers.compacted()
+
+
+_graph = None
+_applied = None
+_refused_at = None
+_lock = threading.Lock()
+
+
+def _cache():
+    return caches[GRAPH_CACHE]
+
+
+def _start():
+    # Счётчик начинается со случайного числа: процесс, помнящий номер до
+    # очистки кэша, не примет новый журнал за продолжение старого.
+    _cache().add(SEQ_KEY, random.randrange(1 << 62), None)
+    return _cache().get(SEQ_KEY)
+
+
+def position():
+    """Номер последней записи журнала изменений."""
+    seq = _cache().get(SEQ_KEY)
+    return _start() if seq is None else seq
+
+
+def _reload(seq):
+    global _graph, _applied, _refused_at
+    _applied = seq
+    try:
+        _graph = FollowGraph.load(MAX_EDGES)
+        _refused_at = None
+    except TooLarge:
+        _graph = None
+        _refused_at = time.monotonic()
+
+
+def _catch_up():
+    """Граф с учётом журнала общего кэша; None, если он не помещается."""
+    global _applied
+    seq = position()
+    if _refused_at is not None:
+        if time.monotonic() - _refused_at < RETRY_AFTER:
+            return None
+        _reload(seq)
+        return _graph
+    if _graph is None or not _applied <= seq <= _applied + LOG_LIMIT:
+        _reload(seq)
+        return _graph
+    if seq > _applied:
+        keys = [log_key(number) for number in range(_applied + 1, seq + 1)]
+        entries = _cache().get_many(keys)
+        if len(entries) < len(keys):
+            _reload(seq)
+            return _graph
+        for key in keys:
+            _graph.apply(*entries[key])
+        _applied = seq
+    return _graph
+
+
+def use(func, *args):
+    """``func(graph, *args)`` на актуальном графе под блокировкой.
+
+    None, если подписок больше ``MAX_EDGES`` и графа нет.
+    """
+    with _lock:
+        graph = _catch_up()
+        return None if graph is None else func(graph, *args)
+
+
+def record(user_id, author_id, following):
+    """Вносит закоммиченное изменение в журнал и в граф процесса."""
+    global _graph, _applied
+    entry = (user_id, author_id, following)
+    with _lock:
+        try:
+            seq = _cache().incr(SEQ_KEY)
+        except ValueError:
+            # Кэш очистили: новый счётчик заставит все процессы
+            # перечитать базу, в том числе этот.
+            _start()
+            _graph = None
+            return
+        _cache().set(log_key(seq), entry, LOG_TIMEOUT)
+        if _graph is not None and _applied == seq - 1:
+            _graph.apply(*entry)
+            _applied = seq
+
+
+def reset():
+    """Забывает граф; следующее чтение загрузит его заново."""
+    global _graph, _applied, _refused_at
+    with _lock:
+        _graph = _applied = _refused_at = None
@@ -0,0 +1,203 @@
+"""Оповещения о новых постах для SSE и long-poll (``/live/``).
+
+Каждый новый пост получает номер из общего счётчика в кэше
+(``live:seq``) и кладётся туда же под ``live:event:<номер>`` —
+так о нём узнают все воркеры. Счётчик полагается на атомарные
+``incr`` и ``add`` общего кэша (Redis или ``LockedFileBasedCache``),
+поэтому два воркера не получат один номер. Внутри процесса события лежат в
+ограниченной очереди ``Broker``; ждущие клиенты — это корутины с
+future в своём event loop, а не потоки, поэтому тысячи открытых
+соединений под ASGI почти ничего не стоят.
+
+Посты из других процессов подбирает один фоновый поток на процесс:
+раз в ``POLL_INTERVAL`` секунд он сверяет общий счётчик и догружает
+недостающие события из кэша. Номер, которого в кэше не нашлось
+(событие вытеснено или истекло), запрашивается один раз: дальше
+поток идёт от последнего сверенного номера.
+
+Ключ счётчика может пропасть (кэш очистили или вытеснили). Новый
+счётчик начинается со случайного числа, как журналы ``posts.graph`` и
+``TwoTierCache``. Если общий номер оказался меньше последнего события
+в очереди, счёт начался заново: очередь процесса сбрасывается, а
+клиент, чей ``last`` больше текущего номера, читает её с начала.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+BACKLOG = getattr(settings, 'LIVE_BACKLOG', 1000)
+POLL_INTERVAL = getattr(settings, 'LIVE_POLL_INTERVAL', 1)
+EVENT_TIMEOUT = 10 * 60
+SEQ_KEY = 'live:seq'
+
+Event = namedtuple('Event', 'seq post_id author_id group_id')
+
+
+def _cache():
+    return caches[getattr(settings, 'LIVE_CACHE', 'shared')]
+
+
+def event_key(seq):
+    return f'live:event:{seq}'
+
+
+class Broker:
+    """Очередь последних событий процесса и ждущие их клиенты."""
+
+    def __init__(self, backlog=BACKLOG):
+        self.events = deque(maxlen=backlog)
+        self.lock = threading.Lock()
+        self.waiters = set()
+        self.poller = None
+        # До какого номера общий кэш уже сверен.
+        self.synced = 0
+
+    def head(self):
+        with self.lock:
+            return self.events[-1].seq if self.events else 0
+
+    def add(self, events):
+        """Добавляет события (в любом порядке) и будит ждущих."""
+        with self.lock:
+            known = {event.seq for event in self.events}
+            fresh = [event for event in events if event.seq not in known]
+            if not fresh:
+                return
+            merged = sorted([*self.events, *fresh])
+            self.events.clear()
+            self.events.extend(merged)
+            waiters, self.waiters = self.waiters, set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def since(self, seq):
+        with self.lock:
+            return [event for event in self.events if event.seq > seq]
+
+    def observe(self, head):
+        """Сверяет очередь с общим номером; True, если счёт начат заново.
+
+        Все события эпохи счётчика не больше его значения, поэтому
+        номер меньше последнего события значит новый счётчик.
+        """
+        with self.lock:
+            if head >= max(self.synced,
+                           self.events[-1].seq if self.events else 0):
+                return False
+            self.events.clear()
+            self.synced = 0
+            return True
+
+    def missing(self, head):
+        """Несверенные номера до head, которых нет в очереди."""
+        self.observe(head)
+        with self.lock:
+            known = {event.seq for event in self.events}
+            first = max(head - self.events.maxlen, self.synced) + 1
+            self.synced = head
+        return [seq for seq in range(first, head + 1) if seq not in known]
+
+    async def wait(self, seq, timeout):
+        """События новее seq; ждёт первого не дольше timeout секунд."""
+        self.start_poller()
+        future = asyncio.get_running_loop().create_future()
+        entry = (asyncio.get_running_loop(), future)
+        with self.lock:
+            self.waiters.add(entry)
+        try:
+            events = self.since(seq)
+            if not events:
+                try:
+                    await asyncio.wait_for(future, timeout)
+                except asyncio.TimeoutError:
+                    pass
+                events = self.since(seq)
+            return events
+        finally:
+            with self.lock:
+                self.waiters.discard(entry)
+
+    def start_poller(self):
+        with self.lock:
+            if self.poller is not None:
+                return
+            self.poller = threading.Thread(target=self._poll, daemon=True,
+                                           name='live-poller')
+        self.poller.start()
+
+    def _poll(self):
+        while True:
+            time.sleep(POLL_INTERVAL)
+            try:
+                self.sync()
+            except Exception:
+                # Кэш недоступен — попробуем в следующий раз.
+                continue
+
+    def sync(self):
+        """Догружает из общего кэша события других процессов."""
+        head = _cache().get(SEQ_KEY) or 0
+        seqs = self.missing(head)
+        if not seqs:
+            return
+        found = _cache().get_many([event_key(seq) for seq in seqs])
+        self.add([Event(*value) for value in found.values()])
+
+
+broker = Broker()
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _next_seq():
+    cache = _cache()
+    try:
+        return cache.incr(SEQ_KEY)
+    except ValueError:
+        cache.add(SEQ_KEY, random.randrange(1 << 62), None)
+        return cache.incr(SEQ_KEY)
+
+
+def publish(post):
+    """Сообщает о новом посте всем воркерам."""
+    event = Event(_next_seq(), post.pk, post.author_id, post.group_id)
+    _cache().set(event_key(event.seq), tuple(event), EVENT_TIMEOUT)
+    if event.seq <= broker.head():
+        # Либо соседний поток опередил нас, либо счётчик новый —
+        # различает их текущее значение в кэше.
+        broker.observe(_cache().get(SEQ_KEY) or 0)
+    broker.add([event])
+    return event
+
+
+def current_seq():
+    """Номер последнего события — с него начинает новый клиент."""
+    head = _cache().get(SEQ_KEY)
+    if head is not None:
+        broker.observe(head)
+    return max(head or 0, broker.head())
+
+
+def resume(last):
+    """Номер, с которого продолжать клиента, видевшего last.
+
+    Клиент впереди текущего номера помнит старый счётчик — отдаём ему
+    всю очередь нового.
+    """
+    return 0 if last > current_seq() else last
+
+
+def matches(event, group_id=None, authors=None):
+    if group_id is not None and event.group_id != group_id:
+        return False
+    if authors is not None and event.author_id not in authors:
+        return False
+    return True
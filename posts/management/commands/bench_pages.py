@@ -0,0 +1,81 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from posts import bench
+from posts.models import Comment, Follow, Post, User
+
+
+class Command(BaseCommand):
+    help = ('Гоняет сценарии главной, группы, профиля, поста, ленты '
+            'подписок и создания поста; печатает p50/p95/p99 и число '
+            'SQL на запрос в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Запросов на сценарий')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Запросов прогрева, не идут в замер')
+        parser.add_argument('--scenario', action='append',
+                            choices=bench.SCENARIOS, dest='scenarios',
+                            help='Сценарий; можно несколько раз')
+        parser.add_argument('--server',
+                            help='Адрес запущенного сервера, например '
+                                 'http://127.0.0.1:8000; без него — '
+                                 'тестовый клиент в этом процессе')
+        parser.add_argument('--host', default='localhost',
+                            help='Имя хоста для тестового клиента')
+        parser.add_argument('--reader',
+                            help='Чья лента подписок и кто пишет посты')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Куда записать JSON')
+        parser.add_argument('--compare',
+                            help='JSON прошлого прогона для сравнения')
+
+    def handle(self, *args, **options):
+        before = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as stream:
+                before = json.load(stream)
+        targets = bench.pick_targets(seed=options['seed'])
+        reader = options['reader'] or targets['reader']
+        if reader is None:
+            raise CommandError('В базе нет пользователей: '
+                               'сначала manage.py generate_data')
+        if options['server']:
+            driver = bench.HTTPDriver(options['server'], reader)
+        else:
+            driver = bench.ClientDriver(options['host'], reader)
+        # Проверка N+1 в режиме warn пишет в лог и сама ходит по стеку,
+        # а замер должен видеть страницу как в продакшене.
+        with override_settings(QUERY_CHECK='off'):
+            scenarios = bench.run_scenarios(
+                driver, targets, options['requests'],
+                names=options['scenarios'] or bench.SCENARIOS,
+                warmup=options['warmup'])
+        result = {
+            'meta': {
+                'driver': 'http' if options['server'] else 'client',
+                'vendor': connection.vendor,
+                'async_views': settings.ASYNC_VIEWS,
+                'reader': reader,
+                'requests': options['requests'],
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'scenarios': scenarios,
+        }
+        text = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(text + '\n')
+        else:
+            self.stdout.write(text)
+        if before is not None:
+            for line in bench.compare(before, result):
+                self.stderr.write(line)
@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bench
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность лент под WSGI '
+            '(синхронные вьюхи) и ASGI (async-вьюхи) на текущей базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=('both', 'wsgi', 'asgi'),
+                            default='both')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Адрес страницы; можно несколько раз')
+        parser.add_argument('--host', default='localhost',
+                            help='Заголовок Host (должен быть в '
+                                 'ALLOWED_HOSTS)')
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'both':
+            # Вьюхи выбираются при импорте urls, поэтому каждый режим —
+            # в своём процессе с нужным YATUBE_ASYNC_VIEWS.
+            for mode in ('wsgi', 'asgi'):
+                self.stdout.write(self._child(mode, options))
+            return
+        paths = options['paths'] or bench.default_paths()
+        if options['mode'] == 'asgi':
+            if not settings.ASYNC_VIEWS:
+                raise CommandError('ASGI-режим запускается с '
+                                   'YATUBE_ASYNC_VIEWS=1')
+            run = bench.run_asgi
+        else:
+            run = bench.run_wsgi
+        result = run(paths, options['requests'], options['concurrency'],
+                     options['host'])
+        result['paths'] = paths
+        self.stdout.write(json.dumps(result, ensure_ascii=False))
+
+    def _child(self, mode, options):
+        command = [sys.executable, sys.argv[0], 'bench_views',
+                   '--mode', mode,
+                   '--requests', str(options['requests']),
+                   '--concurrency', str(options['concurrency']),
+                   '--host', options['host']]
+        for path in options['paths'] or ():
+            command += ['--path', path]
+        env = {**os.environ,
+               'YATUBE_ASYNC_VIEWS': '1' if mode == 'asgi' else '0'}
+        result = subprocess.run(command, env=env, capture_output=True,
+                                text=True)
+        if result.returncode:
+            raise CommandError(result.stderr)
+        return result.stdout.strip()
@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts import cards, variants, versions
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Строит адаптивные варианты (размеры и форматы) '
+            'для картинок существующих постов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Число процессов; 0 — без пула')
+        parser.add_argument('--missing', action='store_true',
+                            help='Только посты, у которых вариантов нет')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').order_by('pk')
+        if options['missing']:
+            posts = posts.filter(variants__isnull=True)
+        jobs = list(posts.values_list('pk', 'image'))
+        ids = [post_id for post_id, name in jobs]
+        names = [name for post_id, name in jobs]
+        if options['workers']:
+            # Процессы только пишут файлы, записи в базу делает родитель.
+            with ProcessPoolExecutor(options['workers']) as executor:
+                results = executor.map(variants.try_render_variants, ids,
+                                       names, chunksize=8)
+                failed = self._save(ids, results)
+        else:
+            failed = self._save(
+                ids, map(variants.try_render_variants, ids, names))
+        cards.invalidate(ids)
+        versions.bump_posts(ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(ids) - len(failed)}'))
+        if failed:
+            self.stderr.write(f'Не удалось прочитать: {failed}')
+
+    def _save(self, ids, results):
+        failed = []
+        for post_id, rendered in zip(ids, results):
+            if rendered is None:
+                failed.append(post_id)
+            else:
+                variants.save_variants(post_id, rendered)
+        return failed
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post, Thumbnail
+
+
+class Command(BaseCommand):
+    help = 'Строит превью для постов, у которых его ещё нет'
+
+    def handle(self, *args, **options):
+        posts = (Post.objects
+                 .exclude(image='')
+                 .exclude(thumbnail__ready=True)
+                 .only('image'))
+        total = 0
+        for post in posts.iterator():
+            Thumbnail.objects.update_or_create(
+                post=post, defaults={'source': post.image.name})
+            thumbnails.generate(post.pk)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'Построено превью: {total}'))
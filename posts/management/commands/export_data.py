@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии и подписки в JSONL или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', default=','.join(bulk.ORDER),
+                            help='Через запятую: group,post,comment,follow')
+        parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            default='jsonl')
+        parser.add_argument('--output', default='-',
+                            help='Файл; по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        models = [model.strip() for model in options['models'].split(',')]
+        unknown = set(models) - set(bulk.ORDER)
+        if unknown:
+            raise CommandError(f'Неизвестные модели: {", ".join(unknown)}')
+        if options['format'] == 'csv' and len(models) != 1:
+            raise CommandError('CSV выгружается по одной модели')
+        models = [model for model in bulk.ORDER if model in models]
+        output = options['output']
+        stream = (sys.stdout if output == '-'
+                  else open(output, 'w', encoding='utf-8', newline=''))
+        try:
+            if options['format'] == 'csv':
+                total = bulk.write_csv(stream, models[0])
+            else:
+                total = bulk.write_jsonl(stream, models)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        self.stderr.write(f'Выгружено строк: {total}')
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk, counters, synthetic, timeline
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетических пользователей, группы, посты, '
+            'комментарии и подписки со степенным распределением '
+            'популярности')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=float, default=20,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--image-share', type=float, default=0.2,
+                            help='Доля постов с картинкой')
+        parser.add_argument('--images', type=int, default=10,
+                            help='Сколько разных картинок создать')
+        parser.add_argument('--alpha', type=float, default=1.1,
+                            help='Показатель закона Ципфа')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней разбросать посты')
+        parser.add_argument('--prefix', default='load',
+                            help='Префикс имён пользователей и групп')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int,
+                            default=bulk.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        if not 0 <= options['image_share'] <= 1:
+            raise CommandError('--image-share должен быть от 0 до 1')
+        generator = synthetic.Generator(
+            users=options['users'],
+            posts=options['posts'],
+            groups=options['groups'],
+            comments=options['comments'],
+            follows=options['follows'],
+            image_share=options['image_share'],
+            images=options['images'],
+            alpha=options['alpha'],
+            days=options['days'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+        )
+        generator.create_users(options['batch_size'])
+        importer = bulk.Importer(batch_size=options['batch_size'])
+        for row in generator.rows():
+            importer.add(row)
+        importer.flush()
+        counters.rebuild()
+        timeline.rebuild()
+        for model, count in importer.counts.items():
+            self.stdout.write(f'{model}: {count}')
+        if options['image_share'] and options['images']:
+            self.stdout.write('Превью картинок строит '
+                              'manage.py build_thumbnails')
+        self.stdout.write(self.style.SUCCESS('Данные созданы'))
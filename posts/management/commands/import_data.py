@@ -0,0 +1,66 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk, counters, timeline
+
+
+class Command(BaseCommand):
+    help = 'Загружает группы, посты, комментарии и подписки из JSONL или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdin')
+        parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            default='jsonl')
+        parser.add_argument('--model', choices=bulk.ORDER,
+                            help='Модель строк CSV-файла')
+        parser.add_argument('--batch-size', type=int,
+                            default=bulk.BATCH_SIZE)
+        parser.add_argument('--no-create-users', action='store_true',
+                            help='Не создавать неизвестных авторов')
+        parser.add_argument('--media-from',
+                            help='Каталог, откуда копировать картинки')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Потоков для копирования картинок')
+        parser.add_argument('--skip-rebuild', action='store_true',
+                            help='Не пересчитывать счётчики и ленты')
+
+    def handle(self, *args, **options):
+        if options['format'] == 'csv' and not options['model']:
+            raise CommandError('Для CSV укажите --model')
+        path = options['path']
+        stream = (sys.stdin if path == '-'
+                  else open(path, encoding='utf-8', newline=''))
+        media = None
+        if options['media_from']:
+            media = bulk.MediaCopier(options['media_from'],
+                                     options['workers'])
+        importer = bulk.Importer(
+            batch_size=options['batch_size'],
+            create_missing_users=not options['no_create_users'],
+            media=media,
+        )
+        try:
+            if options['format'] == 'csv':
+                rows = bulk.read_csv(stream, options['model'])
+            else:
+                rows = bulk.read_jsonl(stream)
+            for row in rows:
+                importer.add(row)
+            importer.flush()
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if media is not None:
+                media.close()
+        if not options['skip_rebuild']:
+            counters.rebuild()
+            timeline.rebuild()
+        for model, count in importer.counts.items():
+            self.stdout.write(f'{model}: {count}')
+        if importer.skipped['comment']:
+            self.stderr.write('Пропущено комментариев к отсутствующим '
+                              f'постам: {importer.skipped["comment"]}')
+        if media is not None:
+            self.stdout.write(f'Скопировано картинок: {media.copied}')
+        self.stdout.write(self.style.SUCCESS('Импорт завершён'))
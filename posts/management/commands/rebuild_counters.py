@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters, timeline
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=counters.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = counters.rebuild(batch_size=options['batch_size'])
+            # Знаменитости могли смениться: достраиваем ленты.
+            timeline.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Счётчики пересчитаны: {total}'))
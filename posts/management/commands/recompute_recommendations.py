@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации «На кого подписаться» для тех, '
+            'у кого поменялись подписки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='пересчитать всех пользователей')
+        parser.add_argument('--batch-size', type=int,
+                            default=recommendations.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total = recommendations.recompute_changed(
+            everyone=options['all'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендации пересчитаны: {total}'))
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    Comment = apps.get_model('posts', 'Comment')
+    UserCounter = apps.get_model('posts', 'UserCounter')
+
+    def counts(queryset, field):
+        return dict(queryset.order_by().values_list(field)
+                    .annotate(total=Count('*')))
+
+    posts = counts(Post.objects, 'author_id')
+    followers = counts(Follow.objects, 'author_id')
+    following = counts(Follow.objects, 'user_id')
+    UserCounter.objects.bulk_create(
+        [UserCounter(user_id=user_id,
+                     posts=posts.get(user_id, 0),
+                     followers=followers.get(user_id, 0),
+                     following=following.get(user_id, 0))
+         for user_id in User.objects.values_list('pk', flat=True)],
+        batch_size=1000,
+    )
+    for post_id, total in counts(Comment.objects, 'post_id').items():
+        Post.objects.filter(pk=post_id).update(comments_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('posts', '0014_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
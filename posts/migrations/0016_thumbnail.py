@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Thumbnail',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='thumbnail', serialize=False, to='posts.post')),
+                ('source', models.CharField(max_length=255, verbose_name='Исходная картинка')),
+                ('name', models.CharField(blank=True, max_length=255, verbose_name='Файл превью')),
+                ('ready', models.BooleanField(default=False, verbose_name='Готово')),
+            ],
+            options={
+                'verbose_name': 'Превью',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина')),
+                ('format', models.CharField(choices=[('avif', 'avif'), ('webp', 'webp'), ('jpeg', 'jpeg')], max_length=8, verbose_name='Формат')),
+                ('name', models.CharField(max_length=255, verbose_name='Файл')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='posts.post')),
+            ],
+            options={
+                'verbose_name': 'Вариант картинки',
+                'ordering': ('width',),
+                'constraints': [models.UniqueConstraint(fields=('post', 'format', 'width'), name='unique_image_variant')],
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+from django.db import migrations
+
+# Полнотекстовый индекс SQLite FTS5 по тексту поста и его группе.
+# rowid строки индекса совпадает с id поста; индекс поддерживается
+# триггерами, поэтому обновляется при любой записи, в том числе из админки
+# и bulk-операций.
+CREATE = [
+    """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        text, group_title, group_description,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO posts_post_fts(rowid, text, group_title, group_description)
+    SELECT p.id, p.text, g.title, g.description
+    FROM posts_post p LEFT JOIN posts_group g ON g.id = p.group_id
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, text, group_title,
+                                   group_description)
+        SELECT NEW.id, NEW.text, g.title, g.description
+        FROM (SELECT 1) LEFT JOIN posts_group g ON g.id = NEW.group_id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update
+    AFTER UPDATE OF text, group_id ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = OLD.id;
+        INSERT INTO posts_post_fts(rowid, text, group_title,
+                                   group_description)
+        SELECT NEW.id, NEW.text, g.title, g.description
+        FROM (SELECT 1) LEFT JOIN posts_group g ON g.id = NEW.group_id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = OLD.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_group_fts_update
+    AFTER UPDATE OF title, description ON posts_group BEGIN
+        UPDATE posts_post_fts
+        SET group_title = NEW.title, group_description = NEW.description
+        WHERE rowid IN (SELECT id FROM posts_post WHERE group_id = NEW.id);
+    END
+    """,
+]
+
+DROP = [
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TABLE IF EXISTS posts_post_fts',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_imagevariant'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('journal', models.CharField(max_length=255, unique=True)),
+                ('seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Меняется только значение по умолчанию в Python: столбцы те же.
+
+    Обычный AlterField в SQLite пересоздал бы таблицы вместе с их
+    триггерами поиска, поэтому операции только в состоянии.
+    """
+
+    dependencies = [
+        ('posts', '0020_journal_checkpoint'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='comment',
+                name='pub_date',
+                field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата публикации'),
+            ),
+            migrations.AlterField(
+                model_name='post',
+                name='pub_date',
+                field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата публикации'),
+            ),
+        ]),
+    ]
@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.db import models
+from django.utils import timezone
 
 
 User = get_user_model()
@@ -25,7 +27,8 @@ class Group(models.Model):
 
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст')
-    pub_date = models.DateTimeField(auto_now_add=True,
+    # Не auto_now_add: импорт и отложенная запись передают свою дату.
+    pub_date = models.DateTimeField(default=timezone.now, editable=False,
                                     verbose_name='Дата публикации')
     group = models.ForeignKey(Group,
                               models.SET_NULL,
@@ -38,18 +41,96 @@ class Post(models.Model):
                                verbose_name='Автор',
                                related_name='posts')
     image = models.ImageField("Картинка", upload_to="posts/", blank=True)
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Число комментариев')
 
     def get_absolute_url(self):
         return f'/posts/{self.id}'
 
+    def image_sources(self):
+        """Пары (MIME, srcset) для <picture>: от новых форматов к JPEG."""
+        srcsets = {}
+        for variant in self.variants.all():
+            srcsets.setdefault(variant.format, []).append(
+                f'{variant.url} {variant.width}w')
+        return [(ImageVariant.MIME_TYPES[fmt], ', '.join(srcsets[fmt]))
+                for fmt in ImageVariant.FORMATS if fmt in srcsets]
+
     class Meta:
         verbose_name = "Посты"
-        ordering = ("-pub_date",)
+        ordering = ("-pub_date", "-id")
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:ZNAK_15]
 
 
+class Thumbnail(models.Model):
+    """Готовое превью картинки поста; пишется фоновым воркером."""
+    post = models.OneToOneField(Post,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='thumbnail')
+    source = models.CharField(max_length=255,
+                              verbose_name='Исходная картинка')
+    name = models.CharField(max_length=255, blank=True,
+                            verbose_name='Файл превью')
+    ready = models.BooleanField(default=False, verbose_name='Готово')
+
+    class Meta:
+        verbose_name = "Превью"
+
+    def __str__(self):
+        return self.name or self.source
+
+    @property
+    def url(self):
+        return default_storage.url(self.name)
+
+
+class ImageVariant(models.Model):
+    """Уменьшенная копия картинки поста в одном размере и формате."""
+    FORMATS = ('avif', 'webp', 'jpeg')
+    MIME_TYPES = {
+        'avif': 'image/avif',
+        'webp': 'image/webp',
+        'jpeg': 'image/jpeg',
+    }
+
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='variants')
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    format = models.CharField(max_length=8,
+                              choices=[(fmt, fmt) for fmt in FORMATS],
+                              verbose_name='Формат')
+    name = models.CharField(max_length=255, verbose_name='Файл')
+
+    class Meta:
+        verbose_name = "Вариант картинки"
+        ordering = ('width',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'format', 'width'],
+                name='unique_image_variant'
+            )
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def url(self):
+        return default_storage.url(self.name)
+
+
 class Comment(models.Model):
     post = models.ForeignKey(Post,
                              on_delete=models.CASCADE,
@@ -59,10 +140,17 @@ class Comment(models.Model):
                                on_delete=models.CASCADE,
                                verbose_name='Автор комментария',
                                related_name='comments')
-    pub_date = models.DateTimeField(auto_now_add=True,
+    # Не auto_now_add: импорт и отложенная запись передают свою дату.
+    pub_date = models.DateTimeField(default=timezone.now, editable=False,
                                     verbose_name='Дата публикации')
     text = models.TextField(verbose_name='Текст комментария')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'pub_date', 'id'],
+                         name='comment_post_pub_date_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -83,3 +171,61 @@ class Follow(models.Model):
                 name='unique_following'
             )
         ]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='follow_user_author_idx'),
+        ]
+
+
+class UserCounter(models.Model):
+    """Счётчики пользователя, обновляемые вместе с изменениями."""
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='counters')
+    posts = models.PositiveIntegerField(default=0,
+                                        verbose_name='Постов')
+    followers = models.PositiveIntegerField(default=0,
+                                            verbose_name='Подписчиков')
+    following = models.PositiveIntegerField(default=0,
+                                            verbose_name='Подписок')
+
+    class Meta:
+        verbose_name = "Счётчики"
+
+    def __str__(self):
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: строка на пару (читатель, пост)."""
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class JournalCheckpoint(models.Model):
+    """Докуда журнал отложенной записи уже в базе (posts/writebehind.py)."""
+    journal = models.CharField(max_length=255, unique=True)
+    seq = models.BigIntegerField(default=0)
@@ -0,0 +1,42 @@
+"""Создание, правка и удаление постов и комментариев.
+
+Сайт и JSON API меняют посты одинаково: строка и счётчики автора
+меняются в одной транзакции, а миниатюры и ленты подписчиков
+обновляются уже после записи. Последовательность собрана здесь, чтобы
+формы и API не расходились.
+"""
+from django.db import transaction
+
+from . import counters, thumbnails, timeline
+
+
+def create(post):
+    """Сохраняет новый пост и раздаёт его подписчикам."""
+    with transaction.atomic():
+        post.save()
+        counters.bump(post.author_id, posts=1)
+    thumbnails.schedule(post)
+    timeline.fan_out(post)
+    return post
+
+
+def edit(form):
+    """Сохраняет правку поста из формы; картинка могла смениться."""
+    post = form.save()
+    thumbnails.schedule(post)
+    return post
+
+
+def delete(post):
+    """Удаляет пост вместе с его вкладом в счётчик автора."""
+    with transaction.atomic():
+        counters.bump(post.author_id, posts=-1)
+        post.delete()
+
+
+def comment(comment):
+    """Сохраняет комментарий и сдвигает счётчик поста."""
+    with transaction.atomic():
+        comment.save()
+        counters.bump_comments(comment.post_id, 1)
+    return comment
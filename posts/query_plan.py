@@ -0,0 +1,49 @@
+"""Проверка планов запросов лент через EXPLAIN QUERY PLAN (SQLite).
+
+``plan_problems`` возвращает строки плана, которые означают полный
+проход по таблице или сортировку во временном B-дереве. Тесты
+прогоняют через неё запросы каждой ленты, чтобы новый запрос без
+подходящего индекса не прошёл незамеченным.
+"""
+from django.db import connections
+
+BAD_PATTERNS = ('USE TEMP B-TREE',)
+
+
+def explain(queryset):
+    """Строки EXPLAIN QUERY PLAN для queryset."""
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def is_full_scan(detail):
+    """SCAN таблицы без индекса; SCAN по индексу в порядке ORDER BY — ок.
+
+    ``SCAN (subquery-N)`` читает строки подзапроса-сопрограммы, а не
+    таблицу: их не больше, чем отдал его LIMIT.
+    """
+    return (detail.startswith('SCAN ')
+            and 'USING' not in detail
+            and 'CONSTANT ROW' not in detail
+            and not detail.startswith('SCAN (subquery-'))
+
+
+def plan_problems(queryset, ordered_scan=True):
+    """Плохие строки плана; пустой список — запрос идёт по индексам.
+
+    ``ordered_scan=False`` запрещает и проход индекса с начала: так
+    проверяются страницы с курсором, которые должны искать по ключу.
+    """
+    if connections[queryset.db].vendor != 'sqlite':
+        return []
+    problems = []
+    for detail in explain(queryset):
+        if is_full_scan(detail) or (
+                not ordered_scan and detail.startswith('SCAN ')):
+            problems.append(detail)
+        elif any(pattern in detail for pattern in BAD_PATTERNS):
+            problems.append(detail)
+    return problems
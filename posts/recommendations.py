@@ -0,0 +1,222 @@
+"""Рекомендации «На кого подписаться».
+
+Кандидаты двух видов:
+
+* друзья друзей — авторы, на которых подписаны те, на кого подписан
+  пользователь; вес — число таких общих подписок;
+* соседи по группам — авторы, которые пишут в те же группы; вес —
+  сумма ``log(1 + постов пользователя) * log(1 + постов автора)`` по
+  общим группам.
+
+Итог — ``FRIENDS_WEIGHT * друзья + GROUPS_WEIGHT * группы``; сам
+пользователь и те, на кого он уже подписан, отбрасываются. Лучшие
+``STORED`` кандидатов с именами кладутся в кэш на пользователя, и
+страницы читают их без запросов к базе.
+
+Пересчёт — ``manage.py recompute_recommendations``, по расписанию.
+Граф подписок для него грузится одним запросом, посты по группам —
+ещё одним, и дальше счёт идёт целиком в памяти циклами по спискам
+смежности графа. Пересчёт инкрементальный: по журналу изменений графа
+(``posts.graph``) берутся только пользователи, чьё окружение
+поменялось — подписавшийся и его подписчики. Если журнал потерян или
+передан ``--all``, пересчитываются все; новые посты в группах
+учитывает только полный пересчёт.
+
+Если в кэше пусто (новый пользователь), боковая панель подгружает
+``posts:recommendations``, которая считает рекомендации одного
+пользователя по его окружению несколькими запросами.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models import Count, Q
+
+from core.db.routers import cache_timeout
+
+from . import follows, graph, versions
+from .models import Follow, Post, User
+
+FRIENDS_WEIGHT = 1.0
+GROUPS_WEIGHT = 0.5
+# Сколько хранить в кэше: часть могут отсеять свежие подписки.
+STORED = 10
+SHOWN = 5
+TIMEOUT = getattr(settings, 'RECOMMENDATIONS_TIMEOUT', 24 * 60 * 60)
+BATCH_SIZE = 1000
+STATE_KEY = 'recommendations:seq'
+
+
+def cache_key(user_id):
+    return f'recommendations:{user_id}'
+
+
+class Neighbourhood:
+    """Подписки и посты по группам, на которых считаются рекомендации."""
+
+    def __init__(self, following, posting):
+        # following — Adjacency или словарь id -> множество авторов;
+        # posting — пары (пользователь, группа) -> число постов.
+        self.following = following
+        self.followers = None
+        self.groups = defaultdict(dict)
+        self.members = defaultdict(dict)
+        for (user_id, group_id), count in posting.items():
+            weight = math.log1p(count)
+            self.groups[user_id][group_id] = weight
+            self.members[group_id][user_id] = weight
+
+    @classmethod
+    def load(cls):
+        """Весь граф и все посты по группам — для пересчёта."""
+        follow_graph = graph.FollowGraph.load()
+        data = cls(follow_graph.following, _posting(Post.objects.all()))
+        data.followers = follow_graph.followers
+        return data
+
+    @classmethod
+    def around(cls, user_id):
+        """Окружение одного пользователя: два запроса."""
+        following = defaultdict(set)
+        pairs = (Follow.objects
+                 .filter(Q(user_id=user_id)
+                         | Q(user_id__in=Follow.objects
+                             .filter(user_id=user_id)
+                             .values('author_id')))
+                 .values_list('user_id', 'author_id'))
+        for follower_id, author_id in pairs:
+            following[follower_id].add(author_id)
+        posts = Post.objects.filter(
+            group_id__in=Post.objects
+            .filter(author_id=user_id, group__isnull=False)
+            .values('group_id'))
+        return cls(following, _posting(posts))
+
+    def followed(self, user_id):
+        if isinstance(self.following, dict):
+            return self.following.get(user_id, ())
+        return self.following.neighbours(user_id)
+
+
+def _posting(posts):
+    return dict(((author_id, group_id), count) for author_id, group_id, count
+                in posts
+                .filter(group__isnull=False)
+                .order_by()
+                .values_list('author_id', 'group_id')
+                .annotate(count=Count('*')))
+
+
+def score(data, user_id):
+    """Кандидаты пользователя: id -> (очки, друзей, есть общие группы)."""
+    followed = set(data.followed(user_id))
+    friends = Counter()
+    for middle in followed:
+        friends.update(data.followed(middle))
+    groups = defaultdict(float)
+    for group_id, weight in data.groups.get(user_id, {}).items():
+        for author_id, other in data.members[group_id].items():
+            groups[author_id] += weight * other
+    return {
+        author_id: (FRIENDS_WEIGHT * friends[author_id]
+                    + GROUPS_WEIGHT * groups.get(author_id, 0),
+                    friends[author_id], author_id in groups)
+        for author_id in friends.keys() | groups.keys()
+        if author_id != user_id and author_id not in followed
+    }
+
+
+def best(candidates, limit=STORED):
+    """Лучшие кандидаты: [(id, очки, друзей, есть общие группы)]."""
+    top = heapq.nlargest(limit, candidates.items(),
+                         key=lambda item: (item[1][0], -item[0]))
+    return [(author_id, *values) for author_id, values in top]
+
+
+def score_batch(data, user_ids):
+    """Кандидаты пачки пользователей: {id: [лучшие]}."""
+    return {user_id: best(score(data, user_id)) for user_id in user_ids}
+
+
+def _entries(top, usernames):
+    return [{'id': author_id, 'username': usernames[author_id],
+             'score': round(points, 3), 'friends': friends,
+             'groups': shared}
+            for author_id, points, friends, shared in top
+            if author_id in usernames]
+
+
+def store(results):
+    """Кладёт {id: [лучшие]} в кэш вместе с именами авторов."""
+    ids = {author_id for top in results.values() for author_id, *_ in top}
+    usernames = dict(User.objects.filter(pk__in=ids)
+                     .values_list('pk', 'username'))
+    cache.set_many({cache_key(user_id): _entries(top, usernames)
+                    for user_id, top in results.items()},
+                   cache_timeout(TIMEOUT))
+    versions.bump(*(f'recommendations:{user_id}' for user_id in results))
+
+
+def recompute(user_ids=None, batch_size=BATCH_SIZE, data=None):
+    """Пересчитывает рекомендации; None — всех. Возвращает число."""
+    if data is None:
+        data = Neighbourhood.load()
+    if user_ids is None:
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), batch_size):
+        store(score_batch(data, user_ids[start:start + batch_size]))
+    return len(user_ids)
+
+
+def changed_users(data, since, seq):
+    """Чьё окружение поменялось по журналу графа; None — неизвестно."""
+    shared = caches[graph.GRAPH_CACHE]
+    if since is None or not since <= seq:
+        return None
+    keys = [graph.log_key(number) for number in range(since + 1, seq + 1)]
+    entries = shared.get_many(keys)
+    if len(entries) < len(keys):
+        return None
+    users = set()
+    for user_id, _, _ in entries.values():
+        users.add(user_id)
+        users.update(data.followers.neighbours(user_id))
+    return sorted(users)
+
+
+def recompute_changed(everyone=False, batch_size=BATCH_SIZE):
+    """Инкрементальный пересчёт для фоновой задачи."""
+    shared = caches[graph.GRAPH_CACHE]
+    seq = graph.position()
+    data = Neighbourhood.load()
+    users = None if everyone else changed_users(
+        data, shared.get(STATE_KEY), seq)
+    total = recompute(users, batch_size, data)
+    shared.set(STATE_KEY, seq, None)
+    return total
+
+
+def _not_followed(follow_graph, user_id, entries):
+    return [entry for entry in entries
+            if not follow_graph.is_following(user_id, entry['id'])]
+
+
+def for_user(user_id):
+    """Из кэша, без уже сделанных подписок; None — ещё не посчитаны."""
+    entries = cache.get(cache_key(user_id))
+    if entries is None:
+        return None
+    fresh = graph.use(_not_followed, user_id, entries)
+    if fresh is None:
+        followed = follows.following_ids(user_id)
+        fresh = [entry for entry in entries if entry['id'] not in followed]
+    return fresh[:SHOWN]
+
+
+def compute_for_user(user_id):
+    """Считает и кэширует рекомендации одного пользователя на лету."""
+    store({user_id: best(score(Neighbourhood.around(user_id), user_id))})
+    return for_user(user_id)
@@ -0,0 +1,87 @@
+"""Полнотекстовый поиск по постам через SQLite FTS5.
+
+Индекс ``posts_post_fts`` (миграция 0018) держат в актуальном состоянии
+триггеры на ``posts_post`` и ``posts_group``. Ранжирование — BM25 с
+весами колонок, каждое слово запроса ищется как префикс. Страницы
+выдачи листаются курсором по паре (score, id), как и ленты.
+"""
+import math
+import re
+
+from django.db import connection
+
+from .models import Post
+from .utils import (CursorPage, CursorPaginator, POST_V, _is_key,
+                    decode_cursor, encode_cursor, feed)
+
+# Веса колонок для bm25(): текст поста, название и описание группы.
+WEIGHTS = (1.0, 0.5, 0.25)
+MAX_TERMS = 16
+
+SEARCH_SQL = f"""
+    SELECT rowid, score FROM (
+        SELECT rowid, bm25(posts_post_fts, {', '.join(map(str, WEIGHTS))})
+               AS score
+        FROM posts_post_fts
+        WHERE posts_post_fts MATCH %s
+    )
+    {{where}}
+    ORDER BY score, rowid
+    LIMIT %s
+"""
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в безопасный запрос FTS5.
+
+    Каждое слово берётся в кавычки (операторы FTS5 не пройдут)
+    и ищется по префиксу: ``"пост"*``.
+    """
+    terms = re.findall(r'\w+', query.lower())[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _parse(token):
+    """Ключ (score, id) из курсора; битый курсор — первая страница."""
+    values = decode_cursor(token)
+    if values is None or len(values) != 2:
+        return None
+    score, pk = values
+    if (isinstance(score, bool) or not isinstance(score, (int, float))
+            or not math.isfinite(score) or not _is_key(pk)):
+        return None
+    return float(score), pk
+
+
+def search_page(query, token=None, per_page=POST_V):
+    """Страница результатов поиска, отсортированных по релевантности."""
+    expression = match_expression(query)
+    if not expression:
+        return CursorPage([])
+    if connection.vendor != 'sqlite':
+        return _fallback_page(query, token, per_page)
+    key = _parse(token)
+    params = [expression]
+    where = ''
+    if key is not None:
+        where = 'WHERE score > %s OR (score = %s AND rowid > %s)'
+        params += [key[0], key[0], key[1]]
+    params.append(per_page + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_SQL.format(where=where), params)
+        rows = cursor.fetchall()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = feed(Post.objects.filter(pk__in=[pk for pk, score in rows]))
+    by_id = {post.pk: post for post in posts}
+    page = CursorPage([by_id[pk] for pk, score in rows if pk in by_id])
+    if has_more:
+        last_pk, last_score = rows[-1]
+        page.next_cursor = encode_cursor(last_score, last_pk)
+    return page
+
+
+def _fallback_page(query, token, per_page):
+    """Для баз без FTS5 — обычный поиск по подстроке, свежие сверху."""
+    posts = feed(Post.objects.filter(text__icontains=query))
+    return CursorPaginator(posts, per_page=per_page).get_page(token)
@@ -0,0 +1,90 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import cards, follows, graph, live, versions
+from .models import Comment, Follow, Group, Post, User
+
+CHUNK_SIZE = 500
+
+
+def _invalidate_queryset(posts):
+    """Сбрасывает карточки постов выборки пачками по CHUNK_SIZE."""
+    chunk = []
+    for post_id in posts.values_list('pk', flat=True).iterator():
+        chunk.append(post_id)
+        if len(chunk) == CHUNK_SIZE:
+            cards.invalidate(chunk)
+            chunk = []
+    if chunk:
+        cards.invalidate(chunk)
+
+
+@receiver(pre_save, sender=Post)
+def post_moving(sender, instance, **kwargs):
+    # Пост могли перенести в другую группу — старой тоже нужна новая метка.
+    instance._old_group_id = (Post.objects
+                              .filter(pk=instance.pk)
+                              .values_list('group_id', flat=True)
+                              .first()) if instance.pk else None
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    cards.invalidate([instance.pk])
+    group_ids = {instance.group_id, getattr(instance, '_old_group_id', None)}
+    slugs = Group.objects.filter(pk__in=group_ids - {None}).values_list(
+        'slug', flat=True)
+    versions.bump('feed', f'post:{instance.pk}',
+                  f'author:{instance.author.username}',
+                  *(f'group:{slug}' for slug in slugs))
+
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(live.publish, instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    versions.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, signal, **kwargs):
+    # Подписки через posts.follows сигналов не шлют; сюда попадают
+    # правки через ORM (админка, фикстуры). Имена берём одним запросом:
+    # у удалённых через queryset подписок связи не загружены.
+    usernames = User.objects.filter(
+        pk__in=(instance.user_id, instance.author_id)).values_list(
+        'username', flat=True)
+    follows.notify(instance.user_id, instance.author_id, usernames,
+                   signal is post_save)
+
+
+@receiver(follows.changed)
+def follow_graph_changed(sender, user_id, author_id, following, **kwargs):
+    graph.record(user_id, author_id, following)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    _invalidate_queryset(Post.objects.filter(group=instance))
+    versions.bump('site')
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Вход пользователя обновляет только last_login — карточки не меняются.
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    _invalidate_queryset(Post.objects.filter(author=instance))
+    versions.bump('site')
@@ -0,0 +1,185 @@
+"""Синтетические данные для нагрузочных прогонов.
+
+Популярность подчиняется степенному закону (Ципф): у пользователя с
+рангом r вес ``1 / r ** alpha``. По этим весам выбираются авторы
+подписок, авторы постов и группы, а посты — для комментариев. Поэтому,
+как в живой соцсети, у немногих авторов тысячи подписчиков и постов,
+а у большинства — единицы.
+
+Строки отдаются в формате ``bulk.Importer``, так что запись идёт теми
+же пачками, что и при импорте. Генератор детерминирован: один и тот
+же ``seed`` даёт одни и те же данные.
+"""
+import bisect
+import itertools
+import os
+import random
+from array import array
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from . import bulk
+from .models import Post
+
+WORDS = (
+    'утро кофе город море книга фильм музыка поезд дорога лес река горы '
+    'работа отпуск друзья семья кот собака погода дождь солнце снег '
+    'выставка концерт рецепт ужин завтрак прогулка парк велосипед '
+    'футбол шахматы код проект идея план встреча вечер ночь звёзды'
+).split()
+IMAGE_DIR = 'posts/synthetic'
+IMAGE_SIZE = (1200, 800)
+
+
+class Zipf:
+    """Выбор индекса 0..n-1 с весом 1 / (индекс + 1) ** alpha."""
+
+    def __init__(self, n, alpha):
+        self.cum = array('d', itertools.accumulate(
+            1 / rank ** alpha for rank in range(1, n + 1)))
+
+    def __call__(self, rng):
+        point = rng.random() * self.cum[-1]
+        return min(bisect.bisect(self.cum, point), len(self.cum) - 1)
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def make_images(count, seed=0):
+    """Картинки-заглушки в MEDIA_ROOT; возвращает их имена."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    names = []
+    for number in range(count):
+        name = f'{IMAGE_DIR}/{number}.jpg'
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            color = tuple(rng.randrange(256) for _ in range(3))
+            Image.new('RGB', IMAGE_SIZE, color).save(path, quality=85)
+        names.append(name)
+    return names
+
+
+class Generator:
+    """Строки групп, постов, комментариев и подписок для Importer."""
+
+    def __init__(self, users=1000, posts=10000, groups=20, comments=20000,
+                 follows=20, image_share=0.2, images=10, alpha=1.1,
+                 days=365, prefix='load', seed=0):
+        self.users = users
+        self.posts = posts
+        self.groups = groups
+        self.comments = comments
+        self.follows = follows
+        self.image_share = image_share
+        self.images = images
+        self.alpha = alpha
+        self.days = days
+        self.prefix = prefix
+        self.seed = seed
+
+    def username(self, index):
+        return f'{self.prefix}_user_{index}'
+
+    def slug(self, index):
+        return f'{self.prefix}-group-{index}'
+
+    def create_users(self, batch_size):
+        """Создаёт всех пользователей, в том числе без постов и подписок."""
+        for start in range(0, self.users, batch_size):
+            stop = min(start + batch_size, self.users)
+            bulk.create_users(self.username(index)
+                              for index in range(start, stop))
+
+    def rows(self):
+        rng = random.Random(self.seed)
+        yield from self.group_rows()
+        yield from self.post_rows(rng)
+        yield from self.comment_rows(rng)
+        yield from self.follow_rows(rng)
+
+    def group_rows(self):
+        for index in range(self.groups):
+            yield {
+                'model': 'group',
+                'slug': self.slug(index),
+                'title': f'Группа {index}',
+                'description': f'Синтетическая группа {index}',
+            }
+
+    def post_rows(self, rng):
+        # Новые id идут после существующих, чтобы на них могли
+        # ссылаться комментарии.
+        self.first_post = (Post.objects.aggregate(top=Max('pk'))['top']
+                           or 0) + 1
+        self.post_ages = array('d')
+        images = make_images(self.images, self.seed) if (
+            self.image_share and self.images) else []
+        authors = Zipf(self.users, self.alpha)
+        groups = Zipf(self.groups, self.alpha) if self.groups else None
+        now = timezone.now()
+        for number in range(self.posts):
+            age = rng.random() * self.days
+            self.post_ages.append(age)
+            group = ''
+            if groups is not None and rng.random() < 0.7:
+                group = self.slug(groups(rng))
+            image = ''
+            if images and rng.random() < self.image_share:
+                image = rng.choice(images)
+            yield {
+                'model': 'post',
+                'id': self.first_post + number,
+                'text': _text(rng, rng.randint(5, 40)),
+                'pub_date': (now - timedelta(days=age)).isoformat(),
+                'author': self.username(authors(rng)),
+                'group': group,
+                'image': image,
+            }
+
+    def comment_rows(self, rng):
+        if not self.posts:
+            return
+        # Обсуждают в основном свежие посты: ранг поста — его возраст.
+        by_age = sorted(range(self.posts), key=self.post_ages.__getitem__)
+        posts = Zipf(self.posts, self.alpha)
+        authors = Zipf(self.users, self.alpha)
+        now = timezone.now()
+        for _ in range(self.comments):
+            index = by_age[posts(rng)]
+            age = self.post_ages[index] * rng.random()
+            yield {
+                'model': 'comment',
+                'post': self.first_post + index,
+                'author': self.username(authors(rng)),
+                'pub_date': (now - timedelta(days=age)).isoformat(),
+                'text': _text(rng, rng.randint(3, 15)),
+            }
+
+    def follow_rows(self, rng):
+        authors = Zipf(self.users, self.alpha)
+        for user in range(self.users):
+            # Число подписок — экспоненциальное со средним self.follows,
+            # а выбор авторов по Ципфу даёт степенной хвост подписчиков.
+            wanted = min(int(rng.expovariate(1 / self.follows))
+                         if self.follows else 0, self.users - 1)
+            chosen = set()
+            for _ in range(wanted * 3):
+                if len(chosen) == wanted:
+                    break
+                author = authors(rng)
+                if author != user:
+                    chosen.add(author)
+            for author in sorted(chosen):
+                yield {
+                    'model': 'follow',
+                    'user': self.username(user),
+                    'author': self.username(author),
+                }
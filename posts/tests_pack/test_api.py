@@ -0,0 +1,140 @@
+import json
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                          UserCounter)
+from posts.utils import encode_cursor
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='api_author')
+        cls.reader = User.objects.create(username='api_reader')
+        cls.group = Group.objects.create(title='API', slug='api',
+                                         description='API')
+        cls.posts = [Post.objects.create(text=f'api{number}',
+                                         author=cls.author,
+                                         group=cls.group if number % 2
+                                         else None)
+                     for number in range(5)]
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def send(self, client, method, url, data):
+        return getattr(client, method)(url, json.dumps(data),
+                                       content_type='application/json')
+
+    def test_posts_cursor_pagination(self):
+        url = reverse('api:posts')
+        response = self.client.get(url, {'limit': 2})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        seen = [row['text'] for row in response.json()['results']]
+        while response.json()['next']:
+            response = self.client.get(response.json()['next'])
+            seen += [row['text'] for row in response.json()['results']]
+        self.assertEqual(seen, [f'api{number}' for number in range(4, -1, -1)])
+        for cursor in (encode_cursor('n', 5, 1),
+                       encode_cursor('n', {'a': 1}, 2)):
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_sparse_fields_and_filters(self):
+        response = self.client.get(reverse('api:posts'),
+                                   {'fields': 'id,group', 'group': 'api'})
+        rows = response.json()['results']
+        self.assertEqual(rows, [{'id': post.pk, 'group': 'api'}
+                                for post in self.posts[::-1] if post.group])
+        response = self.client.get(reverse('api:posts'),
+                                   {'fields': 'password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.client.get(reverse('api:posts'), {'since': 'вчера'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_post_write(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        url = reverse('api:posts')
+        response = self.send(self.client, 'post', url, {'text': 'аноним'})
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        response = self.send(self.author_client, 'post', url,
+                             {'text': 'из API', 'group': 'api'})
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        post_id = response.json()['id']
+        self.assertEqual(response.json()['group'], 'api')
+        self.assertEqual(UserCounter.objects.get(user=self.author).posts, 1)
+        # Как и форма на сайте, API раздаёт пост в ленты подписчиков.
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post_id=post_id).exists())
+        detail = reverse('api:post_detail', args=[post_id])
+        response = self.send(self.reader_client, 'patch', detail,
+                             {'text': 'чужой'})
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        response = self.send(self.author_client, 'patch', detail,
+                             {'text': 'исправлено'})
+        self.assertEqual(response.json()['text'], 'исправлено')
+        self.assertEqual(response.json()['group'], 'api')
+        response = self.author_client.delete(detail)
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertFalse(Post.objects.filter(pk=post_id).exists())
+        self.assertEqual(UserCounter.objects.get(user=self.author).posts, 0)
+
+    def test_comments(self):
+        post = self.posts[0]
+        url = reverse('api:comments', args=[post.pk])
+        for text in ('первый', 'второй'):
+            response = self.send(self.reader_client, 'post', url,
+                                 {'text': text})
+            self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        response = self.client.get(url, {'fields': 'author,text'})
+        self.assertEqual(response.json()['results'], [
+            {'author': 'api_reader', 'text': 'первый'},
+            {'author': 'api_reader', 'text': 'второй'},
+        ])
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_follows(self):
+        url = reverse('api:follows')
+        self.assertEqual(self.client.get(url).status_code,
+                         HTTPStatus.UNAUTHORIZED)
+        response = self.send(self.reader_client, 'post', url,
+                             {'author': 'api_author'})
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        response = self.send(self.reader_client, 'post', url,
+                             {'author': 'api_author'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.reader_client.get(url)
+        self.assertEqual(response.json()['results'],
+                         [{'user': 'api_reader', 'author': 'api_author'}])
+        response = self.reader_client.delete(
+            reverse('api:follow_detail', args=['api_author']))
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(UserCounter.objects.get(user=self.author).followers,
+                         0)
+
+    def test_groups(self):
+        response = self.client.get(reverse('api:groups'))
+        self.assertEqual(response.json()['results'], [
+            {'slug': 'api', 'title': 'API', 'description': 'API'}])
+        response = self.client.get(reverse('api:group_detail',
+                                           args=['missing']))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_writes_need_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        response = self.send(client, 'post', reverse('api:posts'),
+                             {'text': 'без токена'})
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
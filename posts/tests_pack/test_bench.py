@@ -0,0 +1,93 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase
+
+from .. import bench, synthetic
+from ..models import Comment, Follow, Group, Post, User, UserCounter
+
+
+class GenerateDataTest(TestCase):
+    def call(self, *args, **kwargs):
+        with open(os.devnull, 'w') as devnull:
+            call_command(*args, stdout=devnull, stderr=devnull, **kwargs)
+
+    def test_generate(self):
+        self.call('generate_data', users=50, posts=200, groups=3,
+                  comments=100, follows=5, image_share=0, batch_size=40)
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertFalse(Follow.objects.filter(
+            user=F('author')).exists())
+        # Степенной закон: у первого пользователя подписчиков больше,
+        # чем у типичного.
+        followers = sorted(UserCounter.objects.values_list('followers',
+                                                           flat=True))
+        top = UserCounter.objects.get(user__username='load_user_0')
+        self.assertGreater(top.followers, followers[len(followers) // 2])
+        self.assertEqual(top.posts,
+                         Post.objects.filter(author=top.user).count())
+
+    def test_seed_is_deterministic(self):
+        def rows(seed):
+            generator = synthetic.Generator(users=20, posts=30, comments=20,
+                                            image_share=0, seed=seed)
+            return list(generator.rows())
+        first, second = rows(1), rows(1)
+        for row in first + second:
+            row.pop('pub_date', None)
+        self.assertEqual(first, second)
+        self.assertNotEqual(rows(1)[-1], rows(2)[-1])
+
+    def test_zipf(self):
+        zipf = synthetic.Zipf(100, 1.1)
+        rng = random.Random(0)
+        picks = [zipf(rng) for _ in range(2000)]
+        self.assertTrue(all(0 <= pick < 100 for pick in picks))
+        self.assertGreater(picks.count(0), picks.count(50) * 10)
+
+
+class BenchPagesTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        with open(os.devnull, 'w') as devnull:
+            call_command('generate_data', users=10, posts=30, groups=2,
+                         comments=10, follows=3, image_share=0,
+                         stdout=devnull)
+
+    def test_report(self):
+        path = os.path.join(self.directory, 'bench.json')
+        with open(os.devnull, 'w') as devnull:
+            call_command('bench_pages', requests=3, warmup=1,
+                         host='testserver', output=path, stdout=devnull)
+        with open(path, encoding='utf-8') as stream:
+            result = json.load(stream)
+        self.assertEqual(list(result['scenarios']), list(bench.SCENARIOS))
+        for name, metrics in result['scenarios'].items():
+            with self.subTest(scenario=name):
+                self.assertEqual(metrics['requests'], 3)
+                self.assertEqual(metrics['errors'], 0)
+                self.assertGreaterEqual(metrics['p99_ms'],
+                                        metrics['p50_ms'])
+                self.assertGreaterEqual(metrics['queries_mean'], 1)
+        # Прогрев и три замера сценария post_create.
+        self.assertEqual(result['meta']['posts'], 30 + 4)
+        lines = bench.compare(result, result)
+        self.assertEqual(len(lines), 1 + 4 * len(bench.SCENARIOS))
+        self.assertTrue(all(line.endswith('+0.0%') for line in lines[1:]))
+
+
+class PercentileTest(SimpleTestCase):
+    def test_percentile(self):
+        timings = [number / 100 for number in range(1, 101)]
+        self.assertEqual(bench.percentile(timings, 0.5), 0.5)
+        self.assertEqual(bench.percentile(timings, 0.99), 0.99)
+        self.assertEqual(bench.percentile([], 0.5), 0.0)
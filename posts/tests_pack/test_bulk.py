@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                      UserCounter)
+
+
+class BulkImportExportTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.author = User.objects.create(username='posts_author')
+        self.follower = User.objects.create(username='follower')
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          description='Описание')
+        self.post = Post.objects.create(text='Пост', author=self.author,
+                                        group=self.group)
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date=datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        Comment.objects.create(post=self.post, author=self.follower,
+                               text='Комментарий')
+        Follow.objects.create(user=self.follower, author=self.author)
+
+    def call(self, *args, **kwargs):
+        with open(os.devnull, 'w') as devnull:
+            call_command(*args, stdout=devnull, stderr=devnull, **kwargs)
+
+    def test_round_trip(self):
+        """выгрузка и загрузка сохраняют данные и связи"""
+        path = os.path.join(self.directory, 'dump.jsonl')
+        self.call('export_data', output=path)
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        User.objects.all().delete()
+
+        self.call('import_data', path, batch_size=1)
+
+        post = Post.objects.get()
+        self.assertEqual(post.text, 'Пост')
+        self.assertEqual(post.author.username, 'posts_author')
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.pub_date,
+                         datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        self.assertEqual(post.comments.get().author.username, 'follower')
+        self.assertTrue(Follow.objects.filter(
+            user__username='follower',
+            author__username='posts_author').exists())
+        self.assertFalse(User.objects.get(
+            username='follower').has_usable_password())
+        self.assertEqual(UserCounter.objects.get(user=post.author).posts, 1)
+        self.assertTrue(TimelineEntry.objects.filter(post=post).exists())
+
+    def test_import_is_idempotent(self):
+        path = os.path.join(self.directory, 'dump.jsonl')
+        self.call('export_data', output=path)
+        self.call('import_data', path)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_import_into_database_with_other_posts(self):
+        """занятые id получают новые, комментарии идут за своим постом"""
+        path = os.path.join(self.directory, 'dump.jsonl')
+        self.call('export_data', output=path)
+        exported = self.post.pk
+        Post.objects.all().delete()
+        other = Post.objects.create(text='Чужой пост', author=self.follower)
+        Post.objects.filter(pk=other.pk).update(id=exported)
+        with open(path, 'a', encoding='utf-8') as stream:
+            stream.write(json.dumps({
+                'model': 'comment', 'id': 999, 'post': 12345,
+                'author': 'follower', 'pub_date': '', 'text': 'Сирота'},
+                ensure_ascii=False) + '\n')
+
+        self.call('import_data', path)
+
+        imported = Post.objects.get(text='Пост')
+        self.assertNotEqual(imported.pk, exported)
+        self.assertEqual(imported.comments.get().text, 'Комментарий')
+        self.assertEqual(Post.objects.get(pk=exported).text, 'Чужой пост')
+        self.assertFalse(Comment.objects.filter(post_id=exported).exists())
+        self.assertFalse(Comment.objects.filter(text='Сирота').exists())
+
+    def test_reimport_with_taken_ids_is_idempotent(self):
+        """пост с новым id узнаётся по автору, дате и тексту"""
+        path = os.path.join(self.directory, 'dump.jsonl')
+        self.call('export_data', output=path)
+        exported = self.post.pk
+        Post.objects.all().delete()
+        other = Post.objects.create(text='Чужой пост', author=self.follower)
+        Post.objects.filter(pk=other.pk).update(id=exported)
+        Comment.objects.create(post_id=exported, author=self.author,
+                               text='Чужой комментарий')
+
+        self.call('import_data', path)
+        self.call('import_data', path)
+
+        imported = Post.objects.get(text='Пост')
+        self.assertEqual(imported.comments.get().text, 'Комментарий')
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_csv(self):
+        path = os.path.join(self.directory, 'groups.csv')
+        self.call('export_data', models='group', format='csv', output=path)
+        Group.objects.all().delete()
+        self.call('import_data', path, format='csv', model='group')
+        self.assertEqual(Group.objects.get().title, 'Группа')
@@ -0,0 +1,97 @@
+import threading
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+
+from core.cache import TwoTierCache
+
+
+class TwoTierCacheTest(TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        options = {'L1_MAX_ENTRIES': 2, 'L1_TIMEOUT': 60,
+                   'SYNC_INTERVAL': 0}
+        self.worker_1 = TwoTierCache('shared', {'OPTIONS': options})
+        self.worker_2 = TwoTierCache('shared', {'OPTIONS': options})
+
+    def test_value_is_shared_between_workers(self):
+        self.worker_1.set('key', 'value')
+        self.assertEqual(self.worker_2.get('key'), 'value')
+        self.assertEqual(self.worker_2.get_many(['key', 'other']),
+                         {'key': 'value'})
+
+    def test_l1_is_bounded(self):
+        for number in range(5):
+            self.worker_1.set(f'key{number}', number)
+        self.assertEqual(len(self.worker_1._l1), 2)
+        self.assertEqual(self.worker_1.get('key0'), 0)
+
+    def test_l1_serves_without_shared_tier(self):
+        """повторное чтение не ходит в общий кэш"""
+        self.worker_1.set('key', 'value')
+        caches['shared'].set('key', 'changed')
+        self.assertEqual(self.worker_1.get('key'), 'value')
+
+    def test_delete_is_broadcast(self):
+        """удаление в одном воркере сбрасывает L1 в другом"""
+        self.worker_1.set('key', 'value')
+        self.assertEqual(self.worker_2.get('key'), 'value')
+        self.worker_1.delete('key')
+        self.assertIsNone(self.worker_2.get('key'))
+
+    def test_delete_keeps_other_keys_in_l1(self):
+        # Воркер, ещё не видевший журнала, очищает L1 целиком, поэтому
+        # сначала журнал заводится.
+        self.worker_1.delete('nothing')
+        self.worker_2.get('nothing')
+        self.worker_2.set_many({'a': 1, 'b': 2})
+        self.worker_1.delete('a')
+        self.worker_1.incr('b')
+        self.worker_2.set('c', 3)
+        caches['shared'].set('c', 'changed')
+        self.assertIsNone(self.worker_2.get('a'))
+        self.assertEqual(self.worker_2.get('b'), 3)
+        # Ключ, которого не было в журнале, по-прежнему читается из L1.
+        self.assertEqual(self.worker_2.get('c'), 3)
+
+    def test_lost_log_clears_l1(self):
+        self.worker_2.set('key', 'value')
+        self.worker_1.delete('other')
+        self.worker_2.get('key')
+        caches['shared'].set('key', 'changed')
+        self.worker_1.delete('other')
+        caches['shared'].delete_many(
+            [f'two-tier:log:{caches["shared"].get("two-tier:seq")}'])
+        self.assertEqual(self.worker_2.get('key'), 'changed')
+
+    def test_lost_counter_clears_l1(self):
+        self.worker_2.set('key', 'value')
+        self.worker_1.delete('other')
+        self.worker_2.get('key')
+        caches['shared'].set('key', 'changed')
+        caches['shared'].delete('two-tier:seq')
+        self.assertEqual(self.worker_2.get('key'), 'changed')
+
+    def test_clear_is_broadcast(self):
+        self.worker_1.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.worker_2.get_many(['a', 'b']),
+                         {'a': 1, 'b': 2})
+        self.worker_1.clear()
+        self.assertEqual(self.worker_2.get_many(['a', 'b']), {})
+
+
+class LockedFileBasedCacheTest(SimpleTestCase):
+    def test_concurrent_incr(self):
+        shared = caches['shared']
+        shared.set('counter', 0)
+
+        def bump():
+            for _ in range(50):
+                shared.incr('counter')
+
+        threads = [threading.Thread(target=bump) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(shared.get('counter'), 400)
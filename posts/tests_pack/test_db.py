@@ -0,0 +1,201 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.db import routers
+from core.db.routers import REPLICA_PIN_COOKIE
+from core.db.sqlite3.base import DatabaseWrapper, is_write
+from posts import graph
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+class SQLiteBackendTest(SimpleTestCase):
+    # Обёртки работают со своим временным файлом, а не с тестовой базой.
+    databases = {'default'}
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.name = os.path.join(directory, 'db.sqlite3')
+        self.wrappers = []
+
+    def tearDown(self):
+        for wrapper in self.wrappers:
+            wrapper.close()
+
+    def make_wrapper(self, **options):
+        settings_dict = {**connection.settings_dict, 'NAME': self.name,
+                         'OPTIONS': {**connection.settings_dict['OPTIONS'],
+                                     **options}}
+        wrapper = DatabaseWrapper(settings_dict)
+        if threading.current_thread() is threading.main_thread():
+            self.wrappers.append(wrapper)
+        return wrapper
+
+    def test_settings_options(self):
+        """WAL и BEGIN IMMEDIATE задаются OPTIONS стандартного бэкенда"""
+        wrapper = self.make_wrapper()
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+
+    def test_is_write(self):
+        self.assertTrue(is_write(' insert into t values (1)'))
+        self.assertTrue(is_write('BEGIN IMMEDIATE'))
+        self.assertFalse(is_write('SELECT 1'))
+
+    def test_writers_are_serialized(self):
+        """второй писатель ждёт, пока первый не закоммитит транзакцию"""
+        first = self.make_wrapper()
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (value INTEGER)')
+        first.set_autocommit(False)
+        with first.cursor() as cursor:
+            cursor.execute('INSERT INTO t VALUES (1)')
+        events = []
+
+        def write():
+            second = self.make_wrapper()
+            with second.cursor() as cursor:
+                cursor.execute('INSERT INTO t VALUES (2)')
+            events.append('second')
+            second.close()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        time.sleep(0.2)
+        events.append('first')
+        first.commit()
+        first.set_autocommit(True)
+        thread.join()
+        self.assertEqual(events, ['first', 'second'])
+        with first.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM t')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_write_queue_timeout(self):
+        first = self.make_wrapper()
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (value INTEGER)')
+        first.set_autocommit(False)
+        with first.cursor() as cursor:
+            cursor.execute('INSERT INTO t VALUES (1)')
+        errors = []
+
+        def write():
+            second = self.make_wrapper(timeout=0.1)
+            try:
+                with second.cursor() as cursor:
+                    cursor.execute('INSERT INTO t VALUES (2)')
+            except Exception as error:
+                errors.append(error)
+            second.close()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+        first.rollback()
+        self.assertEqual(len(errors), 1)
+        self.assertIn('database is locked', str(errors[0]))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTest(TestCase):
+    """Реплика — отдельный файл SQLite, в default её данных нет."""
+
+    # Псевдоним replica появляется только в setUpClass, поэтому '__all__'.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.settings['replica'] = {
+            **connection.settings_dict,
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        call_command('migrate', database='replica', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_list_and_detail_read_replica(self):
+        author = User.objects.using('replica').create(username='replicated')
+        post = Post.objects.using('replica').create(
+            author=author, text='Пост с реплики')
+        anonymous = Client()
+        self.assertContains(anonymous.get(reverse('posts:home')),
+                            'Пост с реплики')
+        self.assertContains(
+            anonymous.get(reverse('posts:posts_detail', args=[post.pk])),
+            'Пост с реплики')
+        self.assertContains(
+            anonymous.get(reverse('posts:profile', args=['replicated'])),
+            'Пост с реплики')
+
+    def test_author_reads_own_write(self):
+        response = self.client.post(reverse('posts:create'),
+                                    {'text': 'Свежий пост'})
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+        profile = reverse('posts:profile', args=['writer'])
+        self.assertContains(self.client.get(profile), 'Свежий пост')
+        # Без закрепления профиль читается с реплики, где автора ещё нет.
+        del self.client.cookies[REPLICA_PIN_COOKIE]
+        self.assertEqual(self.client.get(profile).status_code, 404)
+
+    def test_session_user_read_from_primary(self):
+        """вошедший пользователь есть только в default, но не аноним"""
+        response = self.client.get(reverse('posts:home'))
+        self.assertTrue(response.context['user'].is_authenticated)
+
+    def test_replica_reads_cached_briefly(self):
+        self.assertEqual(routers.cache_timeout(3600), 3600)
+        token = routers._use_replica.set(True)
+        try:
+            self.assertEqual(routers.cache_timeout(3600),
+                             settings.REPLICA_CACHE_TIMEOUT)
+            self.assertEqual(routers.cache_timeout(None),
+                             settings.REPLICA_CACHE_TIMEOUT)
+        finally:
+            routers._use_replica.reset(token)
+
+    def test_follow_graph_loads_from_primary(self):
+        """граф подписок не берёт рёбра с отстающей реплики"""
+        author = User.objects.create(username='followed')
+        Follow.objects.create(user=self.user, author=author)
+        token = routers._use_replica.set(True)
+        try:
+            loaded = graph.FollowGraph.load()
+        finally:
+            routers._use_replica.reset(token)
+        self.assertTrue(loaded.is_following(self.user.pk, author.pk))
+
+    def test_read_does_not_pin(self):
+        response = self.client.get(reverse('posts:create'))
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
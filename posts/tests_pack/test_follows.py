@@ -0,0 +1,149 @@
+import random
+import threading
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from .. import follows
+from ..models import Follow, TimelineEntry, User, UserCounter
+
+
+class FollowServiceTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='svc_author')
+        cls.reader = User.objects.create(username='svc_reader')
+        cls.author.posts.create(text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def counters(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_follow_is_idempotent(self):
+        self.assertTrue(follows.follow(self.reader, self.author))
+        self.assertFalse(follows.follow(self.reader, self.author))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.counters(self.author).followers, 1)
+        self.assertEqual(self.counters(self.reader).following, 1)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader)
+                        .exists())
+        self.assertFalse(follows.follow(self.author, self.author))
+
+    def test_unfollow_is_idempotent(self):
+        self.assertFalse(follows.unfollow(self.reader, self.author))
+        follows.follow(self.reader, self.author)
+        self.assertTrue(follows.unfollow(self.reader, self.author))
+        self.assertFalse(follows.unfollow(self.reader, self.author))
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.counters(self.author).followers, 0)
+        self.assertEqual(self.counters(self.reader).following, 0)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_unfollow_edge_counters_never_saw(self):
+        """подписка из ORM (импорт, админка) снимается без ухода в минус"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:profile_unfollow',
+                                      args=[self.author.username]))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.counters(self.author).followers, 0)
+        self.assertEqual(self.counters(self.reader).following, 0)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(follows.unfollow(self.reader, self.author))
+        self.assertEqual(self.counters(self.author).followers, 0)
+
+    def test_following_cache(self):
+        self.assertEqual(follows.following_ids(self.reader.pk), set())
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            follows.follow(self.reader, self.author)
+        self.assertEqual(len(callbacks), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(follows.following_ids(self.reader.pk),
+                             {self.author.pk})
+            follows.following_ids(self.reader.pk)
+        follows.unfollow(self.reader, self.author)
+        self.assertEqual(follows.following_ids(self.reader.pk), set())
+
+    def test_changed_signal(self):
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append((kwargs['user_id'], kwargs['author_id'],
+                             kwargs['following']))
+
+        follows.changed.connect(receiver)
+        self.addCleanup(follows.changed.disconnect, receiver)
+        with self.captureOnCommitCallbacks(execute=True):
+            follows.follow(self.reader, self.author)
+            follows.follow(self.reader, self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.filter(user=self.reader).delete()
+        self.assertEqual(received, [
+            (self.reader.pk, self.author.pk, True),
+            (self.reader.pk, self.author.pk, False),
+        ])
+
+    def test_double_click(self):
+        client = Client()
+        client.force_login(self.reader)
+        for url in ('posts:profile_follow', 'posts:profile_follow',
+                    'posts:profile_unfollow', 'posts:profile_unfollow'):
+            response = client.get(reverse(url, args=['svc_author']))
+            self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(self.counters(self.author).followers, 0)
+        response = client.get(reverse('posts:profile_follow',
+                                      args=['nobody']))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class FollowStressTest(TransactionTestCase):
+    THREADS = 8
+    ROUNDS = 40
+
+    def test_parallel_follows_keep_counters(self):
+        cache.clear()
+        users = [User.objects.create(username=f'stress_{number}')
+                 for number in range(4)]
+        errors = []
+
+        def hammer(seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(self.ROUNDS):
+                    user, author = rng.sample(users, 2)
+                    if rng.random() < 0.6:
+                        follows.follow(user, author)
+                    else:
+                        follows.unfollow(user, author)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=hammer, args=(seed,))
+                   for seed in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        for user in users:
+            with self.subTest(user=user.username):
+                counter = UserCounter.objects.filter(user=user).first()
+                self.assertEqual(
+                    counter.followers if counter else 0,
+                    Follow.objects.filter(author=user).count())
+                self.assertEqual(
+                    counter.following if counter else 0,
+                    Follow.objects.filter(user=user).count())
+                self.assertEqual(
+                    follows.following_ids(user.pk),
+                    set(Follow.objects.filter(user=user)
+                        .values_list('author_id', flat=True)))
@@ -0,0 +1,151 @@
+import random
+import threading
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from .. import follows, graph
+from ..models import Follow, User
+
+
+class AdjacencyTest(SimpleTestCase):
+    def test_changes_over_arrays(self):
+        rng = random.Random(0)
+        edges = {(rng.randrange(30), rng.randrange(30)) for _ in range(200)}
+        adjacency = graph.Adjacency(sorted(edges))
+        for _ in range(300):
+            edge = (rng.randrange(30), rng.randrange(30))
+            if rng.random() < 0.5:
+                adjacency.add(*edge)
+                edges.add(edge)
+            else:
+                adjacency.remove(*edge)
+                edges.discard(edge)
+        self.assertEqual(adjacency.size, len(edges))
+        self.assertEqual(list(adjacency.edges()), sorted(edges))
+        for node in range(30):
+            targets = sorted(target for source, target in edges
+                             if source == node)
+            self.assertEqual(list(adjacency.neighbours(node)), targets)
+            self.assertEqual(adjacency.degree(node), len(targets))
+            for target in range(30):
+                self.assertEqual(adjacency.contains(node, target),
+                                 (node, target) in edges)
+        compacted = adjacency.compacted()
+        self.assertEqual(compacted.added, {})
+        self.assertEqual(list(compacted.edges()), sorted(edges))
+        self.assertEqual(list(compacted.reversed().edges()),
+                         sorted((target, node) for node, target in edges))
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create(username=f'graph_{number}')
+                     for number in range(5)]
+        first, second, third, fourth, _ = cls.users
+        for user, author in ((first, second), (first, third),
+                             (second, fourth), (third, fourth),
+                             (first, fourth)):
+            Follow.objects.create(user=user, author=author)
+
+    def setUp(self):
+        cache.clear()
+        graph.reset()
+        self.addCleanup(graph.reset)
+
+    def ids(self, *numbers):
+        return [self.users[number].pk for number in numbers]
+
+    def test_queries(self):
+        first, second, third, fourth, fifth = self.ids(0, 1, 2, 3, 4)
+        with self.assertNumQueries(1):
+            self.assertEqual(graph.use(len), 5)
+        with self.assertNumQueries(0):
+            self.assertTrue(follows.is_following(first, fourth))
+            self.assertFalse(follows.is_following(fourth, first))
+            self.assertEqual(follows.known_followers(first, fourth),
+                             [second, third])
+            self.assertEqual(
+                list(graph.use(graph.FollowGraph.follower_ids, fourth)),
+                [first, second, third])
+
+    def test_local_and_remote_changes(self):
+        first, _, _, fourth, fifth = self.ids(0, 1, 2, 3, 4)
+        graph.use(len)
+        graph.record(fifth, fourth, True)
+        graph.record(first, fourth, False)
+        # Изменение из другого воркера: только запись в журнале.
+        shared = caches[graph.GRAPH_CACHE]
+        seq = shared.incr(graph.SEQ_KEY)
+        shared.set(graph.log_key(seq), (fourth, first, True))
+        with self.assertNumQueries(0):
+            self.assertTrue(follows.is_following(fifth, fourth))
+            self.assertFalse(follows.is_following(first, fourth))
+            self.assertTrue(follows.is_following(fourth, first))
+        # Журнал пропал — граф перечитывает базу.
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertTrue(follows.is_following(first, fourth))
+
+    def test_lost_counter_reloads_graph(self):
+        first, _, _, fourth, _ = self.ids(0, 1, 2, 3, 4)
+        graph.use(len)
+        caches[graph.GRAPH_CACHE].delete(graph.SEQ_KEY)
+        Follow.objects.filter(user_id=first, author_id=fourth).delete()
+        with self.assertNumQueries(1):
+            self.assertFalse(follows.is_following(first, fourth))
+
+    def test_concurrent_records_get_distinct_numbers(self):
+        """номера журнала не повторяются и у параллельных воркеров"""
+        shared = caches[graph.GRAPH_CACHE]
+        start = graph.position()
+
+        def local(user_id):
+            for author_id in range(20):
+                graph.record(user_id, author_id, True)
+
+        def remote(user_id):
+            # Другой процесс: свой lock, общий только счётчик в кэше.
+            for author_id in range(20):
+                seq = shared.incr(graph.SEQ_KEY)
+                shared.set(graph.log_key(seq), (user_id, author_id, True))
+
+        threads = [threading.Thread(target=target, args=[user_id])
+                   for user_id, target in enumerate((local, remote) * 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(graph.position(), start + 120)
+        entries = shared.get_many([graph.log_key(seq)
+                                   for seq in range(start + 1, start + 121)])
+        self.assertEqual(len(set(entries.values())), 120)
+
+    def test_follow_signal_updates_graph(self):
+        graph.use(len)
+        fourth, fifth = self.users[3:]
+        with self.captureOnCommitCallbacks(execute=True):
+            follows.follow(fifth, fourth)
+        with self.assertNumQueries(0):
+            self.assertTrue(follows.is_following(fifth.pk, fourth.pk))
+
+    def test_too_many_edges(self):
+        first, second, third, fourth, _ = self.ids(0, 1, 2, 3, 4)
+        with mock.patch.object(graph, 'MAX_EDGES', 4):
+            self.assertIsNone(graph.use(len))
+            self.assertTrue(follows.is_following(first, fourth))
+            self.assertEqual(follows.known_followers(first, fourth),
+                             [second, third])
+
+    def test_profile_shows_known_followers(self):
+        graph.use(len)
+        client = Client()
+        client.force_login(self.users[0])
+        response = client.get(reverse('posts:profile', args=['graph_3']))
+        self.assertTrue(response.context['following'])
+        self.assertEqual(response.context['known_total'], 2)
+        self.assertContains(response, 'Подписаны из ваших подписок (2)')
+        self.assertContains(response, 'graph_1')
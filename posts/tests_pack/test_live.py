@@ -0,0 +1,166 @@
+import asyncio
+import json
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase
+from django.urls import reverse
+
+from posts import async_views, live
+from posts.models import Follow, Group, Post, User
+
+
+class BrokerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.broker = live.Broker(backlog=3)
+
+    async def test_wait_wakes_on_publish_from_thread(self):
+        event = live.Event(1, 10, 1, None)
+        timer = threading.Timer(0.05, self.broker.add, [[event]])
+        timer.start()
+        events = await self.broker.wait(0, timeout=5)
+        self.assertEqual(events, [event])
+
+    async def test_wait_times_out(self):
+        self.assertEqual(await self.broker.wait(0, timeout=0.01), [])
+
+    def test_backlog_is_bounded(self):
+        self.broker.add([live.Event(seq, seq, 1, None)
+                         for seq in range(1, 6)])
+        self.assertEqual([event.seq for event in self.broker.since(0)],
+                         [3, 4, 5])
+
+    def test_sync_reads_other_processes(self):
+        """события, опубликованные другим воркером, приходят из кэша"""
+        cache.set(live.SEQ_KEY, 2)
+        cache.set(live.event_key(1), (1, 10, 1, None))
+        cache.set(live.event_key(2), (2, 11, 1, None))
+        self.broker.sync()
+        self.assertEqual([event.post_id for event in self.broker.since(0)],
+                         [10, 11])
+
+    def test_sync_notices_new_counter(self):
+        """счётчик, начатый заново другим воркером, сбрасывает очередь"""
+        self.broker.add([live.Event(100, 10, 1, None)])
+        cache.set(live.SEQ_KEY, 1)
+        cache.set(live.event_key(1), (1, 11, 1, None))
+        self.broker.sync()
+        self.assertEqual([event.post_id for event in self.broker.since(0)],
+                         [11])
+
+    def test_sync_skips_lost_events(self):
+        """пропавшее из кэша событие запрашивается один раз"""
+        cache.set(live.SEQ_KEY, 2)
+        cache.set(live.event_key(2), (2, 11, 1, None))
+        self.broker.sync()
+        shared = live._cache()
+        with mock.patch.object(shared, 'get_many',
+                               wraps=shared.get_many) as get_many:
+            self.broker.sync()
+            get_many.assert_not_called()
+            cache.set(live.SEQ_KEY, 3)
+            cache.set(live.event_key(3), (3, 12, 1, None))
+            self.broker.sync()
+        get_many.assert_called_once_with([live.event_key(3)])
+        self.assertEqual([event.post_id for event in self.broker.since(0)],
+                         [11, 12])
+
+    def test_concurrent_publish_numbers_are_unique(self):
+        posts = [Post(pk=number, author_id=1) for number in range(1, 41)]
+        seqs = []
+
+        def publish(chunk):
+            for post in chunk:
+                seqs.append(live.publish(post).seq)
+
+        with mock.patch.object(live, 'broker', self.broker):
+            threads = [threading.Thread(target=publish,
+                                        args=[posts[start::4]])
+                       for start in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        first = min(seqs)
+        self.assertEqual(sorted(seqs), list(range(first, first + 40)))
+
+
+@mock.patch.object(async_views, 'LIVE_POLL_TIMEOUT', 0.05)
+class LiveViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='live_author')
+        cls.other = User.objects.create(username='live_other')
+        cls.reader = User.objects.create(username='live_reader')
+        cls.group = Group.objects.create(title='live', slug='live',
+                                         description='live')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(live, 'broker', live.Broker())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def publish(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(text='live', **fields)
+
+    def poll(self, client=None, **params):
+        response = (client or self.client).get(
+            reverse('posts:live'), {'mode': 'poll', 'last': 0, **params})
+        return response.json()
+
+    def test_poll_filters_feeds(self):
+        in_group = self.publish(author=self.author, group=self.group)
+        other = self.publish(author=self.other)
+        self.assertEqual(self.poll()['posts'], [in_group.pk, other.pk])
+        self.assertEqual(self.poll(feed='group', group='live')['posts'],
+                         [in_group.pk])
+        self.client.force_login(self.reader)
+        self.assertEqual(self.poll(feed='follow')['posts'], [in_group.pk])
+        self.assertEqual(self.poll(last=live.current_seq()),
+                         {'last': live.current_seq(), 'posts': []})
+
+    def test_lost_counter_restarts_queue(self):
+        """после потери live:seq клиенты получают посты нового счётчика"""
+        with mock.patch.object(live.random, 'randrange',
+                               side_effect=[100, 0]):
+            for _ in range(5):
+                self.publish(author=self.author)
+            last = live.current_seq()
+            self.assertEqual(last, 105)
+            live._cache().delete(live.SEQ_KEY)
+            post = self.publish(author=self.author)
+        self.assertEqual(live.current_seq(), 1)
+        self.assertEqual([event.post_id for event in live.broker.since(0)],
+                         [post.pk])
+        self.assertEqual(self.poll(last=last),
+                         {'last': 1, 'posts': [post.pk]})
+
+    def test_unknown_feed(self):
+        response = self.client.get(reverse('posts:live'),
+                                   {'feed': 'follow', 'mode': 'poll'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_sse_stream(self):
+        request = AsyncRequestFactory().get(reverse('posts:live'))
+
+        async def auser():
+            return AnonymousUser()
+        request.auser = auser
+        response = await async_views.live_posts(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content.__aiter__()
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        event = live.Event(live.broker.head() + 1, 42, self.author.pk, None)
+        asyncio.get_running_loop().call_later(0.05, live.broker.add,
+                                              [event])
+        chunk = (await anext(stream)).decode()
+        self.assertIn(f'id: {event.seq}', chunk)
+        self.assertEqual(json.loads(chunk.split('data: ')[1]), {'id': 42})
+        await stream.aclose()
@@ -0,0 +1,90 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import perf
+from posts.models import Post, User
+
+
+class HistogramTest(SimpleTestCase):
+    def test_percentiles_are_close(self):
+        histogram = perf.Histogram()
+        for value in range(1, 100001):
+            histogram.record(value)
+        for share in (0.5, 0.95, 0.99):
+            expected = share * 100000
+            self.assertAlmostEqual(histogram.percentile(share) / expected,
+                                   1, delta=0.035)
+        self.assertEqual(histogram.percentile(1), 100000)
+        # 100 000 значений уместились в несколько сотен корзин.
+        self.assertLess(len(histogram.counts), 500)
+
+    def test_small_values_are_exact(self):
+        histogram = perf.Histogram()
+        for value in (1, 2, 3, 4):
+            histogram.record(value)
+        self.assertEqual(histogram.percentile(0.5), 2)
+        self.assertEqual(perf.Histogram().percentile(0.5), 0)
+
+
+class PerfMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='perf_author')
+        cls.staff = User.objects.create(username='perf_staff', is_staff=True)
+        Post.objects.create(text='perf', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        perf.registry.clear()
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_request_is_measured(self):
+        response = self.client.get(reverse('posts:home'))
+        stats = dict(perf.registry.snapshot())['posts:home']
+        histograms = stats.histograms
+        self.assertEqual(histograms['wall'].count, 1)
+        self.assertEqual(histograms['db_queries'].max, 1)
+        self.assertGreater(histograms['template_time'].max, 0)
+        self.assertEqual(histograms['response_size'].max,
+                         len(response.content))
+        self.assertEqual(stats.cache_misses, 1)
+        self.client.get(reverse('posts:home'))
+        self.assertEqual(stats.cache_hits, 1)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_sampling_off(self):
+        self.client.get(reverse('posts:home'))
+        self.assertEqual(perf.registry.snapshot(), [])
+
+    @override_settings(PERF_SAMPLE_RATE=1)
+    def test_stats_and_metrics(self):
+        self.client.get(reverse('posts:home'))
+        response = self.client.get(reverse('stats'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.client.force_login(self.staff)
+        self.assertContains(self.client.get(reverse('stats')), 'posts:home')
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(
+            response,
+            'yatube_request_wall_seconds{view="posts:home",quantile="0.5"}')
+        self.assertContains(
+            response, 'yatube_request_db_queries_count{view="posts:home"} 1')
+        self.client.logout()
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        # Внутренний адрес сам по себе доступа не даёт.
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        with self.settings(METRICS_TOKEN='secret'):
+            response = self.client.get(reverse('metrics'),
+                                       HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+            response = self.client.get(reverse('metrics'),
+                                       HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, HTTPStatus.OK)
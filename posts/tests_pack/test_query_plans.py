@@ -0,0 +1,77 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from .. import timeline
+from ..models import Follow, Group, Post, User, UserCounter
+from ..query_plan import plan_problems
+from ..utils import CursorPaginator, feed
+
+
+class QueryPlanTest(TestCase):
+    """Запросы лент идут по индексам: без SCAN таблиц и TEMP B-TREE."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='posts_author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(title='test_title', slug='test',
+                                         description='test_description')
+        cls.post = Post.objects.create(text='text', author=cls.author,
+                                       group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        UserCounter.objects.create(user=cls.author, followers=1)
+
+    def assertIndexed(self, paginator):
+        token = paginator._token('n', paginator.querysets[0].first())
+        for cursor, ordered_scan in ((None, True), (token, False)):
+            for queryset in paginator.page_querysets(cursor):
+                with self.subTest(sql=str(queryset.query)):
+                    self.assertEqual(
+                        plan_problems(queryset, ordered_scan), [])
+
+    def test_post_feeds(self):
+        feeds = (
+            feed(),
+            feed(self.group.posts.all()),
+            feed(Post.objects.filter(author=self.author)),
+        )
+        for posts in feeds:
+            self.assertIndexed(CursorPaginator(posts))
+
+    def test_follow_feed(self):
+        timeline.fan_out(self.post)
+        self.assertIndexed(timeline.feed_paginator(self.reader))
+
+    @mock.patch('posts.timeline.FANOUT_LIMIT', 0)
+    def test_follow_feed_with_celebrities(self):
+        paginator = timeline.feed_paginator(self.reader)
+        self.assertEqual(len(paginator.querysets), 2)
+        for queryset in paginator.page_querysets():
+            self.assertEqual(plan_problems(queryset), [])
+
+    @mock.patch('posts.timeline.FANOUT_LIMIT', 0)
+    def test_follow_feed_with_many_celebrities(self):
+        for number in range(3):
+            celebrity = User.objects.create(username=f'celebrity{number}')
+            UserCounter.objects.create(user=celebrity, followers=1)
+            Follow.objects.create(user=self.reader, author=celebrity)
+            Post.objects.create(text='text', author=celebrity)
+        paginator = timeline.feed_paginator(self.reader)
+        self.assertEqual(len(paginator.querysets), 2)
+        token = paginator._token('n', paginator.get_page()[0])
+        for cursor in (None, token):
+            for queryset in paginator.page_querysets(cursor):
+                with self.subTest(cursor=cursor, sql=str(queryset.query)):
+                    self.assertEqual(plan_problems(queryset), [])
+
+    def test_lookups(self):
+        querysets = (
+            Follow.objects.filter(user=self.reader, author=self.author),
+            Follow.objects.filter(user=self.reader).values('author'),
+            self.post.comments.select_related('author'),
+        )
+        for queryset in querysets:
+            with self.subTest(sql=str(queryset.query)):
+                self.assertEqual(plan_problems(queryset), [])
@@ -0,0 +1,89 @@
+from django.core.cache import cache
+from django.template import Context, Engine
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import querycheck
+from posts.models import Post, User
+
+
+class FingerprintTest(SimpleTestCase):
+    def test_values_are_replaced(self):
+        self.assertEqual(
+            querycheck.fingerprint(
+                "SELECT * FROM t WHERE a = 5 AND b = 'it''s' "
+                "AND c IN (%s, %s, %s)"),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)')
+        self.assertEqual(
+            querycheck.fingerprint('SELECT * FROM t WHERE id IN (1, 2)'),
+            querycheck.fingerprint('SELECT * FROM t WHERE id IN (7)'))
+
+
+class RecorderTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='check_author')
+        for number in range(3):
+            Post.objects.create(text=f'пост {number}', author=cls.author)
+
+    def test_loop_is_found(self):
+        with querycheck.record() as recorder:
+            for post in Post.objects.all():
+                post.author.username
+        problems = recorder.problems()
+        self.assertEqual(len(problems), 1)
+        self.assertTrue(problems[0].startswith('N+1: 3 × SELECT'))
+        self.assertIn('test_querycheck.py', problems[0])
+
+    def test_template_line_is_reported(self):
+        engine = Engine(loaders=[('django.template.loaders.locmem.Loader', {
+            'check.html': ('{% for post in posts %}\n'
+                           '{{ post.author.username }}\n'
+                           '{% endfor %}'),
+        })])
+        template = engine.get_template('check.html')
+        with querycheck.record() as recorder:
+            template.render(Context({'posts': Post.objects.all()}))
+        problems = recorder.problems()
+        self.assertEqual(len(problems), 1)
+        self.assertIn('(check.html:2)', problems[0])
+
+    def test_duplicate_is_found(self):
+        with querycheck.record() as recorder:
+            User.objects.get(pk=self.author.pk)
+            User.objects.get(pk=self.author.pk)
+            Post.objects.count()
+        problems = recorder.problems()
+        self.assertEqual(len(problems), 1)
+        self.assertTrue(problems[0].startswith('дубль: 2 × SELECT'))
+
+    def test_joined_query_is_clean(self):
+        with querycheck.record() as recorder:
+            for post in Post.objects.select_related('author'):
+                post.author.username
+        self.assertEqual(len(recorder), 1)
+        self.assertEqual(recorder.problems(), [])
+
+
+class QueryCheckMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='budget_author')
+        Post.objects.create(text='бюджет', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_within_budget(self):
+        self.client.get(reverse('posts:home'))
+
+    @override_settings(QUERY_BUDGETS={'posts:home': 0})
+    def test_budget_exceeded(self):
+        with self.assertRaisesMessage(querycheck.QueryProblem,
+                                      'posts:home: 1 SQL-запросов'):
+            self.client.get(reverse('posts:home'))
+
+    @override_settings(QUERY_CHECK='warn', QUERY_BUDGETS={'posts:home': 0})
+    def test_warn_mode_logs(self):
+        with self.assertLogs('core.querycheck', 'WARNING'):
+            self.client.get(reverse('posts:home'))
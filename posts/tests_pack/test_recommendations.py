@@ -0,0 +1,105 @@
+import os
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import follows, graph, recommendations
+from ..models import Follow, Group, Post, User
+
+
+class RecommendationsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        names = ('me', 'friend', 'mate', 'star', 'minor', 'neighbour',
+                 'stranger')
+        cls.users = {name: User.objects.create(username=f'rec_{name}')
+                     for name in names}
+        users = cls.users
+        for user, author in (('me', 'friend'), ('me', 'mate'),
+                             ('friend', 'star'), ('mate', 'star'),
+                             ('friend', 'minor'), ('star', 'me')):
+            Follow.objects.create(user=users[user], author=users[author])
+        group = Group.objects.create(title='Группа', slug='rec-group',
+                                     description='Группа')
+        for author in ('me', 'neighbour', 'neighbour'):
+            Post.objects.create(text='Пост', author=users[author],
+                                group=group)
+        Post.objects.create(text='Без группы', author=users['stranger'])
+
+    def setUp(self):
+        cache.clear()
+        graph.reset()
+        self.addCleanup(graph.reset)
+
+    def usernames(self, entries):
+        return [entry['username'] for entry in entries]
+
+    def test_score(self):
+        me = self.users['me'].pk
+        data = recommendations.Neighbourhood.load()
+        top = recommendations.best(recommendations.score(data, me))
+        self.assertEqual(
+            [(author_id, friends, groups)
+             for author_id, _, friends, groups in top],
+            [(self.users['star'].pk, 2, False),
+             (self.users['minor'].pk, 1, False),
+             (self.users['neighbour'].pk, 0, True)])
+        around = recommendations.Neighbourhood.around(me)
+        self.assertEqual(recommendations.score(around, me),
+                         recommendations.score(data, me))
+
+    def test_recompute_and_read(self):
+        me = self.users['me']
+        self.assertIsNone(recommendations.for_user(me.pk))
+        self.assertEqual(recommendations.recompute(), len(self.users))
+        graph.use(len)
+        with self.assertNumQueries(0):
+            entries = recommendations.for_user(me.pk)
+        self.assertEqual(self.usernames(entries),
+                         ['rec_star', 'rec_minor', 'rec_neighbour'])
+        self.assertEqual(recommendations.for_user(
+            self.users['stranger'].pk), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            follows.follow(me, self.users['star'])
+        self.assertEqual(self.usernames(recommendations.for_user(me.pk)),
+                         ['rec_minor', 'rec_neighbour'])
+
+    def test_incremental_recompute(self):
+        self.assertEqual(
+            recommendations.recompute_changed(everyone=True),
+            len(self.users))
+        self.assertEqual(recommendations.recompute_changed(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            follows.follow(self.users['stranger'], self.users['minor'])
+        # Подписавшийся и его подписчики (у stranger их нет).
+        self.assertEqual(recommendations.recompute_changed(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            follows.follow(self.users['star'], self.users['minor'])
+        self.assertEqual(recommendations.recompute_changed(), 3)
+        cache.clear()
+        self.assertEqual(recommendations.recompute_changed(),
+                         len(self.users))
+
+    def test_sidebar(self):
+        client = Client()
+        client.force_login(self.users['me'])
+        graph.use(len)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertIsNone(response.context['recommendations'])
+        self.assertContains(response, 'data-recommendations')
+        response = client.get(reverse('posts:recommendations'))
+        self.assertContains(response, 'На кого подписаться')
+        self.assertContains(response, 'rec_star')
+        response = client.get(reverse('posts:profile', args=['rec_star']))
+        self.assertEqual(self.usernames(response.context['recommendations']),
+                         ['rec_star', 'rec_minor', 'rec_neighbour'])
+        self.assertNotContains(response, 'data-recommendations')
+
+    def test_command(self):
+        call_command('recompute_recommendations', '--all',
+                     stdout=open(os.devnull, 'w'))
+        self.assertEqual(
+            self.usernames(recommendations.for_user(self.users['me'].pk)),
+            ['rec_star', 'rec_minor', 'rec_neighbour'])
@@ -0,0 +1,79 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post, User
+from ..search import match_expression
+from ..utils import POST_V, encode_cursor
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='posts_author')
+        cls.group = Group.objects.create(title='Путешествия',
+                                         slug='travel',
+                                         description='Заметки о поездках')
+        cls.post = Post.objects.create(text='Поездка на Байкал',
+                                       author=cls.author)
+        cls.group_post = Post.objects.create(text='Просто текст',
+                                             author=cls.author,
+                                             group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query, **params):
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': query, **params})
+        return response.context['page_obj']
+
+    def test_match_expression_is_escaped(self):
+        """операторы FTS5 из ввода превращаются в обычные слова"""
+        self.assertEqual(match_expression('байкал OR "x" NEAR'),
+                         '"байкал"* "or"* "x"* "near"*')
+        self.assertEqual(match_expression('  ()*: '), '')
+
+    def test_prefix_query(self):
+        self.assertEqual(list(self.found('байк')), [self.post])
+
+    def test_group_fields_are_indexed(self):
+        self.assertEqual(list(self.found('путешеств')), [self.group_post])
+
+    def test_text_ranks_above_group_description(self):
+        """совпадение в тексте весит больше, чем в описании группы"""
+        self.assertEqual(list(self.found('поездк')),
+                         [self.post, self.group_post])
+
+    def test_index_follows_changes(self):
+        post = Post.objects.create(text='Старое слово', author=self.author)
+        post.text = 'Новое слово'
+        post.save()
+        self.assertEqual(list(self.found('старое')), [])
+        self.assertEqual(list(self.found('новое')), [post])
+        self.group.title = 'Горы'
+        self.group.save()
+        self.assertEqual(list(self.found('горы')), [self.group_post])
+        post.delete()
+        self.assertEqual(list(self.found('слово')), [])
+
+    def test_results_are_paginated(self):
+        posts = {Post.objects.create(text=f'Закат номер {number}',
+                                     author=self.author)
+                 for number in range(POST_V + 3)}
+        first = self.found('закат')
+        self.assertEqual(len(first), POST_V)
+        second = self.found('закат', cursor=first.next_cursor)
+        self.assertFalse(second.has_next())
+        self.assertEqual(set(first) | set(second), posts)
+
+    def test_broken_cursor_shows_first_page(self):
+        for cursor in (encode_cursor(1.0, 10 ** 30),
+                       encode_cursor(float('nan'), self.post.pk),
+                       encode_cursor(float('-inf'), self.post.pk),
+                       encode_cursor(True, self.post.pk),
+                       encode_cursor(-1.0, False)):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(list(self.found('байк', cursor=cursor)),
+                                 [self.post])
@@ -1,14 +1,26 @@
+import os
+import shutil
 import tempfile
+import time
 
 from http import HTTPStatus
+from unittest import mock
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404
+from django.test import (AsyncRequestFactory, Client, TestCase,
+                         override_settings)
 from django.urls import reverse
 from django.core.cache import cache
 from django.conf import settings
 
 
-from posts.models import Post, Group, User
+from posts import (async_views, counters, graph, thumbnails, variants,
+                   versions)
+from posts.models import (Comment, Follow, Post, Group, Thumbnail,
+                          TimelineEntry, User, UserCounter)
+from ..utils import COMMENT_V, comments_paginator, encode_cursor
 from ..views import POST_V
 
 PAGEN = 13
@@ -126,6 +138,42 @@ class PaginatorViewsTest(TestCase):
                     len(response.context['page_obj']), POST_V
                 )
 
+    def test_second_page_contains_three_records(self):
+        """курсор ведёт на вторую страницу и обратно"""
+        templates_pages_names = {
+            'posts/index.html': reverse('posts:home'),
+            'posts/profile.html':
+                reverse('posts:profile', kwargs={'username': self.author}),
+            'posts/group_list.html':
+                reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+        }
+        for template, reverse_name in templates_pages_names.items():
+            with self.subTest(reverse_name=reverse_name):
+                first = self.client.get(reverse_name).context['page_obj']
+                self.assertFalse(first.has_previous())
+                response = self.client.get(
+                    reverse_name, {'cursor': first.next_cursor})
+                second = response.context['page_obj']
+                self.assertEqual(len(second), PAGEN - POST_V)
+                self.assertFalse(second.has_next())
+                response = self.client.get(
+                    reverse_name, {'cursor': second.previous_cursor})
+                self.assertEqual(
+                    list(response.context['page_obj']), list(first))
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.client.get(reverse('posts:home'), {'cursor': '%%%'})
+        self.assertEqual(len(response.context['page_obj']), POST_V)
+        for values in (('n', 5, 1), (1, 'x', 2), ('n', {'a': 1}, 2),
+                       ('', '2024-01-01T00:00:00', 1),
+                       ('n', '2024-01-01T00:00:00', 2 ** 70)):
+            with self.subTest(values=values):
+                response = self.client.get(
+                    reverse('posts:home'),
+                    {'cursor': encode_cursor(*values)})
+                self.assertFalse(response.context['page_obj']
+                                 .has_previous())
+
 
 class CacheIndex(TestCase):
     @classmethod
@@ -141,17 +189,36 @@ class CacheIndex(TestCase):
         self.authorized_client.force_login(self.user)
 
     def test_cache(self):
-        """тестируем кэш"""
-        content = self.authorized_client.get(reverse('posts:home')).content
-        Post.objects.create(
+        """карточки берутся из кэша, пока пост не сохранят заново"""
+        cache.clear()
+        post = Post.objects.create(
             text='Пост №1',
             author=self.user,
         )
+        content = self.authorized_client.get(reverse('posts:home')).content
+        self.assertIn('Пост №1'.encode(), content)
+        Post.objects.filter(pk=post.pk).update(text='Пост №2')
         content_1 = self.authorized_client.get(reverse('posts:home')).content
         self.assertEqual(content, content_1)
-        cache.clear()
+        post.refresh_from_db()
+        post.save()
         content_2 = self.authorized_client.get(reverse('posts:home')).content
-        self.assertNotEqual(content_1, content_2)
+        self.assertIn('Пост №2'.encode(), content_2)
+
+    def test_new_post_shown_at_once(self):
+        """новый пост виден на главной сразу, без сброса кэша"""
+        self.authorized_client.get(reverse('posts:home'))
+        Post.objects.create(text='Пост №3', author=self.user)
+        content = self.authorized_client.get(reverse('posts:home')).content
+        self.assertIn('Пост №3'.encode(), content)
+
+    def test_author_rename_invalidates_cards(self):
+        Post.objects.create(text='Пост №4', author=self.user)
+        self.client.get(reverse('posts:home'))
+        self.user.first_name = 'Переименован'
+        self.user.save()
+        content = self.client.get(reverse('posts:home')).content
+        self.assertIn('Переименован'.encode(), content)
 
 
 class FollowTest(TestCase):
@@ -207,3 +274,467 @@ class FollowTest(TestCase):
         )
         response = self.author_client.get(reverse('posts:follow_index'))
         self.assertEqual((len(page_object)), 0)
+
+    def test_new_post_fans_out_to_followers(self):
+        """новый пост автора попадает в ленту подписчика"""
+        self.follower_client.get(reverse('posts:profile_follow',
+                                 kwargs={'username': self.author.username}))
+        self.author_client.post(reverse('posts:create'),
+                                data={'text': 'Свежий пост'})
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post__text='Свежий пост').exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0].text, 'Свежий пост')
+
+    @mock.patch('posts.timeline.FANOUT_LIMIT', 0)
+    def test_celebrity_posts_are_read_on_request(self):
+        """посты популярного автора подмешиваются при чтении"""
+        self.follower_client.get(reverse('posts:profile_follow',
+                                 kwargs={'username': self.author.username}))
+        self.author_client.post(reverse('posts:create'),
+                                data={'text': 'Свежий пост'})
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        texts = [post.text for post in response.context['page_obj']]
+        self.assertEqual(texts, ['Свежий пост', self.post.text])
+
+    @mock.patch('posts.timeline.FANOUT_LIMIT', 1)
+    def test_feed_and_fan_out_agree_on_celebrities(self):
+        """счётчик опередил граф подписок — пост всё равно в ленте"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        graph.use(len)
+        # Вторую подписку счётчик увидел, а граф подписок — ещё нет.
+        UserCounter.objects.update_or_create(user=self.author,
+                                             defaults={'followers': 2})
+        self.author_client.post(reverse('posts:create'),
+                                data={'text': 'На границе'})
+        self.assertFalse(TimelineEntry.objects.filter(
+            post__text='На границе').exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        texts = [post.text for post in response.context['page_obj']]
+        self.assertEqual(texts, ['На границе', self.post.text])
+
+    @mock.patch('posts.timeline.FANOUT_LIMIT', 1)
+    def test_posts_materialized_when_author_stops_being_celebrity(self):
+        """посты, вышедшие у знаменитости, остаются в ленте после отписок"""
+        other = User.objects.create(username='other_follower')
+        other_client = Client()
+        other_client.force_login(other)
+        for client in (self.follower_client, other_client):
+            client.get(reverse('posts:profile_follow',
+                               kwargs={'username': self.author.username}))
+        self.author_client.post(reverse('posts:create'),
+                                data={'text': 'Пост знаменитости'})
+        self.assertFalse(TimelineEntry.objects.filter(
+            post__text='Пост знаменитости').exists())
+        other_client.get(reverse('posts:profile_unfollow',
+                                 kwargs={'username': self.author.username}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post__text='Пост знаменитости').exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        texts = [post.text for post in response.context['page_obj']]
+        self.assertEqual(texts, ['Пост знаменитости', self.post.text])
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов на страницу не зависит от числа карточек."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='posts_author',
+                                         first_name='Имя',
+                                         last_name='Фамилия')
+        cls.follower = User.objects.create(username='follower')
+        cls.group = Group.objects.create(title='test_title',
+                                         description='test_description',
+                                         slug='test-slug')
+        for number in range(PAGEN):
+            post = Post.objects.create(text=f'text{number}',
+                                       author=cls.author, group=cls.group)
+            TimelineEntry.objects.create(user=cls.follower, post=post,
+                                         author=cls.author,
+                                         pub_date=post.pub_date)
+
+    def setUp(self):
+        cache.clear()
+        # Граф подписок загружается один раз на процесс — не в замере.
+        graph.use(len)
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def test_feed_query_count(self):
+        pages = (
+            (reverse('posts:home'), 1),
+            (reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+             2),
+            # Async-профиль читает счётчики параллельно отдельным
+            # запросом, синхронный — вместе с автором.
+            (reverse('posts:profile',
+                     kwargs={'username': self.author.username}),
+             3 if settings.ASYNC_VIEWS else 2),
+        )
+        for url, queries in pages:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(len(response.context['page_obj']), POST_V)
+
+    def test_follow_feed_query_count(self):
+        # сессия, пользователь, знаменитости из подписок, страница ленты
+        with self.assertNumQueries(4):
+            response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), POST_V)
+
+    @mock.patch('posts.timeline.FANOUT_LIMIT', 0)
+    def test_follow_feed_queries_do_not_grow_with_celebrities(self):
+        for number in range(5):
+            celebrity = User.objects.create(username=f'celebrity{number}')
+            UserCounter.objects.create(user=celebrity, followers=1)
+            Follow.objects.create(user=self.follower, author=celebrity)
+            Post.objects.create(text=f'celebrity{number}', author=celebrity)
+        # сессия, пользователь, знаменитости, лента и один запрос на
+        # посты всех знаменитостей
+        with self.assertNumQueries(5):
+            response = self.follower_client.get(reverse('posts:follow_index'))
+        texts = [post.text for post in response.context['page_obj']]
+        self.assertEqual(texts[:5],
+                         [f'celebrity{number}' for number in range(4, -1, -1)])
+
+
+class AsyncViewsTest(TestCase):
+    """Async-версии страниц отдают то же, что синхронные."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='async_author')
+        cls.follower = User.objects.create(username='async_follower')
+        cls.group = Group.objects.create(title='async', slug='async',
+                                         description='async')
+        cls.posts = [Post.objects.create(text=f'async{number}',
+                                         author=cls.author, group=cls.group)
+                     for number in range(PAGEN)]
+        UserCounter.objects.create(user=cls.author, posts=PAGEN)
+        for post in cls.posts:
+            TimelineEntry.objects.create(user=cls.follower, post=post,
+                                         author=cls.author,
+                                         pub_date=post.pub_date)
+
+    def setUp(self):
+        cache.clear()
+
+    def request(self, path, user=None):
+        request = AsyncRequestFactory().get(path)
+        user = user or AnonymousUser()
+
+        async def auser():
+            return user
+        request.auser = auser
+        return request
+
+    async def test_feeds(self):
+        pages = (
+            (async_views.index, {}),
+            (async_views.group_posts, {'slug': self.group.slug}),
+            (async_views.profile, {'username': self.author.username}),
+        )
+        for view, kwargs in pages:
+            with self.subTest(view=view.__name__):
+                response = await view(self.request('/'), **kwargs)
+                self.assertContains(response, f'async{PAGEN - 1}')
+                self.assertNotContains(response, 'async0<')
+
+    async def test_follow_feed(self):
+        response = await async_views.follow_index(
+            self.request('/follow/', self.follower))
+        self.assertContains(response, f'async{PAGEN - 1}')
+
+    async def test_post_detail(self):
+        post = self.posts[0]
+        response = await async_views.post_detail(self.request('/'), post.pk)
+        self.assertContains(response, post.text)
+        self.assertContains(response, f'<span>{PAGEN}</span>')
+        with self.assertRaises(Http404):
+            await async_views.post_detail(self.request('/'), 0)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='etag_author')
+        cls.reader = User.objects.create(username='etag_reader')
+        cls.group = Group.objects.create(title='etag', slug='etag',
+                                         description='etag')
+        cls.post = Post.objects.create(text='etag', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def assertNotModified(self, client, url, etag):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_not_modified_without_queries(self):
+        url = reverse('posts:home')
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(0):
+            self.assertNotModified(self.client, url, response['ETag'])
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_new_post_changes_feeds(self):
+        urls = [reverse('posts:home'),
+                reverse('posts:group_list', args=[self.group.slug]),
+                reverse('posts:profile', args=[self.author.username])]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        self.author_client.post(reverse('posts:create'),
+                                {'text': 'Новый', 'group': self.group.pk})
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_comment_changes_post_page(self):
+        url = reverse('posts:posts_detail', args=[self.post.pk])
+        etag = self.reader_client.get(url)['ETag']
+        self.assertNotModified(self.reader_client, url, etag)
+        self.reader_client.post(reverse('posts:add_comment',
+                                        args=[self.post.pk]),
+                                {'text': 'Комментарий'})
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Комментарий')
+
+    def test_follow_changes_profile(self):
+        url = reverse('posts:profile', args=[self.author.username])
+        etag = self.reader_client.get(url)['ETag']
+        self.reader_client.get(reverse('posts:profile_follow',
+                                       args=[self.author.username]))
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_stamps_expire(self):
+        """метки несуществующих страниц не остаются в кэше навсегда"""
+        url = reverse('posts:group_list', args=['missing'])
+        self.client.get(url)
+        key = versions.stamp_key('group:missing')
+        self.assertIsNotNone(versions._cache().get(key))
+        later = time.time() + versions.STAMP_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertIsNone(versions._cache().get(key))
+
+    def test_etag_depends_on_user(self):
+        url = reverse('posts:home')
+        response = self.reader_client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        anonymous = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(anonymous.status_code, HTTPStatus.OK)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='posts_author')
+        cls.follower = User.objects.create(username='follower')
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def counters(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """счётчики меняются вместе с постами, комментариями и подписками"""
+        self.author_client.post(reverse('posts:create'),
+                                data={'text': 'Пост'})
+        post = Post.objects.get(text='Пост')
+        self.follower_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'})
+        self.follower_client.get(reverse('posts:profile_follow',
+                                 kwargs={'username': self.author.username}))
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.author).posts, 1)
+        self.assertEqual(self.counters(self.author).followers, 1)
+        self.assertEqual(self.counters(self.follower).following, 1)
+        response = self.client.get(
+            reverse('posts:posts_detail', kwargs={'post_id': post.pk}))
+        self.assertEqual(response.context['post_count'], 1)
+
+        self.follower_client.get(reverse('posts:profile_unfollow',
+                                 kwargs={'username': self.author.username}))
+        self.author_client.post(
+            reverse('posts:posts_delete', kwargs={'pk': post.pk}))
+        self.assertEqual(self.counters(self.author).posts, 0)
+        self.assertEqual(self.counters(self.author).followers, 0)
+        self.assertEqual(self.counters(self.follower).following, 0)
+
+    def test_counters_never_go_negative(self):
+        counters.bump(self.author.pk, followers=-1)
+        self.assertEqual(self.counters(self.author).followers, 0)
+        counters.bump(self.author.pk, followers=-1, posts=1)
+        self.assertEqual(self.counters(self.author).followers, 0)
+        self.assertEqual(self.counters(self.author).posts, 1)
+
+    def test_rebuild_counters_command(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        post.comments.create(text='Комментарий', author=self.follower)
+        self.follower.follower.create(author=self.author)
+        call_command('rebuild_counters', stdout=open(os.devnull, 'w'))
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.author).posts, 1)
+        self.assertEqual(self.counters(self.author).followers, 1)
+        self.assertEqual(self.counters(self.follower).following, 1)
+        self.assertEqual(self.counters(self.follower).posts, 0)
+
+
+class CommentsPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='comments_author')
+        cls.post = Post.objects.create(text='Обсуждаемый', author=cls.author)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'коммент{number}')
+            for number in range(COMMENT_V + 5))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_page_is_bounded(self):
+        url = reverse('posts:posts_detail', kwargs={'post_id': self.post.pk})
+        # Метки, пост, картинки, счётчики автора и одна страница
+        # комментариев — сколько бы их ни было.
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertContains(response, 'class="media mb-4"', COMMENT_V)
+        self.assertContains(response, 'коммент0\n')
+        self.assertNotContains(response, f'коммент{COMMENT_V}\n')
+        self.assertContains(response, 'Показать ещё комментарии')
+
+    def test_load_more(self):
+        page = comments_paginator(self.post.pk).get_page()
+        url = reverse('posts:comments', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url, {'cursor': page.next_cursor})
+        self.assertContains(response, 'class="media mb-4"', 5)
+        self.assertContains(response, f'коммент{COMMENT_V}\n')
+        self.assertContains(response, f'коммент{COMMENT_V + 4}\n')
+        self.assertNotContains(response, 'Показать ещё')
+        self.assertNotContains(response, '<html')
+
+    def test_missing_post(self):
+        response = self.client.get(
+            reverse('posts:comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='posts_author')
+        self.group = Group.objects.create(title='test_title',
+                                          description='test_description',
+                                          slug='test-slug')
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def create_post(self):
+        picture = SimpleUploadedFile(
+            name='small.gif',
+            content=(b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00'
+                     b'\x00\x00\x00\x21\xf9\x04\x01\x0a\x00\x01'
+                     b'\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00'
+                     b'\x00\x02\x02\x4c\x01\x00\x3b'),
+            content_type='image/gif')
+        self.author_client.post(reverse('posts:create'), data={
+            'text': 'Пост с картинкой', 'group': self.group.pk,
+            'image': picture})
+        return Post.objects.get(text='Пост с картинкой')
+
+    @mock.patch('posts.thumbnails.WORKERS', 0)
+    def test_thumbnail_built_after_create(self):
+        """превью строится после сохранения и попадает в карточку"""
+        with self.captureOnCommitCallbacks(execute=True):
+            post = self.create_post()
+        thumbnail = Thumbnail.objects.get(post=post)
+        self.assertTrue(thumbnail.ready)
+        self.assertTrue(os.path.exists(
+            os.path.join(TEMP_MEDIA_ROOT, thumbnail.name)))
+        content = self.client.get(reverse('posts:home')).content
+        self.assertIn(thumbnail.url.encode(), content)
+        self.assertEqual(
+            post.variants.count(),
+            len(variants.WIDTHS) * len(variants.available_formats()))
+        self.assertIn(b'type="image/webp"', content)
+        self.assertIn(b'640w', content)
+
+    def test_variant_names_do_not_collide(self):
+        names = {variants.variant_name(post_id, image_name, 640, 'jpeg')
+                 for post_id, image_name in ((1, 'posts/cat.png'),
+                                             (2, 'posts/cat.jpg'))}
+        self.assertEqual(len(names), 2)
+
+    @mock.patch('posts.thumbnails.WORKERS', 0)
+    @mock.patch('posts.variants.render_variants',
+                side_effect=OSError('битый файл'))
+    def test_thumbnail_ready_when_variants_fail(self, render_variants):
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                post = self.create_post()
+        self.assertTrue(Thumbnail.objects.get(post=post).ready)
+        self.assertFalse(post.variants.exists())
+
+    def test_build_image_variants_command(self):
+        """команда достраивает варианты для старых постов"""
+        with self.captureOnCommitCallbacks(execute=False):
+            post = self.create_post()
+        call_command('build_image_variants', workers=0,
+                     stdout=open(os.devnull, 'w'))
+        self.assertEqual(
+            post.variants.filter(format='jpeg').count(),
+            len(variants.WIDTHS))
+
+    def test_ready_thumbnail_changes_etag(self):
+        """готовое превью сбрасывает условный GET со страницей-заглушкой"""
+        with self.captureOnCommitCallbacks(execute=False):
+            post = self.create_post()
+        urls = [reverse('posts:home'),
+                reverse('posts:posts_detail', args=[post.pk]),
+                reverse('posts:group_list', args=[self.group.slug])]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        thumbnails.generate(post.pk)
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotContains(response, 'Картинка обрабатывается')
+
+    def test_placeholder_while_pending(self):
+        """пока превью нет, в карточке заглушка"""
+        with self.captureOnCommitCallbacks(execute=False):
+            post = self.create_post()
+        self.assertFalse(Thumbnail.objects.get(post=post).ready)
+        content = self.client.get(reverse('posts:home')).content.decode()
+        self.assertIn('Картинка обрабатывается', content)
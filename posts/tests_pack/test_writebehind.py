@@ -0,0 +1,193 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.test import Client, TestCase, TransactionTestCase
+from django.test import override_settings
+from django.urls import reverse
+
+from .. import writebehind
+from ..models import (Comment, Follow, JournalCheckpoint, Post, TimelineEntry,
+                      User, UserCounter)
+
+
+class BufferTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='wb_author')
+        cls.reader = User.objects.create(username='wb_reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def buffer(self):
+        return writebehind.Buffer(self.directory, fsync=False)
+
+    def comment(self, text='Комментарий', post_id=None):
+        if post_id is None:
+            post_id = self.post.pk
+        return {'kind': 'comment', 'post': post_id,
+                'author': self.reader.pk, 'text': text,
+                'pub_date': '2024-01-01T00:00:00+00:00'}
+
+    def follow(self, author='wb_author', kind='follow'):
+        return {'kind': kind, 'user': self.reader.pk, 'author': author}
+
+    def test_flush_writes_batch(self):
+        buffer = self.buffer()
+        for entry in (self.comment(), self.comment('Ещё'), self.follow(),
+                      self.follow(), self.follow('wb_reader'),
+                      self.follow('nobody'), self.comment(post_id=0)):
+            buffer.append(entry)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(buffer.flush(), 7)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertEqual(Follow.objects.get().author, self.author)
+        self.assertEqual(UserCounter.objects.get(user=self.author).followers,
+                         1)
+        self.assertEqual(UserCounter.objects.get(user=self.reader).following,
+                         1)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader,
+                                                     post=self.post).exists())
+        self.assertEqual(
+            JournalCheckpoint.objects.get(journal=buffer.name).seq, 7)
+        self.assertEqual(
+            os.path.getsize(os.path.join(self.directory, buffer.name)), 0)
+        # Повторная подписка из следующей пачки не сдвигает счётчики.
+        buffer.append(self.follow())
+        buffer.flush()
+        self.assertEqual(UserCounter.objects.get(user=self.author).followers,
+                         1)
+
+    def test_unfollow_follows_journal_order(self):
+        """отписка после отложенной подписки не отменяется ею"""
+        buffer = self.buffer()
+        buffer.append(self.follow())
+        buffer.append(self.follow(kind='unfollow'))
+        buffer.flush()
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(UserCounter.objects.filter(followers__gt=0).exists())
+        buffer.append(self.follow())
+        buffer.flush()
+        buffer.append(self.follow(kind='unfollow'))
+        buffer.append(self.follow('wb_reader', kind='unfollow'))
+        buffer.flush()
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(UserCounter.objects.get(user=self.author).followers,
+                         0)
+        self.assertEqual(UserCounter.objects.get(user=self.reader).following,
+                         0)
+
+    def test_checkpoint_skips_written_entries(self):
+        batch = [(1, self.comment()), (2, self.comment('Ещё'))]
+        writebehind.write_batch('journal', batch)
+        writebehind.write_batch('journal', batch)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_recover_dead_journal(self):
+        dead = self.buffer()
+        dead.append(self.comment())
+        dead.append(self.follow())
+        # Половина следующей строки — процесс упал посреди записи.
+        dead.file.write('{"seq": 3, "ki')
+        dead.file.close()
+        path = os.path.join(self.directory, dead.name)
+
+        alive = self.buffer()
+        self.assertEqual(alive.recover(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(JournalCheckpoint.objects.filter(
+            journal=dead.name).exists())
+
+    def test_live_journal_is_not_recovered(self):
+        first = self.buffer()
+        first.append(self.comment())
+        self.assertEqual(self.buffer().recover(), 0)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_views_journal_writes(self):
+        buffer = self.buffer()
+        client = Client()
+        client.force_login(self.reader)
+        with override_settings(WRITE_BEHIND=True), \
+                mock.patch.object(writebehind, 'get_buffer',
+                                  return_value=buffer):
+            response = client.post(
+                reverse('posts:add_comment',
+                        kwargs={'post_id': self.post.pk}),
+                data={'text': 'Отложенный'})
+            self.assertRedirects(response, reverse(
+                'posts:posts_detail', kwargs={'post_id': self.post.pk}))
+            client.get(reverse('posts:profile_follow',
+                               kwargs={'username': 'wb_author'}))
+        self.assertEqual(len(buffer.pending), 2)
+        self.assertFalse(Comment.objects.exists())
+        buffer.flush()
+        self.assertEqual(Comment.objects.get().text, 'Отложенный')
+        self.assertTrue(Follow.objects.filter(user=self.reader).exists())
+
+    def test_views_journal_unfollow_after_follow(self):
+        buffer = self.buffer()
+        client = Client()
+        client.force_login(self.reader)
+        kwargs = {'username': 'wb_author'}
+        with override_settings(WRITE_BEHIND=True), \
+                mock.patch.object(writebehind, 'get_buffer',
+                                  return_value=buffer):
+            client.get(reverse('posts:profile_follow', kwargs=kwargs))
+            client.get(reverse('posts:profile_unfollow', kwargs=kwargs))
+        self.assertEqual(len(buffer.pending), 2)
+        buffer.flush()
+        self.assertFalse(Follow.objects.exists())
+
+    def test_views_journal_checks_comment(self):
+        buffer = self.buffer()
+        client = Client()
+        client.force_login(self.reader)
+        with override_settings(WRITE_BEHIND=True), \
+                mock.patch.object(writebehind, 'get_buffer',
+                                  return_value=buffer):
+            response = client.post(
+                reverse('posts:add_comment',
+                        kwargs={'post_id': self.post.pk}),
+                data={'text': ''})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['form'].errors)
+            response = client.post(
+                reverse('posts:add_comment', kwargs={'post_id': 0}),
+                data={'text': 'В пустоту'})
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual(buffer.pending, [])
+
+
+class FlusherThreadTest(TransactionTestCase):
+    def test_thread_flushes_within_delay(self):
+        author = User.objects.create(username='thread_author')
+        post = Post.objects.create(text='Пост', author=author)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        buffer = writebehind.Buffer(directory, delay=0.01, fsync=False)
+        buffer.start()
+        for number in range(20):
+            buffer.append({'kind': 'comment', 'post': post.pk,
+                           'author': author.pk, 'text': f'к{number}',
+                           'pub_date': '2024-01-01T00:00:00+00:00'})
+        # Ждём по очереди в памяти: чтение таблицы из этого потока во
+        # время записи в общей памяти SQLite падает с «table is locked».
+        deadline = time.monotonic() + 5
+        while buffer.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(buffer.pending, [])
+        buffer.close()
+        self.assertEqual(Comment.objects.count(), 20)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 20)
+        self.assertEqual(os.listdir(directory), [])
@@ -0,0 +1,88 @@
+"""Фоновая генерация превью картинок постов.
+
+Превью строится сразу после сохранения поста в пуле потоков, а в
+базу пишется запись ``Thumbnail``. Шаблоны смотрят только на эту
+запись и никогда не трогают файловую систему: пока превью не готово,
+вместо картинки показывается заглушка.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from easy_thumbnails.files import get_thumbnailer
+
+from . import cards, variants, versions
+from .models import Post, Thumbnail
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_OPTIONS = {'size': (960, 339), 'crop': 'center', 'upscale': True}
+# 0 — строить превью синхронно, без пула (удобно в тестах и командах).
+WORKERS = getattr(settings, 'THUMBNAIL_WORKERS', 2)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS,
+                                       thread_name_prefix='thumbnails')
+    return _executor
+
+
+def schedule(post):
+    """Ставит превью поста в очередь после коммита транзакции."""
+    if not post.image:
+        Thumbnail.objects.filter(post=post).delete()
+        return
+    thumbnail, created = Thumbnail.objects.get_or_create(
+        post=post, defaults={'source': post.image.name})
+    if not created and thumbnail.source == post.image.name:
+        return
+    if not created:
+        Thumbnail.objects.filter(post=post).update(
+            source=post.image.name, name='', ready=False)
+    transaction.on_commit(lambda: submit(post.pk))
+
+
+def submit(post_id):
+    if WORKERS:
+        _get_executor().submit(_run, post_id)
+    else:
+        generate(post_id)
+
+
+def _run(post_id):
+    try:
+        generate(post_id)
+    except Exception:
+        logger.exception('Не удалось построить превью поста %s', post_id)
+    finally:
+        close_old_connections()
+
+
+def generate(post_id):
+    """Строит превью и адаптивные варианты и отмечает запись готовой."""
+    post = Post.objects.only('image').get(pk=post_id)
+    if not post.image:
+        return
+    thumb = get_thumbnailer(post.image).get_thumbnail(THUMBNAIL_OPTIONS)
+    try:
+        rendered = variants.render_variants(post_id, post.image.name)
+    except Exception:
+        # Без вариантов карточка покажет обычное превью, а запись всё
+        # равно надо отметить готовой, иначе заглушка останется навсегда.
+        logger.exception('Не удалось построить варианты картинки поста %s',
+                         post_id)
+    else:
+        variants.save_variants(post_id, rendered)
+    # Если картинку успели заменить, запись уже смотрит на другой файл.
+    updated = (Thumbnail.objects
+               .filter(post_id=post_id, source=post.image.name)
+               .update(name=thumb.name, ready=True))
+    if updated:
+        cards.invalidate([post_id])
+        # Иначе условный GET так и отдавал бы 304 со страницей-заглушкой.
+        versions.bump_posts([post_id])
@@ -0,0 +1,243 @@
+"""Лента подписок с разносом постов при записи (fan-out-on-write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора, поэтому
+чтение ``/follow/`` — это один проход по индексу
+``(user, pub_date, post)`` таблицы ``TimelineEntry``.
+Для авторов с огромным числом подписчиков разнос не делается: их посты
+подмешиваются при чтении (fan-out-on-read) одним запросом
+``UNION ALL`` по подзапросу на автора.
+
+Пока автор — знаменитость, его посты в ленты не пишутся. Когда после
+отписки подписчиков снова становится ``FANOUT_LIMIT``, ``reconcile``
+разносит его последние ``BACKFILL_LIMIT`` постов, иначе они пропали бы
+из лент. Тот же предел у ``backfill`` при подписке: в ленту попадают
+только последние ``BACKFILL_LIMIT`` постов автора, более старые видны
+в его профиле. ``rebuild`` предела не знает и разносит всё.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+
+from .models import Follow, Post, TimelineEntry, UserCounter
+from .utils import CursorPaginator, feed
+
+FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 1000)
+BACKFILL_LIMIT = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 500)
+BATCH_SIZE = 1000
+# Больше подзапросов в одном UNION ALL SQLite не примет.
+COMPOUND_LIMIT = 500
+
+
+def follower_count(author_id):
+    return (UserCounter.objects
+            .filter(user_id=author_id)
+            .values_list('followers', flat=True)
+            .first()) or 0
+
+
+def is_celebrity(author_id):
+    """Автор, чьи посты не разносятся по лентам при записи."""
+    return follower_count(author_id) > FANOUT_LIMIT
+
+
+def _celebrities(user):
+    return (Follow.objects
+            .filter(user=user,
+                    author__counters__followers__gt=FANOUT_LIMIT)
+            .values_list('author_id', flat=True))
+
+
+def celebrity_ids(user):
+    """Авторы из подписок пользователя, которых читаем при запросе.
+
+    Решает тот же счётчик подписчиков, что и ``is_celebrity`` в
+    ``fan_out``: если бы чтение и запись судили по разным источникам,
+    пост автора на границе не попал бы ни в ленту, ни в запрос.
+    """
+    return list(_celebrities(user))
+
+
+async def acelebrity_ids(user):
+    return [author_id async for author_id in _celebrities(user)]
+
+
+def _entries(user_ids, author_id, posts):
+    return [TimelineEntry(user_id=user_id, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+            for user_id in user_ids
+            for post_id, pub_date in posts]
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = (Follow.objects
+                 .filter(author_id=post.author_id)
+                 .values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        _entries(followers.iterator(), post.author_id,
+                 [(post.pk, post.pub_date)]),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user, author):
+    """После подписки добавляет в ленту последние посты автора."""
+    if is_celebrity(author.pk):
+        return
+    posts = (Post.objects
+             .filter(author=author)
+             .values_list('id', 'pub_date')[:BACKFILL_LIMIT])
+    TimelineEntry.objects.bulk_create(
+        _entries([user.pk], author.pk, posts),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+RECONCILE_SQL = """
+    INSERT INTO {timeline} (user_id, post_id, author_id, pub_date)
+    SELECT f.user_id, p.id, p.author_id, p.pub_date
+    FROM {follow} f
+    JOIN (SELECT id, author_id, pub_date FROM {post}
+          WHERE author_id = %s
+          ORDER BY pub_date DESC, id DESC
+          LIMIT %s) p ON p.author_id = f.author_id
+    WHERE f.author_id = %s
+    ON CONFLICT DO NOTHING
+"""
+
+
+def reconcile(author_id):
+    """Разносит посты автора, переставшего быть знаменитостью.
+
+    Вызывается после уменьшения счётчика подписчиков: если он стал ровно
+    ``FANOUT_LIMIT``, раньше посты автора читались при запросе, а теперь
+    их не будет ни там, ни в лентах.
+    """
+    if follower_count(author_id) != FANOUT_LIMIT:
+        return 0
+    sql = RECONCILE_SQL.format(
+        timeline=TimelineEntry._meta.db_table,
+        follow=Follow._meta.db_table,
+        post=Post._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [author_id, BACKFILL_LIMIT, author_id])
+        return cursor.rowcount
+
+
+def drop(user, author):
+    """После отписки убирает посты автора из ленты."""
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+class FeedPaginator(CursorPaginator):
+    """Лента подписок: материализованная часть + посты знаменитостей.
+
+    Посты знаменитостей читаются одним запросом: ``UNION ALL`` по
+    подзапросу на автора, каждый со своим ``ORDER BY ... LIMIT`` по
+    индексу ``(author, pub_date, id)``. Так страница стоит постоянное
+    число запросов, и на каждого автора читается не больше страницы
+    строк — ``author_id IN (...)`` заставил бы SQLite сортировать во
+    временном B-дереве все посты всех знаменитостей. Сливает части
+    ``CursorPaginator`` — как и с материализованной лентой.
+    """
+
+    def __init__(self, entries, celebrities):
+        self.groups = [celebrities[start:start + COMPOUND_LIMIT]
+                       for start in range(0, len(celebrities),
+                                          COMPOUND_LIMIT)]
+        # Части без курсора и LIMIT: по ним видно, что страницу надо
+        # сливать, а запросы строит page_querysets.
+        super().__init__(
+            entries,
+            *(feed(Post.objects.filter(author_id__in=authors))
+              .annotate(post_id=F('pk')) for authors in self.groups),
+            tiebreak='post_id')
+
+    def page_querysets(self, token=None):
+        entries = super().page_querysets(token)[0]
+        direction, key = self._parse(token)
+        return [entries, *(self._union(authors, key, direction != 'p')
+                           for authors in self.groups)]
+
+    def _union(self, authors, key, forward):
+        parts, params = [], []
+        for author_id in authors:
+            posts = (Post.objects
+                     .filter(author_id=author_id)
+                     .annotate(post_id=F('pk'))
+                     .order_by(*self._ordering(forward)))
+            if key is not None:
+                posts = posts.filter(self._after(key, forward))
+            sql, part_params = (posts.values('pk')[:self.per_page + 1]
+                                .query.sql_with_params())
+            parts.append(f'SELECT * FROM ({sql})')
+            params.extend(part_params)
+        return (feed(Post.objects.filter(
+                    pk__in=RawSQL(' UNION ALL '.join(parts), params)))
+                .annotate(post_id=F('pk'))
+                .order_by())
+
+
+def feed_paginator(user, celebrities=None):
+    """Пагинатор ленты подписок пользователя."""
+    if celebrities is None:
+        celebrities = celebrity_ids(user)
+    entries = feed(TimelineEntry.objects.filter(user=user),
+                   prefix='post__', extra=('pub_date', 'post'))
+    return FeedPaginator(entries, list(celebrities))
+
+
+def feed_page(user, token=None):
+    """Страница ленты подписок."""
+    paginator = feed_paginator(user)
+    return _posts(paginator.get_page(token))
+
+
+async def afeed_page(user, token=None):
+    """Страница ленты подписок для async-вьюхи."""
+    celebrities = await acelebrity_ids(user)
+    paginator = feed_paginator(user, celebrities)
+    return _posts(await paginator.aget_page(token))
+
+
+def _posts(page):
+    page.object_list = [
+        row.post if isinstance(row, TimelineEntry) else row
+        for row in page.object_list
+    ]
+    return page
+
+
+REBUILD_SQL = """
+    INSERT INTO {timeline} (user_id, post_id, author_id, pub_date)
+    SELECT f.user_id, p.id, p.author_id, p.pub_date
+    FROM {follow} f
+    JOIN {post} p ON p.author_id = f.author_id
+    LEFT JOIN {counter} c ON c.user_id = f.author_id
+    WHERE COALESCE(c.followers, 0) <= %s
+    ON CONFLICT DO NOTHING
+"""
+
+
+def rebuild():
+    """Достраивает ленты одним INSERT ... SELECT (после массового импорта).
+
+    Счётчики подписчиков должны быть актуальны: по ним отсекаются
+    авторы, которых читаем при запросе. Поэтому ``rebuild_counters``
+    после пересчёта тоже зовёт эту функцию.
+    """
+    sql = REBUILD_SQL.format(
+        timeline=TimelineEntry._meta.db_table,
+        follow=Follow._meta.db_table,
+        post=Post._meta.db_table,
+        counter=UserCounter._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [FANOUT_LIMIT])
+        return cursor.rowcount
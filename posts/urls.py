@@ -1,26 +1,35 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
 
 app_name = 'posts'
+# Под ASGI читающие страницы отдают async-версии (см. yatube/asgi.py).
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.index, name='home'),
+    path('', read_views.index, name='home'),
     path('group/', views.group),
     path('group_post/', views.group),
-    path('group/<slug:slug>/', views.group_posts, name='group_list'),
-    path('profile/<str:username>/', views.profile, name='profile'),
+    path('group/<slug:slug>/', read_views.group_posts, name='group_list'),
+    path('profile/<str:username>/', read_views.profile, name='profile'),
     path('posts/<post_id>/edit/', views.post_edit,
          name='post_edit'),
-    path('posts/<int:post_id>/', views.post_detail, name='posts_detail'),
+    path('posts/<int:post_id>/', read_views.post_detail,
+         name='posts_detail'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='comments'),
     path('posts/<int:pk>/delete/', views.postdelete.as_view(),
          name='posts_delete'),
     path('create/', views.post_create, name='create'),
+    path('search/', views.search, name='search'),
+    path('recommendations/', views.who_to_follow, name='recommendations'),
+    path('live/', async_views.live_posts, name='live'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
     path(
         'follow/',
-        views.follow_index,
+        read_views.follow_index,
         name='follow_index'
     ),
     path(
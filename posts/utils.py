@@ -1,8 +1,245 @@
-from django.core.paginator import Paginator
+import asyncio
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+
+from django.db import models
+from django.db.models import Q
+
+from .models import Comment, Post
+
+POST_V = 10
+COMMENT_V = 20
+
+CARD_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'group_id', 'author_id',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'group__title', 'thumbnail__name', 'thumbnail__ready',
+)
+
+
+def feed(posts=None, prefix='', extra=()):
+    """Queryset для списков постов: только то, что нужно card.html.
+
+    Автор и группа подтягиваются одним JOIN, поэтому страница
+    из десяти карточек — это один запрос, а не двадцать один.
+    ``prefix`` позволяет строить ту же выборку через связь,
+    например ``post__`` для записей ленты подписок.
+    """
+    if posts is None:
+        posts = Post.objects.all()
+    fields = [prefix + field for field in CARD_FIELDS]
+    return (posts
+            .select_related(f'{prefix}author', f'{prefix}group',
+                            f'{prefix}thumbnail')
+            .only(*fields, *extra))
+
+
+def encode_cursor(*values):
+    """Упаковывает значения ключа в непрозрачный токен для ?cursor=."""
+    raw = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для битого токена возвращает None."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error):
+        return None
+    if not isinstance(values, list):
+        return None
+    return values
+
+
+class CursorPage:
+    """Страница ленты без COUNT: знает только соседние курсоры."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _is_key(value):
+    # bool — тоже int, а число больше 64 бит SQLite не примет.
+    return (isinstance(value, int) and not isinstance(value, bool)
+            and -2 ** 63 <= value < 2 ** 63)
+
+
+class CursorPaginator:
+    """Keyset-пагинация по паре (pub_date, id).
+
+    Следующая страница выбирается условием
+    ``(pub_date, id) < (последний pub_date, последний id)``, поэтому
+    глубокие страницы стоят столько же, сколько первая: индекс
+    просматривается с нужной точки, без OFFSET и COUNT(*).
+    Направление ``'n'`` — вперёд по ленте, ``'p'`` — назад.
+
+    Можно передать несколько querysets с одинаковым ключом: каждый
+    отдаёт не больше страницы, а результаты сливаются по ключу.
+    Строки могут быть и моделями, и словарями из ``.values()``;
+    ключ — дата или число. Курсор с направлением или ключом не того
+    типа считается битым: отдаётся первая страница.
+    """
+
+    def __init__(self, *querysets, per_page=POST_V, field='pub_date',
+                 tiebreak='pk', descending=True):
+        self.querysets = querysets
+        self.per_page = per_page
+        self.field = field
+        self.tiebreak = tiebreak
+        self.descending = descending
+        model = querysets[0].model
+        self.dates = isinstance(model._meta.get_field(field),
+                                models.DateField)
+
+    def _date(self, value):
+        if not isinstance(value, str):
+            return None
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+    def _parse(self, token):
+        values = decode_cursor(token)
+        if values is None or len(values) != 3:
+            return None, None
+        direction, value, pk = values
+        if self.dates:
+            value = self._date(value)
+        elif not _is_key(value):
+            value = None
+        if direction not in ('n', 'p') or value is None or not _is_key(pk):
+            return None, None
+        return direction, (value, pk)
+
+    def _after(self, key, forward):
+        # (field, tiebreak) < (value, pk), записанное так, чтобы первое
+        # условие было диапазоном по индексу: иначе SQLite не сможет
+        # начать проход индекса с курсора и просмотрит все строки до него.
+        value, pk = key
+        lookup = 'lt' if forward == self.descending else 'gt'
+        return (Q(**{f'{self.field}__{lookup}e': value})
+                & (Q(**{f'{self.field}__{lookup}': value})
+                   | Q(**{f'{self.tiebreak}__{lookup}': pk})))
+
+    def _ordering(self, forward):
+        sign = '-' if forward == self.descending else ''
+        return (f'{sign}{self.field}', f'{sign}{self.tiebreak}')
+
+    def _key(self, obj):
+        if isinstance(obj, dict):
+            return obj[self.field], obj[self.tiebreak]
+        return getattr(obj, self.field), getattr(obj, self.tiebreak)
+
+    def page_querysets(self, token=None):
+        """Запросы, которые выполнит get_page (нужны и для EXPLAIN)."""
+        direction, key = self._parse(token)
+        forward = direction != 'p'
+        querysets = []
+        for queryset in self.querysets:
+            queryset = queryset.order_by(*self._ordering(forward))
+            if key is not None:
+                queryset = queryset.filter(self._after(key, forward))
+            querysets.append(queryset[:self.per_page + 1])
+        return querysets
+
+    def get_page(self, token=None):
+        rows = []
+        for queryset in self.page_querysets(token):
+            rows.extend(queryset)
+        return self._collect(rows, token)
+
+    async def aget_page(self, token=None):
+        """То же для async-вьюх: запросы querysets идут одновременно."""
+        async def fetch(queryset):
+            return [row async for row in queryset]
+
+        parts = await asyncio.gather(
+            *(fetch(queryset) for queryset in self.page_querysets(token)))
+        return self._collect([row for part in parts for row in part], token)
+
+    def _collect(self, rows, token):
+        direction, key = self._parse(token)
+        forward = direction != 'p'
+        if len(self.querysets) > 1:
+            rows = self._merge(rows, forward)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        return self._page(rows, key, forward, has_more)
+
+    def _merge(self, rows, forward):
+        rows.sort(key=self._key, reverse=forward == self.descending)
+        merged, seen = [], set()
+        for row in rows:
+            key = self._key(row)
+            if key not in seen:
+                seen.add(key)
+                merged.append(row)
+        return merged
+
+    def _page(self, rows, key, forward, has_more):
+        if forward:
+            has_next, has_previous = has_more, key is not None
+        else:
+            has_next, has_previous = key is not None, has_more
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self._token('n', rows[-1])
+        if rows and has_previous:
+            previous_cursor = self._token('p', rows[0])
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+    def _token(self, direction, obj):
+        value, pk = self._key(obj)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        return encode_cursor(direction, value, pk)
+
+
+def comments_paginator(post_id):
+    """Комментарии поста от старых к новым, страницами по COMMENT_V.
+
+    Страница читается по индексу ``(post, pub_date, id)`` с курсора,
+    поэтому пост с десятками тысяч комментариев открывается так же
+    быстро, как пост с одним.
+    """
+    comments = (Comment.objects
+                .filter(post_id=post_id)
+                .select_related('author')
+                .only('id', 'text', 'pub_date', 'post_id',
+                      'author__username'))
+    return CursorPaginator(comments, per_page=COMMENT_V, descending=False)
 
 
 def paginator(request, posts):
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    return CursorPaginator(posts).get_page(request.GET.get('cursor'))
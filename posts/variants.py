@@ -0,0 +1,79 @@
+"""Адаптивные варианты картинок постов: несколько ширин и форматов.
+
+``render_variants`` не обращается к базе — только к хранилищу файлов,
+поэтому его можно запускать в отдельных процессах (см. команду
+``build_image_variants``). Записи ``ImageVariant`` создаёт
+``save_variants`` в основном процессе.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import features, Image, ImageOps
+
+from .models import ImageVariant
+
+WIDTHS = getattr(settings, 'IMAGE_VARIANT_WIDTHS', (320, 640, 960))
+# Пропорции превью в ленте: 960x339.
+ASPECT = 339 / 960
+QUALITY = {'avif': 60, 'webp': 80, 'jpeg': 85}
+EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg'}
+VARIANTS_DIR = 'posts/variants'
+
+
+def available_formats():
+    """Форматы, которые умеет кодировать установленный Pillow."""
+    return [fmt for fmt in ImageVariant.FORMATS
+            if fmt == 'jpeg' or features.check(fmt)]
+
+
+def variant_name(post_id, image_name, width, fmt):
+    # id поста в имени: у разных постов бывают картинки с одинаковым
+    # именем (cat.png и cat.jpg), а файлы вариантов перезаписываются.
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{VARIANTS_DIR}/{post_id}_{stem}_{width}w.{EXTENSIONS[fmt]}'
+
+
+def render_variants(post_id, image_name, formats=None):
+    """Пишет все варианты картинки поста в хранилище.
+
+    Возвращает список ``(ширина, формат, имя файла)``.
+    """
+    formats = formats or available_formats()
+    with default_storage.open(image_name) as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    rendered = []
+    for width in WIDTHS:
+        size = (width, round(width * ASPECT))
+        resized = ImageOps.fit(image, size, Image.LANCZOS)
+        for fmt in formats:
+            name = variant_name(post_id, image_name, width, fmt)
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt.upper(), quality=QUALITY[fmt])
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            rendered.append((width, fmt, name))
+    return rendered
+
+
+def try_render_variants(post_id, image_name):
+    """Как ``render_variants``, но для битого файла возвращает None."""
+    try:
+        return render_variants(post_id, image_name)
+    except (OSError, ValueError):
+        return None
+
+
+def save_variants(post_id, rendered):
+    """Заменяет записи вариантов поста на только что построенные."""
+    with transaction.atomic():
+        ImageVariant.objects.filter(post_id=post_id).delete()
+        ImageVariant.objects.bulk_create([
+            ImageVariant(post_id=post_id, width=width, format=fmt, name=name)
+            for width, fmt, name in rendered
+        ])
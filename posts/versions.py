@@ -0,0 +1,172 @@
+"""Метки версий страниц для условных GET (ETag / Last-Modified).
+
+Каждая метка — время последнего изменения ресурса, лежит в общем
+кэше под ключом ``stamp:<ресурс>``:
+
+* ``feed`` — любой пост на главной;
+* ``group:<slug>`` и ``author:<username>`` — посты группы и автора,
+  у автора ещё подписки на него;
+* ``post:<id>`` — сам пост и его комментарии;
+* ``site`` — то, что видно на всех страницах: имена авторов и группы.
+
+Метки двигают сигналы из ``posts.signals``. ``@conditional`` сверяет
+их с ``If-None-Match`` / ``If-Modified-Since`` и отвечает 304 до того,
+как вьюха выполнит запросы и отрендерит шаблон. Метки читаются мимо
+L1-кэша воркера, чтобы 304 не отдавался по устаревшей метке.
+"""
+import hashlib
+import time
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import Post
+
+STAMP_CACHE = getattr(settings, 'VERSION_STAMP_CACHE', 'shared')
+# Метки живут конечное время: пропавшая метка стоит одного нового
+# ETag, а вечные копились бы для любого URL, включая несуществующие.
+STAMP_TIMEOUT = 24 * 60 * 60
+
+
+def stamp_key(resource):
+    return f'stamp:{resource}'
+
+
+def _cache():
+    return caches[STAMP_CACHE]
+
+
+def bump(*resources):
+    """Отмечает, что ресурсы изменились сейчас."""
+    now = time.time()
+    _cache().set_many({stamp_key(resource): now
+                       for resource in resources if resource},
+                      STAMP_TIMEOUT)
+
+
+def bump_posts(post_ids, chunk_size=500):
+    """Метки всех страниц, где видны посты, — для правок мимо сигналов.
+
+    Например, когда у поста готово превью: ``update()`` сигналов не шлёт.
+    """
+    post_ids = list(post_ids)
+    for start in range(0, len(post_ids), chunk_size):
+        rows = (Post.objects
+                .filter(pk__in=post_ids[start:start + chunk_size])
+                .values_list('pk', 'author__username', 'group__slug'))
+        resources = {'feed'}
+        for post_id, author, slug in rows:
+            resources.update((f'post:{post_id}', f'author:{author}',
+                              slug and f'group:{slug}'))
+        bump(*resources)
+
+
+def stamps(resources):
+    """Метки ресурсов; отсутствующие (например, после очистки кэша)
+    заводятся текущим временем."""
+    keys = [stamp_key(resource) for resource in resources]
+    found = _cache().get_many(keys)
+    missing = {key: time.time() for key in keys if key not in found}
+    if missing:
+        _cache().set_many(missing, STAMP_TIMEOUT)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+# Ресурсы страниц: функции получают аргументы вьюхи.
+
+def index_resources(request):
+    return ['site', 'feed']
+
+
+def group_resources(request, slug):
+    return ['site', f'group:{slug}']
+
+
+def viewer_resources(request):
+    """Метки того, что на странице зависит от вошедшего пользователя."""
+    if not request.user.is_authenticated:
+        return []
+    return [f'author:{request.user.username}',
+            f'recommendations:{request.user.pk}']
+
+
+def profile_resources(request, username):
+    # Кнопка подписки, «ваши» подписчики автора и рекомендации.
+    return ['site', f'author:{username}', *viewer_resources(request)]
+
+
+def post_resources(request, post_id):
+    # На странице поста есть число постов автора — нужна и его метка.
+    author = (Post.objects
+              .filter(pk=post_id)
+              .values_list('author__username', flat=True)
+              .first())
+    return ['site', f'post:{post_id}', author and f'author:{author}']
+
+
+def comments_resources(request, post_id):
+    return ['site', f'post:{post_id}']
+
+
+def _validators(request, resources):
+    values = stamps([resource for resource in resources if resource])
+    user_id = request.user.pk if request.user.is_authenticated else 0
+    raw = ':'.join([str(user_id), *map(repr, values)])
+    etag = f'"{hashlib.md5(raw.encode()).hexdigest()}"'
+    last_modified = None
+    if not user_id:
+        # Для вошедших страница зависит и от пользователя, а дата
+        # этого не различает — им только ETag.
+        last_modified = int(max(values))
+    return etag, last_modified
+
+
+def _precondition(request, resources_func, args, kwargs):
+    if request.method not in ('GET', 'HEAD'):
+        return None, None, None
+    etag, last_modified = _validators(
+        request, resources_func(request, *args, **kwargs))
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    return response, etag, last_modified
+
+
+def _finish(response, etag, last_modified):
+    if etag is not None and response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        if last_modified:
+            response.headers.setdefault('Last-Modified',
+                                        http_date(last_modified))
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def conditional(resources_func):
+    """Отвечает 304, если метки ресурсов страницы не менялись."""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                request.user = await request.auser()
+                response, etag, last_modified = await sync_to_async(
+                    _precondition)(request, resources_func, args, kwargs)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _finish(response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response, etag, last_modified = _precondition(
+                request, resources_func, args, kwargs)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _finish(response, etag, last_modified)
+        return wrapper
+    return decorator
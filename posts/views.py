@@ -1,26 +1,30 @@
+from urllib.parse import urlencode
+
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render, redirect
-from django.core.paginator import Paginator
+from django.utils.decorators import method_decorator
 from django.views.generic import DeleteView
-from django.shortcuts import render
-
-from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import paginator
 
+from core.db.routers import pins_primary, read_replica
 
-POST_V = 10
+from . import (cards, counters, follows, publishing, recommendations,
+               search as post_search, timeline, versions, writebehind)
+from .forms import CommentForm, PostForm
+from .models import Group, Post, User
+from .utils import POST_V, comments_paginator, feed, paginator  # noqa: F401
 
 
+@read_replica
+@versions.conditional(versions.index_resources)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, POST_V)
-    page_number = request.GET.get('page')
+    post_list = feed()
     template = 'posts/index.html'
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginator(request, post_list)
     context = {
         'page_obj': page_obj,
+        'cards': cards.render_cards(request, page_obj),
     }
     return render(request, template, context)
 
@@ -30,58 +34,96 @@ def group(request):
     return render(request, template)
 
 
+@read_replica
+@versions.conditional(versions.group_resources)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, POST_V)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = feed(group.posts.all())
+    page_obj = paginator(request, post_list)
     return render(request, "posts/group_list.html",
-                  {"group": group, "page_obj": page_obj})
+                  {"group": group, "page_obj": page_obj,
+                   "cards": cards.render_cards(request, page_obj)})
 
 
+@read_replica
+@versions.conditional(versions.profile_resources)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User.objects.select_related('counters'),
+                               username=username)
     posts = Post.objects.filter(author=author)
-    page_obj = paginator(request, posts)
+    page_obj = paginator(request, feed(posts))
     template = 'posts/profile.html'
+    following = False
+    known_followers = []
+    who_to_follow = []
     if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author).exists
-    else:
-        following = False
+        who_to_follow = recommendations.for_user(request.user.pk)
+    if request.user.is_authenticated and request.user != author:
+        following = follows.is_following(request.user.pk, author.pk)
+        known_followers = follows.known_followers(request.user.pk, author.pk)
     context = {
         'author': author,
         'page_obj': page_obj,
-        'posts': posts,
+        'cards': cards.render_cards(request, page_obj),
+        'counters': counters.counters_for(author),
         'following': following,
+        'known_followers': User.objects.filter(
+            pk__in=known_followers[:follows.KNOWN_FOLLOWERS]),
+        'known_total': len(known_followers),
+        'recommendations': who_to_follow,
     }
     return render(request, template, context)
 
 
+@read_replica
+@versions.conditional(versions.post_resources)
 def post_detail(request, post_id):
     """Страница одной записи."""
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.select_related('author')
-    form = CommentForm()
+    return _post_page(request, post_id, CommentForm())
+
+
+def _post_page(request, post_id, form):
+    """Страница записи с формой комментария (пустой или с ошибками)."""
+    post = get_object_or_404(
+        Post.objects
+        .select_related('author', 'group', 'thumbnail')
+        .prefetch_related('variants'),
+        pk=post_id)
+    comments = comments_paginator(post.pk).get_page()
     context = {
         'post': post,
+        'post_count': counters.counters_for(post.author).posts,
         'form': form,
         'comments': comments,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@read_replica
+@versions.conditional(versions.comments_resources)
+def post_comments(request, post_id):
+    """Следующая пачка комментариев для кнопки «Показать ещё»."""
+    comments = comments_paginator(post_id).get_page(
+        request.GET.get('cursor'))
+    if not comments and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    return render(request, 'includes/comment_list.html',
+                  {'comments': comments, 'post_id': post_id})
+
+
 @login_required
+@pins_primary
 def post_edit(request, post_id):
     is_edit = True
     post = get_object_or_404(Post, id=post_id)
     form = PostForm(request.POST or None,
                     files=request.FILES or None, instance=post)
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect("posts:posts_detail", post_id)
+    # Автор — это уже загруженный request.user, второй запрос не нужен.
+    post.author = request.user
     if form.is_valid():
-        form.save()
+        publishing.edit(form)
         return redirect("posts:posts_detail", post_id)
     context = {
         "form": form,
@@ -90,22 +132,30 @@ def post_edit(request, post_id):
     return render(request, "posts/create.html", context)
 
 
+@method_decorator(pins_primary, name='dispatch')
 class postdelete(LoginRequiredMixin, DeleteView):
     model = Post
+    # Сигнал удаления читает имя автора — берём его тем же запросом.
+    queryset = Post.objects.select_related('author')
     template_name = 'posts/delete.html'
     fields = ['text', 'group', 'author']
     context_object_name = 'post_delete'
     success_url = '/'
 
+    def form_valid(self, form):
+        publishing.delete(self.object)
+        return HttpResponseRedirect(self.get_success_url())
+
 
 @login_required
+@pins_primary
 def post_create(request):
     if request.method == 'POST':
         form = PostForm(request.POST or None, files=request.FILES)
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            post.save()
+            publishing.create(post)
             return redirect('posts:profile', post.author)
     form = PostForm()
     data_form = {'form': form}
@@ -113,51 +163,81 @@ def post_create(request):
 
 
 @login_required
+@pins_primary
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
-    context = {
-        'form': form,
-    }
-    if form.is_valid():
+    if not form.is_valid():
+        return _post_page(request, post_id, form)
+    post = get_object_or_404(Post, id=post_id)
+    if writebehind.enabled():
+        writebehind.comment(request.user.pk, post.pk,
+                            form.cleaned_data['text'])
+    else:
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
-        return redirect('posts:posts_detail', post_id=post_id)
-    return render(request, 'posts/post_detail.html', context)
+        publishing.comment(comment)
+    return redirect('posts:posts_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = (
-        Post.objects
-        .select_related('author', 'group')
-        .filter(author__following__user=request.user))
-    page_obj = paginator(request, posts)
+    page_obj = timeline.feed_page(request.user, request.GET.get('cursor'))
     template = 'posts/follow.html'
     context = {
         'page_obj': page_obj,
+        'cards': cards.render_cards(request, page_obj),
+        'recommendations': recommendations.for_user(request.user.pk),
     }
     return render(request, template, context)
 
 
 @login_required
+@read_replica
+def who_to_follow(request):
+    """Боковая панель «На кого подписаться» отдельно от страницы."""
+    entries = recommendations.for_user(request.user.pk)
+    if entries is None:
+        entries = recommendations.compute_for_user(request.user.pk)
+    return render(request, 'posts/includes/recommendations.html',
+                  {'recommendations': entries})
+
+
+@login_required
+@pins_primary
 def profile_follow(request, username):
-    author = User.objects.get(username=username)
-    if request.user != author:
-        Follow.objects.create(user=request.user, author=author)
+    if writebehind.enabled():
+        if username != request.user.username:
+            writebehind.follow(request.user.pk, username)
+        return redirect('posts:profile', username=username)
+    author = get_object_or_404(User, username=username)
+    follows.follow(request.user, author)
     return redirect('posts:profile', username=author)
 
 
 @login_required
+@pins_primary
 def profile_unfollow(request, username):
-    author = User.objects.get(username=username)
-    is_follower = Follow.objects.filter(user=request.user, author=author)
-    if is_follower.exists():
-        is_follower.delete()
+    if writebehind.enabled():
+        # Через журнал, за ещё не записанной подпиской, а не перед ней.
+        writebehind.unfollow(request.user.pk, username)
+        return redirect('posts:profile', username=username)
+    author = get_object_or_404(User, username=username)
+    follows.unfollow(request.user, author)
     return redirect('posts:profile', username=author)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = post_search.search_page(query, request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}),
+        'cards': cards.render_cards(request, page_obj),
+    }
+    return render(request, 'posts/search.html', context)
+
+
 def page_not_found(request, exception):
     return render(request, 'includes/404.html', status=404)
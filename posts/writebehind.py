@@ -0,0 +1,326 @@
+"""Отложенная запись комментариев, подписок и отписок (write-behind).
+
+Во время всплесков каждая вставка в своей транзакции ждёт
+единственного писателя SQLite. С ``WRITE_BEHIND = True`` вьюхи не
+пишут в базу сами: запись добавляется в локальный журнал (строка JSON
+и ``fsync``), и вьюха сразу отвечает. Фоновый поток собирает записи в
+пачку — до ``WRITE_BEHIND_BATCH`` штук, но не дольше
+``WRITE_BEHIND_DELAY`` секунд от самой старой — и пишет её одной
+транзакцией через ``bulk_create(ignore_conflicts=True)`` вместе со
+счётчиками.
+
+В той же транзакции в ``JournalCheckpoint`` сохраняется номер
+последней записанной строки журнала. Если процесс упал, следующий
+дочитывает его журнал с этого номера: ничего не теряется и ничего не
+пишется дважды. У каждого процесса свой журнал под ``flock``, поэтому
+чужой журнал подбирается, только когда его хозяин уже не работает.
+
+Отписки идут через тот же журнал: иначе отписка, выполненная сразу,
+опередила бы ещё не записанную подписку, и та вернула бы её обратно.
+Внутри пачки для пары (читатель, автор) действует последняя запись.
+
+Пока пачка не записана, комментарий и подписка не видны — задержка
+ограничена ``WRITE_BEHIND_DELAY``. ``bulk_create`` не шлёт сигналов,
+поэтому метки версий и ленты подписок обновляются здесь же.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import bulk, counters, follows, timeline, versions
+from .models import Comment, Follow, JournalCheckpoint, Post, User
+
+logger = logging.getLogger(__name__)
+
+DELAY = getattr(settings, 'WRITE_BEHIND_DELAY', 0.05)
+BATCH_SIZE = getattr(settings, 'WRITE_BEHIND_BATCH', 500)
+# Сколько записей может ждать в памяти; дальше вьюхи ждут поток.
+MAX_PENDING = getattr(settings, 'WRITE_BEHIND_MAX_PENDING', 10000)
+
+
+def enabled():
+    return getattr(settings, 'WRITE_BEHIND', False)
+
+
+def _comments(rows):
+    post_ids = set(Post.objects
+                   .filter(pk__in={row['post'] for row in rows})
+                   .order_by()
+                   .values_list('pk', flat=True))
+    author_ids = set(User.objects
+                     .filter(pk__in={row['author'] for row in rows})
+                     .values_list('pk', flat=True))
+    comments = [Comment(post_id=row['post'], author_id=row['author'],
+                        text=row['text'],
+                        pub_date=bulk.parse_date(row['pub_date']))
+                for row in rows
+                if row['post'] in post_ids and row['author'] in author_ids]
+    Comment.objects.bulk_create(comments, ignore_conflicts=True)
+    for post_id, added in Counter(c.post_id for c in comments).items():
+        counters.bump_comments(post_id, added)
+    return comments
+
+
+def _follows(rows):
+    """Подписки и отписки пачки; у пары решает последняя запись журнала."""
+    authors = bulk.NaturalKeyCache(User.objects, 'username')
+    authors.load(row['author'] for row in rows)
+    usernames = dict(User.objects
+                     .filter(pk__in={row['user'] for row in rows})
+                     .values_list('pk', 'username'))
+    latest = {}
+    for row in rows:
+        pair = (row['user'], authors.ids.get(row['author']))
+        latest[pair] = row['kind'] == 'follow'
+    latest = {(user_id, author_id): following
+              for (user_id, author_id), following in latest.items()
+              if user_id in usernames and author_id not in (None, user_id)}
+    pairs = {pair for pair, following in latest.items() if following}
+    existing = set(Follow.objects
+                   .filter(user_id__in={user for user, _ in pairs},
+                           author_id__in={author for _, author in pairs})
+                   .values_list('user_id', 'author_id'))
+    # Транзакция держит запись в базе, так что между проверкой и
+    # вставкой никто не подпишется — счётчики сдвигаются точно.
+    added = sorted(pairs - existing)
+    Follow.objects.bulk_create(
+        [Follow(user_id=user_id, author_id=author_id)
+         for user_id, author_id in added],
+        ignore_conflicts=True,
+    )
+    for user_id, count in Counter(user for user, _ in added).items():
+        counters.bump(user_id, following=count)
+    for author_id, count in Counter(author for _, author in added).items():
+        counters.bump(author_id, followers=count)
+    # Отписки редки, их пишем по одной: счётчики, лента и сброс кэшей —
+    # те же, что у синхронной отписки.
+    names = {author_id: name for name, author_id in authors.ids.items()}
+    for user_id, author_id in sorted(pair for pair, following
+                                     in latest.items() if not following):
+        follows.unfollow(User(pk=user_id, username=usernames[user_id]),
+                         User(pk=author_id, username=names[author_id]))
+    return added
+
+
+def write_batch(journal, batch):
+    """Пишет пачку (seq, запись) журнала одной транзакцией.
+
+    Записи не новее контрольной точки журнала уже в базе и пропускаются.
+    """
+    with transaction.atomic():
+        checkpoint, _ = JournalCheckpoint.objects.get_or_create(
+            journal=journal)
+        fresh = [entry for seq, entry in batch if seq > checkpoint.seq]
+        comments = _comments([entry for entry in fresh
+                              if entry['kind'] == 'comment'])
+        added = _follows([entry for entry in fresh
+                          if entry['kind'] in ('follow', 'unfollow')])
+        checkpoint.seq = max(checkpoint.seq, batch[-1][0])
+        checkpoint.save(update_fields=['seq'])
+    user_ids = {user_id for pair in added for user_id in pair}
+    usernames = User.objects.filter(pk__in=user_ids).values_list(
+        'username', flat=True)
+    versions.bump(*{f'post:{comment.post_id}' for comment in comments},
+                  *(f'author:{username}' for username in usernames))
+    follows.forget(*{user_id for user_id, _ in added})
+    for user_id, author_id in added:
+        timeline.backfill(User(pk=user_id), User(pk=author_id))
+        follows.changed.send(sender=Follow, user_id=user_id,
+                             author_id=author_id, following=True)
+    return len(comments), len(added)
+
+
+def read_journal(path):
+    """Записи файла журнала; оборванная последняя строка отбрасывается."""
+    entries = []
+    with open(path, encoding='utf-8') as stream:
+        for line in stream:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            entries.append((entry.pop('seq'), entry))
+    return entries
+
+
+class Buffer:
+    """Журнал процесса и поток, сбрасывающий его в базу пачками."""
+
+    def __init__(self, directory, delay=DELAY, batch_size=BATCH_SIZE,
+                 max_pending=MAX_PENDING, fsync=True):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.delay = delay
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.fsync = fsync
+        self.name = (f'{socket.gethostname()}-{os.getpid()}-'
+                     f'{time.time_ns()}.jsonl')
+        self.file = open(os.path.join(directory, self.name), 'a',
+                         encoding='utf-8')
+        fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.seq = 0
+        # (seq, запись, время добавления) в порядке журнала.
+        self.pending = []
+        self.changed = threading.Condition()
+        self.flushing = threading.Lock()
+        self.thread = None
+        self.stopping = False
+
+    def append(self, entry):
+        """Записывает в журнал; после возврата запись не потеряется."""
+        with self.changed:
+            while len(self.pending) >= self.max_pending:
+                self.changed.wait()
+            self.seq += 1
+            self.file.write(json.dumps({'seq': self.seq, **entry},
+                                       ensure_ascii=False) + '\n')
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.pending.append((self.seq, entry, time.monotonic()))
+            self.changed.notify_all()
+
+    def flush(self):
+        """Пишет в базу одну пачку; возвращает её размер."""
+        with self.flushing:
+            with self.changed:
+                batch = [(seq, entry) for seq, entry, _
+                         in self.pending[:self.batch_size]]
+            if not batch:
+                return 0
+            write_batch(self.name, batch)
+            with self.changed:
+                del self.pending[:len(batch)]
+                if not self.pending:
+                    # Всё записанное уже в базе — журнал можно обнулить.
+                    self.file.truncate(0)
+                self.changed.notify_all()
+            return len(batch)
+
+    def flush_all(self):
+        while self.flush():
+            pass
+
+    def _due(self):
+        if len(self.pending) >= self.batch_size:
+            return 0
+        return self.pending[0][2] + self.delay - time.monotonic()
+
+    def _run(self):
+        try:
+            while True:
+                with self.changed:
+                    while not self.pending and not self.stopping:
+                        self.changed.wait()
+                    if self.stopping:
+                        return
+                    wait = self._due()
+                    if wait > 0:
+                        self.changed.wait(wait)
+                        continue
+                try:
+                    self.flush()
+                except Exception:
+                    # Записи остались в журнале и в памяти — повторим.
+                    logger.exception('Не удалось записать пачку журнала')
+                    time.sleep(self.delay)
+        finally:
+            connection.close()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True,
+                                       name='write-behind')
+        self.thread.start()
+
+    def close(self):
+        """Останавливает поток, дописывает остаток и убирает журнал."""
+        with self.changed:
+            self.stopping = True
+            self.changed.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush_all()
+        self.file.close()
+        os.remove(os.path.join(self.directory, self.name))
+        JournalCheckpoint.objects.filter(journal=self.name).delete()
+
+    def recover(self):
+        """Дописывает журналы остановившихся процессов."""
+        recovered = 0
+        pattern = os.path.join(self.directory, '*.jsonl')
+        for path in glob.glob(pattern):
+            name = os.path.basename(path)
+            if name == self.name:
+                continue
+            try:
+                stream = open(path, 'a')
+            except FileNotFoundError:
+                continue
+            with stream:
+                try:
+                    fcntl.flock(stream, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                if not os.path.exists(path):
+                    continue
+                entries = read_journal(path)
+                for start in range(0, len(entries), self.batch_size):
+                    write_batch(name,
+                                entries[start:start + self.batch_size])
+                recovered += len(entries)
+                os.remove(path)
+            JournalCheckpoint.objects.filter(journal=name).delete()
+        return recovered
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = Buffer(settings.WRITE_BEHIND_DIR)
+            _buffer.recover()
+            _buffer.start()
+            atexit.register(_buffer.close)
+        return _buffer
+
+
+def comment(author_id, post_id, text):
+    get_buffer().append({
+        'kind': 'comment',
+        'post': post_id,
+        'author': author_id,
+        'text': text,
+        'pub_date': timezone.now().isoformat(),
+    })
+
+
+def follow(user_id, author_username):
+    get_buffer().append({
+        'kind': 'follow',
+        'user': user_id,
+        'author': author_username,
+    })
+
+
+def unfollow(user_id, author_username):
+    get_buffer().append({
+        'kind': 'unfollow',
+        'user': user_id,
+        'author': author_username,
+    })
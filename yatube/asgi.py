@@ -3,5 +3,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+# Под ASGI ленты и страница поста работают как async-вьюхи.
+os.environ.setdefault('YATUBE_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -16,6 +17,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -27,6 +29,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым: замеряет весь запрос (см. core/perf.py).
+    'core.perf.PerfMiddleware',
+    'core.querycheck.QueryCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -38,6 +43,36 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Доля запросов, которые замеряет PerfMiddleware: 0 — выключено.
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', '0'))
+# Токен Prometheus для /metrics (заголовок «Authorization: Bearer ...»);
+# без него метрики видит только персонал.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Поиск N+1 и дублей SQL: 'off', 'warn' или 'strict' (см. core/querycheck.py).
+# В тестах всегда 'strict' — это делает QueryCheckRunner.
+QUERY_CHECK = os.environ.get('QUERY_CHECK', 'warn' if DEBUG else 'off')
+QUERY_CHECK_REPEAT = 3
+# Сколько SQL-запросов может сделать страница, с учётом сессии и
+# пользователя у вошедших. Лента подписок: знаменитости из подписок,
+# материализованная часть и один запрос на посты всех знаменитостей.
+QUERY_BUDGETS = {
+    'posts:home': 4,
+    'posts:group_list': 5,
+    'posts:profile': 6,
+    'posts:posts_detail': 8,
+    'posts:follow_index': 5,
+    'posts:search': 5,
+    'posts:comments': 4,
+    'posts:recommendations': 6,
+}
+TEST_RUNNER = 'core.querycheck.QueryCheckRunner'
+# Отложенная запись комментариев и подписок через журнал
+# (posts/writebehind.py): вьюха отвечает, как только запись в журнале.
+WRITE_BEHIND = os.environ.get('YATUBE_WRITE_BEHIND') == '1'
+WRITE_BEHIND_DIR = os.path.join(BASE_DIR, 'journal')
+WRITE_BEHIND_DELAY = 0.05
+WRITE_BEHIND_BATCH = 500
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -55,14 +90,57 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+ASGI_APPLICATION = 'yatube.asgi.application'
+# Async-версии лент и страницы поста (posts/async_views.py).
+ASYNC_VIEWS = os.environ.get('YATUBE_ASYNC_VIEWS') == '1'
 
 DATABASES = {
     'default': {
+        # Блокировка записи внутри процесса — 'core.db.sqlite3'.
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': str(BASE_DIR / "db.sqlite3"),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            # Блокировка записи берётся в начале транзакции, и она не
+            # падает с SQLITE_BUSY при переходе от чтения к записи.
+            'transaction_mode': 'IMMEDIATE',
+            # WAL: читатели не ждут писателя.
+            'init_command': (
+                'PRAGMA journal_mode = WAL;'
+                'PRAGMA synchronous = NORMAL;'
+                'PRAGMA mmap_size = 268435456;'
+                'PRAGMA cache_size = -65536;'
+                'PRAGMA temp_store = MEMORY;'
+            ),
+        },
+        # Тестовая база — файл, а не память: у базы в памяти с общим
+        # кэшем потоки получают «table is locked» без ожидания.
+        'TEST': {'NAME': os.path.join(tempfile.gettempdir(),
+                                      'yatube_test.sqlite3')},
     }
 }
 
+# Реплики только для чтения: DATABASE_REPLICAS=/path/a.sqlite3,/path/b.sqlite3.
+# В тестах они смотрят в тестовую default (MIRROR).
+DATABASE_REPLICAS = []
+for number, name in enumerate(
+        filter(None, os.environ.get('DATABASE_REPLICAS', '').split(','))):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': name,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+# Сколько секунд после записи браузер читает только из default.
+REPLICA_PIN_SECONDS = 5
+# Сколько живут в кэше значения, прочитанные с реплики.
+REPLICA_CACHE_TIMEOUT = 30
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -99,8 +177,35 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Общий для всех воркеров кэш: Redis, если задан REDIS_URL, иначе файлы.
+if os.environ.get('REDIS_URL'):
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ['REDIS_URL'],
+    }
+else:
+    SHARED_CACHE = {
+        "BACKEND": "core.cache.LockedFileBasedCache",
+        "LOCATION": os.path.join(tempfile.gettempdir(), 'yatube_cache'),
+        # По умолчанию 300 записей, и отсев выбрасывал бы карточки уже
+        # на одной странице ленты. Карточка — два варианта на пост за
+        # час (CARD_CACHE_TIMEOUT), плюс метки и журналы.
+        # Отсев случайный и может выбросить счётчики и записи журналов
+        # (two-tier:*, follow-graph:*, live:*). Это переживается:
+        # TwoTierCache очищает L1, граф перечитывает базу, live
+        # заводит новый счётчик, а клиенты ленты получают его заново.
+        "OPTIONS": {"MAX_ENTRIES": 50000},
+    }
+
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-    }
+        "BACKEND": "core.cache.TwoTierCache",
+        "LOCATION": "shared",
+        "OPTIONS": {
+            "L1_MAX_ENTRIES": 1000,
+            "L1_TIMEOUT": 5,
+            "SYNC_INTERVAL": 1,
+        },
+    },
+    "shared": SHARED_CACHE,
 }
@@ -4,12 +4,17 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.conf.urls import handler404
 
+from core import views as core_views
+
 handler404 = 'posts.views.page_not_found'
 
 urlpatterns = [
     path('auth/', include('users.urls')),
     path('', include('posts.urls')),
     path('admin/', admin.site.urls),
+    path('stats/', core_views.stats, name='stats'),
+    path('metrics', core_views.metrics, name='metrics'),
+    path('api/v1/', include('api.urls', namespace='api')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
 ]